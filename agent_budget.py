@@ -0,0 +1,253 @@
+"""
+Execution budgets for the agent executor of the AI Finance Agent.
+
+`BudgetedAgentExecutor` is the LangChain AgentExecutor built by
+`app_logic.setup_agent`. For every request it:
+1. Caps the number of agent steps, the wall-clock time and the LLM tokens
+   (AGENT_MAX_ITERATIONS, AGENT_MAX_EXECUTION_TIME, AGENT_MAX_TOKENS; 0 disables
+   a budget). Budgets are checked before each step, so a step that is already
+   running finishes, and each SQL statement keeps its own timeout (see `sql_guard.py`).
+2. Stops gracefully when a budget runs out: the answer is built from the tool
+   results gathered so far instead of LangChain's "Agent stopped" message.
+3. Runs the tool calls the model emits in one step concurrently. They are
+   independent by construction: the model chose them without seeing each
+   other's results. Worker threads inherit the caller's context variables and,
+   inside a Streamlit script run, its ScriptRunContext, so UI callbacks such as
+   `st.status` updates still reach the page.
+4. Records a span per step and counts budget hits in the metrics registry
+   (see `instrumentation.py`), and adds a `budget` report to every result,
+   which `run_evaluation.py` aggregates for tuning.
+"""
+
+import contextvars
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Iterator, Optional, Union
+
+from langchain.agents import AgentExecutor
+from langchain.agents.agent import ExceptionTool
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.utils.input import get_color_mapping
+
+from instrumentation import REGISTRY, log_event, record_span
+
+# --- Configuration Constants ---
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "8"))
+AGENT_MAX_EXECUTION_TIME = float(os.getenv("AGENT_MAX_EXECUTION_TIME", "60"))  # Seconds
+AGENT_MAX_TOKENS = int(os.getenv("AGENT_MAX_TOKENS", "30000"))  # Input plus output tokens per request
+AGENT_TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))
+BUDGET_ANSWER_MAX_CHARS = 1500
+BUDGET_LABELS = {"iterations": "step limit", "time": "time limit", "tokens": "token limit"}
+
+def budget_settings() -> dict:
+    """Returns the executor budget arguments from the current configuration (0 disables a budget)."""
+    return {
+        "max_iterations": AGENT_MAX_ITERATIONS or None,
+        "max_execution_time": AGENT_MAX_EXECUTION_TIME or None,
+        "max_tokens": AGENT_MAX_TOKENS or None,
+        "tool_concurrency": max(1, AGENT_TOOL_CONCURRENCY),
+    }
+
+# --- Helper Functions ---
+
+class TokenMeter(BaseCallbackHandler):
+    """Sums the input and output tokens of every LLM call in one agent run."""
+
+    def __init__(self):
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response, **kwargs):
+        used = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                used += usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+        with self._lock:
+            self.tokens += used
+
+def best_effort_answer(exceeded: str, intermediate_steps: list) -> str:
+    """
+    Builds an answer from the tool results gathered before a budget ran out.
+
+    Args:
+        exceeded: The budget that ran out ("iterations", "time" or "tokens").
+        intermediate_steps: The (action, observation) pairs of the run.
+
+    Returns:
+        The most recent text result with a note that the answer may be incomplete.
+    """
+    label = BUDGET_LABELS[exceeded]
+    results = [str(observation) for action, observation in intermediate_steps
+               if action.tool != "_Exception" and isinstance(observation, str) and observation.strip()
+               and not observation.startswith("Error")]
+    if not results:
+        return (f"I could not find an answer within the {label} for this question. "
+                "Please try asking a more specific question.")
+    latest = results[-1]
+    if len(latest) > BUDGET_ANSWER_MAX_CHARS:
+        latest = latest[:BUDGET_ANSWER_MAX_CHARS] + "..."
+    return (f"I reached the {label} before finishing, so this answer may be incomplete. "
+            f"The most recent result I found was:\n{latest}")
+
+def _script_run_initializer():
+    """
+    Returns a thread initializer that attaches the calling thread's Streamlit
+    ScriptRunContext, or None when not called from a Streamlit script run.
+
+    Streamlit drops element updates made from threads without the context.
+    Streamlit is only consulted if the app has already imported it.
+    """
+    if "streamlit" not in sys.modules:
+        return None
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None
+    return lambda: add_script_run_ctx(threading.current_thread(), ctx)
+
+# --- Executor ---
+
+class BudgetedAgentExecutor(AgentExecutor):
+    """
+    An AgentExecutor with step, time and token budgets and concurrent tool calls.
+
+    The executor keeps no per-request state, so one instance may serve
+    concurrent requests (see `app_logic._stateless_executor`).
+    """
+
+    max_iterations: Optional[int] = AGENT_MAX_ITERATIONS or None
+    max_execution_time: Optional[float] = AGENT_MAX_EXECUTION_TIME or None
+    max_tokens: Optional[int] = AGENT_MAX_TOKENS or None
+    tool_concurrency: int = max(1, AGENT_TOOL_CONCURRENCY)
+
+    def _exceeded_budget(self, iterations: int, elapsed: float, tokens: int) -> str | None:
+        """Returns the name of the first budget that has run out, or None."""
+        if self.max_iterations is not None and iterations >= self.max_iterations:
+            return "iterations"
+        if self.max_execution_time is not None and elapsed >= self.max_execution_time:
+            return "time"
+        if self.max_tokens is not None and tokens >= self.max_tokens:
+            return "tokens"
+        return None
+
+    def _call(self, inputs: dict, run_manager=None) -> dict[str, Any]:
+        """Runs the agent loop until it finishes or a budget runs out."""
+        name_to_tool_map = {tool.name: tool for tool in self.tools}
+        color_mapping = get_color_mapping([tool.name for tool in self.tools], excluded_colors=["green", "red"])
+        meter = TokenMeter()
+        if run_manager is not None:
+            # Inheritable handlers reach the LLM runs started for each step.
+            run_manager.inheritable_handlers.append(meter)
+
+        intermediate_steps, steps = [], []
+        started = perf_counter()
+        exceeded = None
+        finish = None
+        while finish is None:
+            exceeded = self._exceeded_budget(len(steps), perf_counter() - started, meter.tokens)
+            if exceeded is not None:
+                break
+            step_started, tokens_before = perf_counter(), meter.tokens
+            output = self._take_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps,
+                                          run_manager=run_manager)
+            tools = [] if isinstance(output, AgentFinish) else [action.tool for action, _ in output]
+            step_ms = (perf_counter() - step_started) * 1000
+            steps.append({"ms": round(step_ms, 3), "tools": tools, "tokens": meter.tokens - tokens_before})
+            record_span("agent", "step", step_ms, tools=",".join(tools) or None)
+
+            if isinstance(output, AgentFinish):
+                finish = output
+                break
+            intermediate_steps.extend(output)
+            if len(output) == 1:
+                finish = self._get_tool_return(output[0])
+
+        if finish is None:
+            REGISTRY.increment("agent_budget_exceeded_total", budget=exceeded)
+            log_event({"event": "agent_budget_exceeded", "budget": exceeded, "steps": len(steps),
+                       "elapsed_ms": round((perf_counter() - started) * 1000, 3), "tokens": meter.tokens})
+            finish = AgentFinish({"output": best_effort_answer(exceeded, intermediate_steps)}, log="")
+
+        result = self._return(finish, intermediate_steps, run_manager=run_manager)
+        result["budget"] = {
+            "exceeded": exceeded,
+            "iterations": len(steps),
+            "elapsed_ms": round((perf_counter() - started) * 1000, 3),
+            "tokens": meter.tokens,
+            "steps": steps,
+        }
+        return result
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps,
+                        run_manager=None) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        """
+        Plans one step and runs its tool calls, concurrently when the model
+        emitted more than one. Observations are yielded in the order the model
+        emitted the calls.
+        """
+        try:
+            output = self._action_agent.plan(
+                self._prepare_intermediate_steps(intermediate_steps),
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            yield self._parsing_error_step(e, run_manager)
+            return
+
+        if isinstance(output, AgentFinish):
+            yield output
+            return
+
+        actions = [output] if isinstance(output, AgentAction) else output
+        yield from actions
+        if len(actions) == 1 or self.tool_concurrency <= 1:
+            for action in actions:
+                yield self._perform_agent_action(name_to_tool_map, color_mapping, action, run_manager)
+            return
+
+        # Each call runs in a copy of this context, so tracing and callback
+        # context follow the tool into its worker thread.
+        with ThreadPoolExecutor(max_workers=min(len(actions), self.tool_concurrency),
+                                initializer=_script_run_initializer()) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._perform_agent_action,
+                            name_to_tool_map, color_mapping, action, run_manager)
+                for action in actions
+            ]
+            for future in futures:
+                yield future.result()
+
+    def _parsing_error_step(self, error: OutputParserException, run_manager=None) -> AgentStep:
+        """Turns an unparsable model response into an observation, as AgentExecutor does."""
+        if self.handle_parsing_errors is False:
+            raise ValueError("An output parsing error occurred. Pass `handle_parsing_errors=True` to the "
+                             f"AgentExecutor to send it back to the agent. This is the error: {error!s}") from error
+        text = str(error)
+        if isinstance(self.handle_parsing_errors, bool):
+            if error.send_to_llm:
+                observation, text = str(error.observation), str(error.llm_output)
+            else:
+                observation = "Invalid or incomplete response"
+        elif isinstance(self.handle_parsing_errors, str):
+            observation = self.handle_parsing_errors
+        else:
+            observation = self.handle_parsing_errors(error)
+        action = AgentAction("_Exception", observation, text)
+        if run_manager:
+            run_manager.on_agent_action(action, color="green")
+        observation = ExceptionTool().run(
+            action.tool_input, verbose=self.verbose, color=None,
+            callbacks=run_manager.get_child() if run_manager else None,
+            **self._action_agent.tool_run_logging_kwargs(),
+        )
+        return AgentStep(action=action, observation=observation)
@@ -0,0 +1,96 @@
+"""
+Bounded pool of per-user agent components for the AI Finance Agent.
+
+Building an agent creates an LLM client, a `SQLDatabase` and a set of tools.
+Those are reused across a user's sessions through this pool, which:
+1. Caps the number of pooled entries and evicts the least recently used one.
+2. Evicts entries that have been idle longer than a TTL.
+3. Reports hit/miss/eviction statistics.
+
+Conversation state is not pooled; each session keeps its own memory.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+# --- Configuration Constants ---
+AGENT_POOL_MAX_SIZE = int(os.getenv("AGENT_POOL_MAX_SIZE", "32"))
+AGENT_POOL_IDLE_TTL = float(os.getenv("AGENT_POOL_IDLE_TTL", "1800"))
+
+class AgentPool:
+    """
+    Thread-safe LRU pool with idle expiry.
+
+    Args:
+        max_size: Maximum number of pooled entries.
+        idle_ttl: Seconds after which an unused entry is evicted.
+        clock: Time source, replaceable in tests.
+    """
+
+    def __init__(self, max_size: int = AGENT_POOL_MAX_SIZE, idle_ttl: float = AGENT_POOL_IDLE_TTL,
+                 clock=monotonic):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, last_used)
+        self._lock = threading.Lock()
+        self._building = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def acquire(self, key, factory):
+        """
+        Returns the pooled value for `key`, building it with `factory()` on a miss.
+
+        Concurrent misses for the same key wait for a single build instead of
+        constructing duplicate clients.
+        """
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], self._clock())
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return entry[0]
+            value = factory()
+            with self._lock:
+                self._entries[key] = (value, self._clock())
+                self._entries.move_to_end(key)
+                self._building.pop(key, None)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+            return value
+
+    def _evict_idle(self):
+        """Drops entries idle for longer than the TTL. The caller must hold the lock."""
+        cutoff = self._clock() - self.idle_ttl
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if last_used >= cutoff:
+                break
+            del self._entries[key]
+            self._stats["evictions"] += 1
+
+    def invalidate(self, key=None):
+        """Removes one entry, or every entry when no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict_idle()
+            return {**self._stats, "size": len(self._entries), "max_size": self.max_size}
@@ -0,0 +1,182 @@
+"""
+Answer cache for agent questions in the AI Finance Agent.
+
+Repeated questions are served without another agent run. Answers are kept in
+two tiers:
+1. An in-memory LRU for the current process.
+2. The `answer_cache` table in the database, shared across processes and restarts.
+
+Cache keys combine the username, the normalized question and the user's data
+version (see `database.bump_data_version`), so an answer is never served after
+the user's data has changed. Both tiers evict by size and by age.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from database import all_db_paths, get_data_version, read_connection, user_db_path, write_transaction
+
+# --- Configuration Constants ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+ANSWER_CACHE_MEMORY_ENTRIES = 1000
+ANSWER_CACHE_MAX_ROWS = 20000
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+EVICTION_INTERVAL = 100  # Trim the database tier every N stores.
+
+# --- Helper Functions ---
+
+def normalize_question(question: str) -> str:
+    """Lowercases a question, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+def make_cache_key(username: str, data_version: int, question: str) -> str:
+    raw = f"{username}\x1f{data_version}\x1f{normalize_question(question)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# --- Answer Cache ---
+
+class AnswerCache:
+    """
+    Two-tier answer cache with hit/miss counters.
+
+    Use `lookup` before running the agent and pass the returned key to `store`
+    afterwards. The key captures the data version seen before the run, so an
+    answer computed while new rows were being written is filed under the old
+    version and never served for the new data.
+    """
+
+    def __init__(self, db_path: str | None = None, enabled: bool = ANSWER_CACHE_ENABLED,
+                 memory_entries: int = ANSWER_CACHE_MEMORY_ENTRIES,
+                 max_rows: int = ANSWER_CACHE_MAX_ROWS, ttl: float = ANSWER_CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.enabled = enabled
+        self.memory_entries = memory_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0,
+                       "evictions": 0, "bypassed": 0}
+
+    def _db_path(self, username: str) -> str:
+        """The configured database, or the file holding the user's shard."""
+        return self.db_path or user_db_path(username)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def lookup(self, username: str, question: str, bypass: bool = False):
+        """
+        Looks up a cached answer.
+
+        Args:
+            username: The user asking the question.
+            question: The question as typed.
+            bypass: If True, skip the cache for this call only.
+
+        Returns:
+            A tuple of (answer or None, cache key or None). The key is None when
+            the cache is disabled or bypassed, in which case `store` is a no-op.
+        """
+        if not self.enabled or bypass:
+            self._count("bypassed")
+            return None, None
+
+        with read_connection(self._db_path(username)) as conn:
+            key = make_cache_key(username, get_data_version(conn, username), question)
+            now = time.time()
+
+            with self._lock:
+                entry = self._memory.get(key)
+                if entry is not None and now - entry[1] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0], key
+
+            row = conn.execute(
+                "SELECT answer, created_at FROM answer_cache WHERE cache_key = ? AND created_at >= ?",
+                (key, now - self.ttl),
+            ).fetchone()
+
+        if row is None:
+            self._count("misses")
+            return None, key
+
+        self._remember(key, row[0], row[1])
+        self._count("db_hits")
+        return row[0], key
+
+    def store(self, key: str | None, username: str, question: str, answer: str):
+        """Stores an answer under a key returned by `lookup`."""
+        if key is None or not self.enabled:
+            return
+        now = time.time()
+        self._remember(key, answer, now)
+
+        with write_transaction(self._db_path(username)) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO answer_cache (cache_key, username, question, answer, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, username, normalize_question(question), answer, now),
+            )
+            with self._lock:
+                self._stats["stores"] += 1
+                evict = self._stats["stores"] % EVICTION_INTERVAL == 0
+            if evict:
+                self._evict_rows(conn, now)
+
+    def _remember(self, key: str, answer: str, created_at: float):
+        with self._lock:
+            self._memory[key] = (answer, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _evict_rows(self, conn, now: float):
+        """Deletes expired rows and trims the table to `max_rows`, oldest first."""
+        expired = conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+        trimmed = conn.execute(
+            "DELETE FROM answer_cache WHERE cache_key IN ("
+            "SELECT cache_key FROM answer_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        ).rowcount
+        self._count("evictions", expired + trimmed)
+
+    def clear(self, username: str | None = None):
+        """Removes cached answers for one user, or for everyone."""
+        with self._lock:
+            self._memory.clear()
+        if username is not None:
+            with write_transaction(self._db_path(username)) as conn:
+                conn.execute("DELETE FROM answer_cache WHERE username = ?", (username,))
+            return
+        for db_path in [self.db_path] if self.db_path else all_db_paths():
+            with write_transaction(db_path) as conn:
+                conn.execute("DELETE FROM answer_cache")
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current memory tier size."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["memory_entries"] = len(self._memory)
+        lookups = snapshot["memory_hits"] + snapshot["db_hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = (snapshot["memory_hits"] + snapshot["db_hits"]) / lookups if lookups else 0.0
+        snapshot["enabled"] = self.enabled
+        return snapshot
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache() -> AnswerCache:
+    """Returns the process-wide answer cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache()
+        return _cache
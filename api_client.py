@@ -0,0 +1,133 @@
+"""
+Client for the headless agent API (see `api_server.py`).
+
+Used by `app.py` when AGENT_API_URL is set, so the Streamlit app becomes a thin
+client and agent work runs in the API service instead of the script thread:
+1. `ApiClient` wraps every endpoint with the standard library, so the UI needs
+   no agent dependencies to talk to the service.
+2. Busy responses (429/503) raise `ApiBusyError` with the server's Retry-After.
+3. `RemoteSyncService` mirrors the parts of `sync_worker.SyncService` the sync UI
+   uses, so the UI works with either.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+# --- Configuration Constants ---
+AGENT_API_URL = os.getenv("AGENT_API_URL", "")
+API_KEY = os.getenv("API_KEY", "")
+API_CLIENT_TIMEOUT = float(os.getenv("API_CLIENT_TIMEOUT", "180"))
+
+class ApiError(RuntimeError):
+    """Raised when the API answers with an error status or cannot be reached."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class ApiBusyError(ApiError):
+    """Raised for 429/503 responses; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, status: int, message: str, retry_after: float):
+        super().__init__(status, message)
+        self.retry_after = retry_after
+
+@dataclass
+class RemoteSyncJob:
+    """The fields of `sync_worker.SyncJob` the UI reads, as reported by the API."""
+    job_id: str
+    username: str
+    status: str
+    progress: float = 0.0
+    message: str = ""
+    counts: dict = field(default_factory=dict)
+    done: bool = False
+
+class ApiClient:
+    """
+    Calls the agent API for one deployment.
+
+    Args:
+        base_url: The server root, e.g. http://127.0.0.1:8600.
+        api_key: Optional shared key sent as a bearer token.
+        timeout: Seconds to wait for a response.
+    """
+
+    def __init__(self, base_url: str = AGENT_API_URL, api_key: str = API_KEY, timeout: float = API_CLIENT_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: dict | None = None, query: dict | None = None) -> dict:
+        url = self.base_url + path
+        if query:
+            url += "?" + urlencode({k: v for k, v in query.items() if v is not None})
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = Request(url, data=data, method=method)
+        request.add_header("Accept", "application/json")
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        if self.api_key:
+            request.add_header("Authorization", f"Bearer {self.api_key}")
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read() or b"{}")
+        except HTTPError as e:
+            try:
+                message = json.loads(e.read() or b"{}").get("error") or e.reason
+            except ValueError:
+                message = e.reason
+            if e.code in (429, 503):
+                raise ApiBusyError(e.code, message, float(e.headers.get("Retry-After") or 1)) from None
+            raise ApiError(e.code, message) from None
+        except URLError as e:
+            raise ApiError(0, f"The agent API at {self.base_url} is unreachable: {e.reason}") from None
+
+    # --- Endpoints ---
+
+    def health(self) -> dict:
+        return self._request("GET", "/health")
+
+    def chat(self, username: str, question: str, name: str | None = None, session_id: str = "default",
+             bypass_cache: bool = False) -> dict:
+        """Returns a dictionary with `output`, `chart` (a chart reference or None), `cached` and `routed`."""
+        return self._request("POST", "/chat", {"username": username, "question": question, "name": name,
+                                               "session_id": session_id, "bypass_cache": bypass_cache})
+
+    def summary(self, username: str, name: str | None = None) -> str:
+        return self._request("POST", "/summary", {"username": username, "name": name})["summary"]
+
+    def chart_spec(self, username: str, chart_type: str = "spending_breakdown", start: str | None = None,
+                   end: str | None = None) -> dict | None:
+        """Returns the Plotly JSON spec of a chart, or None if there is no data."""
+        return self._request("GET", "/chart", query={"username": username, "type": chart_type,
+                                                     "start": start, "end": end})["chart"]
+
+    def submit_link(self, username: str) -> str:
+        return self._request("POST", "/sync", {"username": username})["job_id"]
+
+    def get_job(self, job_id: str, username: str) -> RemoteSyncJob | None:
+        try:
+            job = self._request("GET", f"/sync/{job_id}", query={"username": username})
+        except ApiError as e:
+            if e.status == 404:
+                return None
+            raise
+        return RemoteSyncJob(**{k: job[k] for k in RemoteSyncJob.__dataclass_fields__ if k in job})
+
+class RemoteSyncService:
+    """Adapts `ApiClient` to the `submit_link`/`get_job` interface of `sync_worker.SyncService` for one user."""
+
+    def __init__(self, client: ApiClient, username: str):
+        self.client = client
+        self.username = username
+
+    def submit_link(self, username: str) -> str:
+        return self.client.submit_link(username)
+
+    def get_job(self, job_id: str) -> RemoteSyncJob | None:
+        return self.client.get_job(job_id, self.username)
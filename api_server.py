@@ -0,0 +1,430 @@
+"""
+Headless agent-serving API for the AI Finance Agent.
+
+Serves the same agent, summary, chart and sync logic as the Streamlit app over
+JSON/HTTP, so other clients (including `app.py` via `api_client.py`) can use it
+and it can be scaled behind a load balancer independently of UI sessions:
+1. `POST /chat`, `POST /summary`, `GET /chart`, `POST /sync`, `GET /sync/<job_id>`,
+   `GET /health` and `GET /metrics`.
+2. Agent work runs on a bounded worker pool. At most API_QUEUE_SIZE requests
+   are admitted (running or waiting for a worker); further requests get
+   `503 Service Unavailable` with `Retry-After` instead of piling up.
+3. Each user may have at most API_USER_CONCURRENCY requests admitted at once;
+   further requests get `429 Too Many Requests`.
+4. Conversation memory is kept per (username, session_id) on the server.
+
+Users are authenticated by the caller (e.g. the Streamlit login): the API trusts
+the username each request sends, so only trusted clients may reach it. When
+API_KEY is set every request, `/metrics` included, must send
+`Authorization: Bearer <API_KEY>`; the server refuses to listen on anything but
+a loopback address without one.
+
+To run, execute `python api_server.py --port 8600`. Add `--fake` to serve the
+offline chat model and the fake Plaid API, e.g. for load tests.
+"""
+
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import app_logic
+from app_logic import (answer_question, chart_reference, create_session_memory, generate_financial_summary,
+                       setup_agent)
+from chart_engine import CHART_TYPES, get_chart_spec
+from instrumentation import REGISTRY, record_span
+
+# --- Configuration Constants ---
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8600"))
+API_KEY = os.getenv("API_KEY", "")
+API_WORKERS = int(os.getenv("API_WORKERS", "8"))
+API_QUEUE_SIZE = int(os.getenv("API_QUEUE_SIZE", "32"))  # Admitted requests, running or waiting
+API_USER_CONCURRENCY = int(os.getenv("API_USER_CONCURRENCY", "2"))
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "120"))
+API_MAX_SESSIONS = int(os.getenv("API_MAX_SESSIONS", "1000"))
+API_SESSION_IDLE_TTL = float(os.getenv("API_SESSION_IDLE_TTL", "3600"))
+API_RETRY_AFTER = 1  # Seconds suggested to clients that were turned away
+MAX_BODY_BYTES = 64 * 1024
+
+class BadRequestError(ValueError):
+    """Raised for malformed requests; answered with 400."""
+
+class AdmissionError(RuntimeError):
+    """Raised when a request is turned away; `status` is 503 (queue full) or 429 (user limit)."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+# --- Worker Pool ---
+
+class WorkerPool:
+    """
+    A thread pool with bounded admission and per-user concurrency limits.
+
+    Args:
+        max_workers: Requests executed at the same time.
+        max_queue: Requests admitted at the same time (running plus waiting).
+        per_user: Requests admitted at the same time for one user.
+    """
+
+    def __init__(self, max_workers: int = API_WORKERS, max_queue: int = API_QUEUE_SIZE,
+                 per_user: int = API_USER_CONCURRENCY):
+        self.max_workers = max_workers
+        self.max_queue = max(max_queue, max_workers)
+        self.per_user = per_user
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api-worker")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._per_user = {}
+        self._stats = {"completed": 0, "rejected_queue": 0, "rejected_user": 0}
+
+    def submit(self, username: str, func, *args, **kwargs):
+        """
+        Admits a request and schedules it on the pool.
+
+        Returns:
+            A Future with the function's result.
+
+        Raises:
+            AdmissionError: If the pool or the user's share of it is full.
+        """
+        with self._lock:
+            if self._admitted >= self.max_queue:
+                self._stats["rejected_queue"] += 1
+                REGISTRY.increment("api_rejected_total", reason="queue_full")
+                raise AdmissionError(503, "The server is busy; try again shortly.")
+            if self._per_user.get(username, 0) >= self.per_user:
+                self._stats["rejected_user"] += 1
+                REGISTRY.increment("api_rejected_total", reason="user_limit")
+                raise AdmissionError(429, f"Too many concurrent requests for '{username}'.")
+            self._admitted += 1
+            self._per_user[username] = self._per_user.get(username, 0) + 1
+        try:
+            return self._pool.submit(self._run, username, func, args, kwargs)
+        except RuntimeError:
+            self._release(username)
+            raise AdmissionError(503, "The server is shutting down.") from None
+
+    def _run(self, username: str, func, args, kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._stats["completed"] += 1
+            self._release(username)
+
+    def _release(self, username: str):
+        with self._lock:
+            self._admitted -= 1
+            remaining = self._per_user.get(username, 1) - 1
+            if remaining:
+                self._per_user[username] = remaining
+            else:
+                self._per_user.pop(username, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "workers": self.max_workers, "queue_size": self.max_queue,
+                    "running": self._running, "waiting": self._admitted - self._running,
+                    "users": len(self._per_user)}
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+# --- Agent Service ---
+
+class AgentService:
+    """
+    The operations behind the HTTP endpoints, independent of the transport.
+
+    Args:
+        pool: The worker pool agent work runs on.
+        sync_service: Optional `sync_worker.SyncService`; created on first sync request.
+        timeout: Seconds a request waits for its result before failing with 504.
+    """
+
+    def __init__(self, pool: WorkerPool | None = None, sync_service=None, timeout: float = API_REQUEST_TIMEOUT,
+                 max_sessions: int = API_MAX_SESSIONS, session_ttl: float = API_SESSION_IDLE_TTL):
+        self.pool = pool or WorkerPool()
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._sync_service = sync_service
+        self._sessions = OrderedDict()  # (username, session_id) -> [memory, lock, last_used]
+        self._lock = threading.Lock()
+
+    def _call(self, username: str, func, *args):
+        future = self.pool.submit(username, func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # The request keeps its slot until it finishes, so backpressure stays accurate.
+            raise TimeoutError(f"The request did not finish within {self.timeout:.0f} seconds.") from None
+
+    def _session(self, username: str, session_id: str) -> list:
+        now = time.monotonic()
+        with self._lock:
+            for key, entry in list(self._sessions.items()):
+                if now - entry[2] <= self.session_ttl:
+                    break
+                del self._sessions[key]
+            key = (username, session_id)
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = self._sessions[key] = [create_session_memory(), threading.Lock(), now]
+            entry[2] = now
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return entry
+
+    # --- Operations ---
+
+    def chat(self, username: str, question: str, name: str | None = None, session_id: str = "default",
+             bypass_cache: bool = False) -> dict:
+        """Answers a chat question in a server-side conversation."""
+        return self._call(username, self._chat, username, name or username, question, session_id, bypass_cache)
+
+    def _chat(self, username, name, question, session_id, bypass_cache) -> dict:
+        memory, lock, _ = self._session(username, session_id)
+        with lock:  # One turn at a time per conversation.
+            agent = setup_agent(username=username, name=name, memory=memory)
+            result = answer_question(agent, username, question, bypass_cache=bypass_cache)
+        output = result.get("output")
+        return {
+            "output": output if isinstance(output, str) else None,
+            "chart": chart_reference(result),
+            "cached": bool(result.get("cached")),
+            "routed": result.get("routed"),
+        }
+
+    def summary(self, username: str, name: str | None = None) -> dict:
+        """Generates the financial summary report."""
+        return self._call(username, self._summary, username, name or username)
+
+    def _summary(self, username, name) -> dict:
+        agent = setup_agent(username=username, name=name)
+        return {"summary": generate_financial_summary(agent, username)}
+
+    def chart(self, username: str, chart_type: str, start: str | None = None, end: str | None = None) -> dict:
+        """Returns the Plotly JSON spec of a chart, or None when there is no data."""
+        if chart_type not in CHART_TYPES:
+            raise BadRequestError(f"Unknown chart type '{chart_type}'; expected one of {', '.join(CHART_TYPES)}.")
+        return {"chart": self._call(username, get_chart_spec, username, chart_type, start, end)}
+
+    @property
+    def sync_service(self):
+        with self._lock:
+            if self._sync_service is None:
+                from sync_worker import SyncService
+                self._sync_service = SyncService()
+            return self._sync_service
+
+    def start_sync(self, username: str) -> dict:
+        """Queues a sandbox bank link and sync on the background sync service."""
+        return {"job_id": self.sync_service.submit_link(username)}
+
+    def sync_status(self, username: str, job_id: str) -> dict | None:
+        job = self.sync_service.get_job(job_id)
+        if job is None or job.username != username:
+            return None
+        return {**asdict(job), "done": job.done}
+
+    def health(self) -> dict:
+        with self._lock:
+            sessions = len(self._sessions)
+        return {"status": "ok", "fake_llm": app_logic.AGENT_FAKE_LLM, "pool": self.pool.stats(),
+                "sessions": sessions}
+
+# --- HTTP Transport ---
+
+def _require(fields: dict, name: str) -> str:
+    value = fields.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise BadRequestError(f"Missing or empty field '{name}'.")
+    return value
+
+def _authorized(header: str) -> bool:
+    """Checks an Authorization header against API_KEY in constant time."""
+    return hmac.compare_digest(header.encode(), f"Bearer {API_KEY}".encode())
+
+class _ApiRequestHandler(BaseHTTPRequestHandler):
+    server_version = "FinanceAgentAPI/1.0"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/") or "/"
+        started = time.perf_counter()
+        status = 500
+        try:
+            if API_KEY and not _authorized(self.headers.get("Authorization", "")):
+                status = 401
+                self._send_json(401, {"error": "Missing or invalid API key."})
+                return
+            if path == "/metrics" and method == "GET":
+                status = 200
+                self._send_text(REGISTRY.prometheus_text())
+                return
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            body = self._read_json() if method == "POST" else {}
+            status, payload = self._route(method, path, query, body)
+            self._send_json(status, payload)
+        except AdmissionError as e:
+            status = e.status
+            self._send_json(status, {"error": str(e)}, headers={"Retry-After": str(API_RETRY_AFTER)})
+        except BadRequestError as e:
+            status = 400
+            self._send_json(400, {"error": str(e)})
+        except TimeoutError as e:
+            status = 504
+            self._send_json(504, {"error": str(e)})
+        except Exception as e:
+            status = 500
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            record_span("api", f"{method} {path.split('/')[1] if path != '/' else '/'}",
+                        (time.perf_counter() - started) * 1000, error=str(status) if status >= 500 else None)
+
+    def _route(self, method: str, path: str, query: dict, body: dict) -> tuple:
+        service = self.server.service
+        if method == "GET" and path == "/health":
+            return 200, service.health()
+        if method == "POST" and path == "/chat":
+            return 200, service.chat(_require(body, "username"), _require(body, "question"), name=body.get("name"),
+                                     session_id=str(body.get("session_id") or "default"),
+                                     bypass_cache=bool(body.get("bypass_cache")))
+        if method == "POST" and path == "/summary":
+            return 200, service.summary(_require(body, "username"), name=body.get("name"))
+        if method == "GET" and path == "/chart":
+            return 200, service.chart(_require(query, "username"), query.get("type", "spending_breakdown"),
+                                      start=query.get("start"), end=query.get("end"))
+        if method == "POST" and path == "/sync":
+            return 202, service.start_sync(_require(body, "username"))
+        if method == "GET" and path.startswith("/sync/"):
+            job = service.sync_status(_require(query, "username"), path[len("/sync/"):])
+            return (200, job) if job is not None else (404, {"error": "Unknown sync job."})
+        return 404, {"error": f"No route for {method} {path}."}
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise BadRequestError("Request body too large.")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise BadRequestError(f"Invalid JSON body: {e}") from None
+        if not isinstance(body, dict):
+            raise BadRequestError("The JSON body must be an object.")
+        return body
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        self._send(status, json.dumps(payload, default=str).encode("utf-8"), "application/json", headers)
+
+    def _send_text(self, text: str):
+        self._send(200, text.encode("utf-8"), "text/plain; version=0.0.4")
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class ApiServer(ThreadingHTTPServer):
+    """HTTP server whose handler threads only parse requests and wait on the worker pool."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, service: AgentService):
+        super().__init__(address, _ApiRequestHandler)
+        self.service = service
+
+def is_loopback(host: str) -> bool:
+    """True if `host` only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # Other host names, and "" for every interface
+
+def create_server(host: str = API_HOST, port: int = API_PORT, service: AgentService | None = None) -> ApiServer:
+    """
+    Creates (but does not start) the API server; port 0 picks a free port.
+
+    Raises:
+        ValueError: If `host` is reachable from other machines and API_KEY is not set,
+            since every request is trusted to name its user.
+    """
+    if not API_KEY and not is_loopback(host):
+        raise ValueError(f"Refusing to serve on {host!r} without API_KEY: the API trusts the username each "
+                         "client sends. Set API_KEY or listen on 127.0.0.1.")
+    return ApiServer((host, port), service or AgentService())
+
+def start_server(host: str = API_HOST, port: int = API_PORT, service: AgentService | None = None) -> ApiServer:
+    """Serves the API from a daemon thread and returns the server."""
+    server = create_server(host, port, service)
+    threading.Thread(target=server.serve_forever, name="api-server", daemon=True).start()
+    print(f"Agent API listening on http://{server.server_address[0]}:{server.server_address[1]}")
+    return server
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description="Serve the finance agent over HTTP.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=API_QUEUE_SIZE)
+    parser.add_argument("--user-concurrency", type=int, default=API_USER_CONCURRENCY)
+    parser.add_argument("--fake", action="store_true", help="Use the offline chat model and fake Plaid API.")
+    args = parser.parse_args()
+
+    sync_service = None
+    if args.fake:
+        from fake_plaid import FakePlaidApi, generate_transactions
+        from sync_worker import SyncService
+        app_logic.AGENT_FAKE_LLM = True
+        sync_service = SyncService(api=FakePlaidApi(generate_transactions(200)), readiness_initial_delay=0.01)
+
+    if not API_KEY and not is_loopback(args.host):
+        parser.error(f"--host {args.host} is reachable from other machines; set API_KEY first.")
+    pool = WorkerPool(args.workers, args.queue_size, args.user_concurrency)
+    server = create_server(args.host, args.port, AgentService(pool, sync_service=sync_service))
+    print(f"Agent API listening on http://{args.host}:{server.server_address[1]} "
+          f"({args.workers} workers, queue {pool.max_queue}, {args.user_concurrency} per user"
+          f"{', fake LLM' if args.fake else ''})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown(wait=False)
+
+if __name__ == "__main__":
+    main()
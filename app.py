@@ -4,13 +4,15 @@ Main Streamlit web application for the AI Finance Agent.
 This script handles:
 1. User authentication and session management.
 2. Rendering the user interface (sidebar, main chat, and feature sections).
-3. Orchestrating calls to the backend logic in `app_logic.py` and `plaid_service.py`.
+3. Orchestrating calls to the backend logic in `app_logic.py` and `sync_worker.py`,
+   or, when AGENT_API_URL is set, to the headless agent API (`api_server.py`) as a
+   thin client.
 """
 
 # --- Imports ---
 # Standard library imports
 import os
-import time
+import uuid
 import yaml
 
 # Third-party imports
@@ -20,103 +22,274 @@ import streamlit_authenticator as stauth
 from yaml.loader import SafeLoader
 
 # Local application imports
-from app_logic import setup_agent, generate_financial_summary
-from plaid_service import (create_sandbox_public_token, exchange_public_token, 
-                           save_credentials_to_db, get_transactions, 
-                           save_transactions_to_db)
+from api_client import AGENT_API_URL, ApiBusyError, ApiClient, ApiError, RemoteSyncService
+from app_logic import (setup_agent, generate_financial_summary, answer_question,
+                       create_session_memory, chart_reference)
+from chart_engine import get_chart
+from instrumentation import REGISTRY, record_span, start_metrics_server
+from streaming import AgentStreamHandler
+from sync_worker import SyncService
+
+# --- Configuration Constants ---
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "20"))
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "200"))
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "true").lower() in ("1", "true", "yes")
+# Usernames that see the latency panel in the sidebar (comma-separated).
+ADMIN_USERS = {u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip()}
+CONFIG_PATH = os.getenv("CONFIG_PATH", "config.yaml")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 disables the /metrics endpoint.
 
 # --- UI Rendering Functions ---
 
-def render_sidebar(authenticator, name: str):
+def render_sidebar(authenticator, name: str, username: str):
     """Renders the sidebar with a welcome message and logout button."""
     st.sidebar.title(f"Welcome {name}")
     authenticator.logout('Logout', 'sidebar')
+    if username in ADMIN_USERS:
+        render_metrics_panel()
+
+def render_metrics_panel():
+    """Shows recent p50/p95 latencies per span in the sidebar (admins only)."""
+    with st.sidebar.expander("Performance metrics"):
+        rows = REGISTRY.snapshot()
+        if not rows:
+            st.caption("No requests recorded yet.")
+            return
+        st.dataframe(
+            [{"span": f"{r['kind']}:{r['name']}", "count": r["count"], "p50 ms": r["p50_ms"],
+              "p95 ms": r["p95_ms"], "errors": r["errors"]} for r in rows],
+            hide_index=True, use_container_width=True,
+        )
+        tokens = REGISTRY.counters()
+        if tokens:
+            st.caption(" · ".join(f"{name}: {value}" for name, value in sorted(tokens.items())))
+
+@st.cache_resource
+def get_metrics_server():
+    """Starts the Prometheus text endpoint once per process when METRICS_PORT is set."""
+    return start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+
+@st.cache_data
+def load_config(path: str = CONFIG_PATH) -> dict:
+    """
+    Parses the authentication config once per process.
+
+    `st.cache_data` hands every rerun its own copy, so the authenticator may
+    update the credentials without affecting other sessions.
+    """
+    with open(path) as file:
+        return yaml.load(file, Loader=SafeLoader)
+
+@st.cache_resource
+def get_sync_service():
+    """Starts one background sync service per process, shared by all sessions."""
+    service = SyncService()
+    service.start_scheduler()
+    return service
+
+@st.cache_resource
+def get_api_client():
+    """Returns the agent API client when AGENT_API_URL is set, otherwise None (agent runs in-process)."""
+    return ApiClient(AGENT_API_URL) if AGENT_API_URL else None
+
+def _api_error_text(error: ApiError) -> str:
+    if isinstance(error, ApiBusyError):
+        return f"The assistant is busy right now; please try again in {error.retry_after:.0f}s."
+    return f"Sorry, an error occurred: {error}"
+
+@st.fragment(run_every=2)
+def render_sync_status(service, job_id: str):
+    """Polls a background sync job and shows its progress without rerunning the page."""
+    job = service.get_job(job_id)
+    if job is None:
+        st.session_state.pop("sync_job_id", None)
+        return
+
+    if not job.done:
+        st.progress(job.progress, text=job.message)
+        return
+
+    # Store the outcome and rerun the page once so the poller stops.
+    st.session_state.sync_result = (job.status, job.message, bool(job.counts.get("added")))
+    st.session_state.pop("sync_job_id", None)
+    st.rerun()
 
 def render_plaid_section(username: str):
     """Renders the UI for Plaid integration to sync bank transactions."""
     with st.expander("🔗 Sync Bank Transactions"):
         st.write("Click to sync transactions from a sample bank account (Plaid Sandbox).")
-        
-        if st.button("Sync Sample Bank Transactions"):
-            with st.spinner("Connecting to bank and syncing..."):
-                public_token = create_sandbox_public_token()
-                if not public_token:
-                    st.error("Could not create public token. Check Plaid credentials.")
-                    return
-
-                access_token, item_id = exchange_public_token(public_token)
-                if not access_token:
-                    st.error("Failed to exchange public token.")
-                    return
-
-                save_credentials_to_db(username, access_token, item_id)
-                st.write("Connection successful. Preparing transactions...")
-                time.sleep(5)  # Wait for Plaid to prepare data
-
-                transactions = get_transactions(access_token)
-                if transactions:
-                    save_transactions_to_db(username, transactions)
-                    st.success(f"Successfully synced {len(transactions)} new transactions!")
+
+        client = get_api_client()
+        service = RemoteSyncService(client, username) if client else get_sync_service()
+        if st.button("Sync Sample Bank Transactions", disabled="sync_job_id" in st.session_state):
+            st.session_state.pop("sync_result", None)
+            st.session_state.sync_job_id = service.submit_link(username)
+
+        if "sync_job_id" in st.session_state:
+            render_sync_status(service, st.session_state.sync_job_id)
+        elif result := st.session_state.pop("sync_result", None):
+            status, message, has_new_rows = result
+            if status == "failed":
+                st.error(message)
+            else:
+                st.success(message)
+                if has_new_rows:
                     st.balloons()
-                else:
-                    st.success("Connection successful, no new transactions found.")
 
 def render_summary_section(agent, username: str):
     """Renders the UI for generating an on-demand financial summary."""
     if st.button("📊 Generate Financial Summary"):
         with st.spinner("🤖 Generating your financial summary..."):
-            summary_report = generate_financial_summary(agent, username)
-            st.session_state.messages.append({"role": "assistant", "content": summary_report})
-            st.rerun()
-
-def render_chat_interface(agent):
-    """Renders the main chat history and input form."""
-    # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            if isinstance(message["content"], go.Figure):
-                st.plotly_chart(message["content"])
+            client = get_api_client()
+            if client is None:
+                summary_report = generate_financial_summary(agent, username)
             else:
-                st.markdown(message["content"])
+                try:
+                    summary_report = client.summary(username)
+                except ApiError as e:
+                    summary_report = _api_error_text(e)
+            # The chat history is rendered after this section, so no rerun is needed.
+            append_message({"role": "assistant", "content": summary_report})
+
+def append_message(message: dict):
+    """Adds a message to the chat history, dropping the oldest beyond the stored limit."""
+    messages = st.session_state.messages
+    messages.append(message)
+    if len(messages) > CHAT_HISTORY_MAX_MESSAGES:
+        del messages[:len(messages) - CHAT_HISTORY_MAX_MESSAGES]
+
+def render_message(message: dict, username: str, index: int):
+    """Renders one chat message. Charts are stored as references and rebuilt from the chart cache."""
+    with st.chat_message(message["role"]):
+        chart = message.get("chart")
+        if chart is None:
+            st.markdown(message["content"])
+            return
+        fig = load_chart(username, chart)
+        if fig is None:
+            st.markdown("There is no data for this chart anymore.")
+        else:
+            st.plotly_chart(fig, key=f"chart-{index}")
+
+def load_chart(username: str, chart: dict):
+    """Rebuilds a referenced chart from the local chart cache or the agent API."""
+    client = get_api_client()
+    if client is None:
+        return get_chart(username, chart["chart_type"], start=chart.get("start"), end=chart.get("end"))
+    try:
+        spec = client.chart_spec(username, chart["chart_type"], start=chart.get("start"), end=chart.get("end"))
+    except ApiError:
+        return None
+    return go.Figure(spec) if spec is not None else None
+
+def render_chat_interface(agent, username: str):
+    """
+    Renders the recent chat history and the input box.
+
+    Only the last `chat_history_visible` messages are rendered; older ones are
+    loaded on request. A new question is answered within the same script run,
+    so sending a message does not trigger extra reruns.
+    """
+    messages = st.session_state.messages
+    visible = st.session_state.setdefault("chat_history_visible", CHAT_HISTORY_PAGE_SIZE)
+    first_visible = max(0, len(messages) - visible)
+    if first_visible > 0 and st.button("Show earlier messages", key="show_earlier_messages"):
+        st.session_state.chat_history_visible += CHAT_HISTORY_PAGE_SIZE
+        first_visible = max(0, len(messages) - st.session_state.chat_history_visible)
+
+    for index in range(first_visible, len(messages)):
+        render_message(messages[index], username, index)
 
     # Handle new user input
-    if prompt := st.chat_input("Ask a question or for a chart..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        st.rerun()
-
-    # Generate response if the last message is from the user
-    if st.session_state.messages[-1]["role"] == "user":
-        with st.chat_message("assistant"):
-            with st.spinner("Analyzing..."):
-                try:
-                    result = agent.invoke({"input": st.session_state.messages[-1]["content"]})
-                    response = result["output"]
-                    
-                    # Check for chart objects in the agent's intermediate steps
-                    if "intermediate_steps" in result and result["intermediate_steps"]:
-                        tool_output = result["intermediate_steps"][-1][1]
-                        if isinstance(tool_output, go.Figure):
-                            response = tool_output
-                    
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                    st.rerun()
-
-                except Exception as e:
-                    error_message = f"Sorry, an error occurred: {e}"
-                    st.error(error_message)
-                    st.session_state.messages.append({"role": "assistant", "content": error_message})
-                    st.rerun()
+    prompt = st.chat_input("Ask a question or for a chart...")
+    if not prompt:
+        return
+
+    append_message({"role": "user", "content": prompt})
+    render_message(st.session_state.messages[-1], username, len(st.session_state.messages) - 1)
+
+    client = get_api_client()
+    if client is not None:
+        with st.spinner("Analyzing..."):
+            try:
+                result = client.chat(username, prompt, session_id=st.session_state.api_session_id)
+                message = ({"role": "assistant", "chart": result["chart"]} if result.get("chart")
+                           else {"role": "assistant", "content": result["output"]})
+            except ApiError as e:
+                message = {"role": "assistant", "content": _api_error_text(e)}
+        append_message(message)
+        render_message(message, username, len(st.session_state.messages) - 1)
+        return
+
+    if CHAT_STREAMING:
+        message = stream_assistant_response(agent, username, prompt, len(st.session_state.messages))
+        append_message(message)
+        return
+
+    with st.spinner("Analyzing..."):
+        try:
+            result = answer_question(agent, username, prompt)
+            message = _assistant_message(result)
+        except Exception as e:
+            message = {"role": "assistant", "content": f"Sorry, an error occurred: {e}"}
+
+    append_message(message)
+    render_message(message, username, len(st.session_state.messages) - 1)
+
+def _assistant_message(result: dict) -> dict:
+    """Converts an agent result into a chat history message."""
+    chart = chart_reference(result)
+    if chart is not None:
+        return {"role": "assistant", "chart": chart}
+    return {"role": "assistant", "content": result["output"]}
+
+def stream_assistant_response(agent, username: str, prompt: str, index: int) -> dict:
+    """
+    Answers a question while streaming the agent's progress and answer tokens
+    into the assistant chat bubble.
+
+    Returns:
+        The assistant message to store in the chat history.
+    """
+    with st.chat_message("assistant"):
+        status = st.status("Analyzing...", expanded=False)
+        answer = st.empty()
+        handler = AgentStreamHandler(
+            on_status=lambda text: status.markdown(text),
+            on_text=lambda text: answer.markdown(text + "▌"),
+        )
+        try:
+            result = answer_question(agent, username, prompt, callbacks=[handler])
+        except Exception as e:
+            status.update(label="Something went wrong", state="error")
+            message = {"role": "assistant", "content": f"Sorry, an error occurred: {e}"}
+            answer.markdown(message["content"])
+            return message
+
+        if handler.time_to_first_output is not None:
+            record_span("stream", "first_output", handler.time_to_first_output * 1000)
+        steps = handler.tool_calls
+        status.update(label=f"Done ({steps} step{'s' if steps != 1 else ''})", state="complete")
+        message = _assistant_message(result)
+        chart = message.get("chart")
+        if chart is None:
+            answer.markdown(message["content"])
+        else:
+            fig = load_chart(username, chart)
+            with answer.container():
+                st.plotly_chart(fig, key=f"chart-{index}")
+        return message
 
 # --- Main Application ---
 
 def main():
     """Main function to run the Streamlit application."""
     st.set_page_config(page_title="Finance Agent v3", page_icon="💡", layout="centered")
+    get_metrics_server()
 
     # --- Authentication ---
-    with open('config.yaml') as file:
-        config = yaml.load(file, Loader=SafeLoader)
-    
+    config = load_config()
+
     authenticator = stauth.Authenticate(
         config['credentials'], config['cookie']['name'],
         config['cookie']['key'], config['cookie']['expiry_days']
@@ -129,12 +302,20 @@ def main():
         name = st.session_state["name"]
         username = st.session_state["username"]
 
-        render_sidebar(authenticator, name)
+        render_sidebar(authenticator, name, username)
         
         st.title("💡 AI Finance Agent v3")
         st.write("I can answer questions, create visualizations, and generate summaries!")
 
-        agent = setup_agent(username=username, name=name)
+        # Conversation memory belongs to this browser session, not to the user. As a
+        # thin client the API keeps it, keyed by this session's id.
+        if get_api_client() is not None:
+            st.session_state.setdefault("api_session_id", uuid.uuid4().hex)
+            agent = None
+        else:
+            if "agent_memory" not in st.session_state:
+                st.session_state.agent_memory = create_session_memory()
+            agent = setup_agent(username=username, name=name, memory=st.session_state.agent_memory)
         
         # Initialize chat history
         if "messages" not in st.session_state:
@@ -142,7 +323,7 @@ def main():
 
         render_summary_section(agent, username)
         render_plaid_section(username)
-        render_chat_interface(agent)
+        render_chat_interface(agent, username)
 
     elif st.session_state.get("authentication_status") is False:
         st.error('Username/password is incorrect')
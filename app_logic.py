@@ -2,100 +2,217 @@
 Core application logic for the AI Finance Agent.
 
 This module contains functions for:
-1. Setting up the multi-tool LangChain agent.
+1. Setting up the multi-tool LangChain agent (pooled per user, with per-session memory).
 2. Generating financial summaries.
 3. Creating data visualizations.
 """
 
 # --- Imports ---
+import os
 import sqlite3
-import pandas as pd
-import plotly.express as px
-import streamlit as st
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from time import monotonic
+import plotly.graph_objects as go
 from dotenv import load_dotenv
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain.memory import ConversationBufferMemory
-from langchain.tools import Tool
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langchain_community.utilities import SQLDatabase
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_google_genai import ChatGoogleGenerativeAI
+# LangChain (agents, tools, prompts, memory) and the Gemini client take seconds to
+# import, so they are imported inside the functions that build agents and memory.
+
+from agent_pool import AgentPool
+from answer_cache import get_answer_cache
+from chart_engine import get_chart, parse_date_range
+from database import get_engine, read_connection, user_db_path
+from instrumentation import get_callback_handlers, instrumented, record_span
+from intent_router import route
+from portfolio_analytics import get_portfolio_analytics, portfolio_report
+from schema_context import SCHEMA_CONTEXT_TABLES, get_schema_context
+from summary_engine import SUMMARY_QUESTIONS, answer_summary_questions
 
 # --- Load Environment Variables ---
 load_dotenv()
 
 # --- Constants ---
-DB_PATH = "finance.db"
 LLM_MODEL = "gemini-1.5-flash"
+# Serve agents with the offline `fake_llm.StaticChatModel` instead of Gemini, e.g. for load tests.
+AGENT_FAKE_LLM = os.getenv("AGENT_FAKE_LLM", "").lower() in ("1", "true", "yes")
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))  # Seconds per fake LLM call
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+SUMMARY_QUESTION_TIMEOUT = float(os.getenv("SUMMARY_QUESTION_TIMEOUT", "60"))
+AGENT_MEMORY_WINDOW = int(os.getenv("AGENT_MEMORY_WINDOW", "10"))  # Conversation turns
+AGENT_MEMORY_TOKEN_LIMIT = int(os.getenv("AGENT_MEMORY_TOKEN_LIMIT", "2000"))
+# The schema digest in the prompt replaces table discovery, so only these SQL tools are kept.
+AGENT_SQL_TOOLS = {"sql_db_query", "sql_db_schema"}
+CHART_TOOL_TYPES = {
+    "create_user_spending_pie_chart": "spending_breakdown",
+    "create_monthly_spending_chart": "monthly_trend",
+    "create_portfolio_allocation_chart": "portfolio_allocation",
+}
+
+# Per-user agent components, shared across sessions and bounded in size and idle time.
+AGENT_POOL = AgentPool()
 
 # --- Core Functions ---
 
-def create_spending_pie_chart(username: str):
+@instrumented("chart")
+def create_spending_pie_chart(username: str, start: str | None = None, end: str | None = None):
     """
-    Queries the database for a user's spending data and generates a Plotly pie chart.
+    Generates a Plotly pie chart of a user's spending, aggregated in SQL by
+    `chart_engine` (top descriptions plus an "Other" slice).
 
     Args:
         username: The username of the currently logged-in user.
+        start: Optional first date (inclusive), 'YYYY-MM-DD'.
+        end: Optional last date (inclusive), 'YYYY-MM-DD'.
 
     Returns:
         A Plotly Figure object if data is found, otherwise None.
     """
-    conn = sqlite3.connect(DB_PATH)
-    query = f"SELECT Description, Amount FROM bank_transactions WHERE Type = 'Debit' AND username = '{username}'"
-    
-    try:
-        df = pd.read_sql_query(query, conn)
-    finally:
-        conn.close()
+    return get_chart(username, "spending_breakdown", start=start, end=end)
+
+def chart_reference(result: dict) -> dict | None:
+    """
+    Describes the chart produced by an agent result, if any.
 
-    if df.empty:
+    The chat history stores this small reference instead of the Plotly figure;
+    the figure is rebuilt from the chart cache when the message is rendered.
+
+    Returns:
+        A dictionary with `chart_type`, `start` and `end`, or None if the last
+        step of the result did not produce a chart.
+    """
+    steps = result.get("intermediate_steps") or []
+    if not steps:
         return None
+    action, observation = steps[-1]
+    chart_type = CHART_TOOL_TYPES.get(getattr(action, "tool", None))
+    if chart_type is None or not isinstance(observation, go.Figure):
+        return None
+    tool_input = action.tool_input
+    if isinstance(tool_input, dict):
+        tool_input = " ".join(str(value) for value in tool_input.values())
+    start, end = parse_date_range(tool_input)
+    return {"chart_type": chart_type, "start": start, "end": end}
+
+def _chart_tool(username: str, chart_type: str):
+    """Returns a tool function that builds a chart, reading an optional date range from its input."""
+    def run(tool_input: str = ""):
+        start, end = parse_date_range(tool_input)
+        return get_chart(username, chart_type, start=start, end=end)
+    return run
+
+def _portfolio_tool(username: str):
+    """Returns a tool function that reports the user's cached portfolio analytics."""
+    def run(tool_input: str = ""):
+        return portfolio_report(get_portfolio_analytics(username), tool_input or "")
+    return run
 
-    fig = px.pie(
-        df, 
-        names='Description', 
-        values=df['Amount'].abs(), 
-        title=f'Spending Breakdown for {username}',
-        hole=.3
+def create_session_memory():
+    """Creates bounded conversation memory for one chat session."""
+    from chat_memory import WindowedChatMemory
+
+    return WindowedChatMemory(
+        k=AGENT_MEMORY_WINDOW, max_token_limit=AGENT_MEMORY_TOKEN_LIMIT,
+        memory_key="chat_history", input_key="input", output_key="output", return_messages=True,
     )
-    fig.update_traces(textinfo='percent+label')
-    return fig
 
-@st.cache_resource
-def setup_agent(username: str, name: str):
-    """
-    Initializes and caches a multi-tool LangChain agent for a specific user.
+def _default_llm():
+    """Returns the chat model for pooled agents: Gemini, or the offline model when AGENT_FAKE_LLM is set."""
+    if AGENT_FAKE_LLM:
+        from fake_llm import StaticChatModel
+        return StaticChatModel(sleep=FAKE_LLM_LATENCY or None)
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=LLM_MODEL, temperature=0)
 
-    The agent is configured with two sets of tools:
-    1. A SQL toolkit for querying the financial database.
-    2. A custom tool for generating pie charts.
+def _build_tools(username: str, llm):
+    """
+    Builds the tools of a user's agent.
 
-    Args:
-        username: The unique username for database filtering.
-        name: The user's full name for conversational context.
+    The agent is configured with three sets of tools:
+    1. A SQL toolkit for querying the financial database, behind the guardrails
+       in `sql_guard` (user scoping, row limits, plan checks and timeouts).
+    2. Custom tools for generating charts.
+    3. A portfolio analytics tool that answers investment questions from
+       precomputed metrics (see `portfolio_analytics.py`).
 
     Returns:
-        An initialized LangChain AgentExecutor.
+        The list of tools, shared by all of the user's sessions.
     """
-    llm = ChatGoogleGenerativeAI(model=LLM_MODEL, temperature=0)
-    db = SQLDatabase.from_uri(f"sqlite:///{DB_PATH}")
+    from langchain.tools import Tool
+    from langchain_community.agent_toolkits import SQLDatabaseToolkit
 
-    # 1. Define the custom pie chart tool
-    pie_chart_tool = Tool(
-        name="create_user_spending_pie_chart",
-        func=lambda _: create_spending_pie_chart(username=username),
+    from sql_guard import GuardedSQLDatabase
+
+    # Queries from sql_db_query are checked, scoped to the user and time-limited (see sql_guard.py),
+    # and only ever reach the database file holding the user's shard.
+    db_path = user_db_path(username)
+    db = GuardedSQLDatabase(get_engine(db_path), username, db_path=db_path, include_tables=SCHEMA_CONTEXT_TABLES,
+                            sample_rows_in_table_info=0, view_support=True)
+
+    # 1. Define the custom chart tools
+    chart_tools = [
+        Tool(
+            name="create_user_spending_pie_chart",
+            func=_chart_tool(username, CHART_TOOL_TYPES["create_user_spending_pie_chart"]),
+            description="""
+            Use this tool ONLY when the user explicitly asks for a visual representation,
+            pie chart, graph, or diagram of their spending breakdown.
+            Input: an optional date range such as '2025-07-01 to 2025-07-31', or an empty string.
+            The output is a Plotly chart object.
+            """,
+        ),
+        Tool(
+            name="create_monthly_spending_chart",
+            func=_chart_tool(username, CHART_TOOL_TYPES["create_monthly_spending_chart"]),
+            description="""
+            Use this tool when the user asks for a chart of spending or income over time,
+            per month, or as a trend.
+            Input: an optional date range such as '2025-01-01 to 2025-06-30', or an empty string.
+            The output is a Plotly chart object.
+            """,
+        ),
+        Tool(
+            name="create_portfolio_allocation_chart",
+            func=_chart_tool(username, CHART_TOOL_TYPES["create_portfolio_allocation_chart"]),
+            description="""
+            Use this tool when the user asks for a chart of their investments, portfolio
+            allocation, stocks or mutual funds. The tool does not require any input.
+            The output is a Plotly chart object.
+            """,
+        ),
+    ]
+
+    # 2. Define the portfolio analytics tool
+    portfolio_tool = Tool(
+        name="portfolio_analytics",
+        func=_portfolio_tool(username),
         description="""
-        Use this tool ONLY when the user explicitly asks for a visual representation,
-        pie chart, graph, or diagram of their spending. It is the ONLY way to generate a chart.
-        The tool does not require any input. The output is a Plotly chart object.
+        Use this tool for any question about the user's stocks or mutual funds: holdings,
+        current value, invested amount, profit or loss, returns, or allocation by category.
+        Input: an optional ticker or fund name to show first, such as 'TATAMOTORS', or an empty string.
+        The output lists the matching holdings, portfolio and asset class totals, allocation
+        by category and the largest holdings, with values, costs and P&L already computed.
         """,
     )
 
-    # 2. Define the SQL toolkit
+    # 3. Define the SQL toolkit
     sql_toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-    tools = sql_toolkit.get_tools() + [pie_chart_tool]
-    
-    # 3. Define the prompt template
+    sql_tools = [t for t in sql_toolkit.get_tools() if t.name in AGENT_SQL_TOOLS]
+    return sql_tools + chart_tools + [portfolio_tool]
+
+def _build_agent(llm, tools: list, username: str, name: str, schema_digest: str):
+    """
+    Builds the agent runnable: the system prompt bound to the LLM and tools.
+
+    The schema digest from `schema_context` is embedded in the system prompt, so
+    the agent can write queries without listing tables or fetching schemas first.
+    This is cheap next to building the LLM client and tools, and is redone
+    whenever the digest changes.
+    """
+    from langchain.agents import create_openai_tools_agent
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+    # Braces in the digest must not be read as prompt variables.
+    schema_text = schema_digest.replace("{", "{{").replace("}", "}}")
     prompt = ChatPromptTemplate.from_messages([
         ("system", f"""
         You are a helpful financial assistant for a user named '{name}'.
@@ -103,57 +220,289 @@ def setup_agent(username: str, name: str):
         You have access to a set of tools to answer questions.
         IMPORTANT: All SQL queries MUST include a WHERE clause to filter by the user's username.
         Example: SELECT * FROM bank_transactions WHERE username = '{username}';
+
+        The database schema is listed below. Write queries against it directly with
+        sql_db_query; there is no need to list tables or fetch their schema first.
+        For questions about stocks or mutual funds, call portfolio_analytics once
+        instead of computing values or profits in SQL.
+{schema_text}
         """),
         MessagesPlaceholder(variable_name="chat_history"),
         ("human", "{input}"),
         MessagesPlaceholder(variable_name="agent_scratchpad"),
     ])
 
-    # 4. Create the agent and agent executor
-    agent = create_openai_tools_agent(llm, tools, prompt)
-    
-    memory = ConversationBufferMemory(
-        memory_key="chat_history", input_key="input", return_messages=True
-    )
-    
-    agent_executor = AgentExecutor(
+    return create_openai_tools_agent(llm, tools, prompt)
+
+def _pooled_components(username: str) -> tuple:
+    llm = _default_llm()
+    return llm, _build_tools(username, llm)
+
+class _PooledAgent:
+    """A user's pooled LLM client and tools, with the agent built for the latest schema digest."""
+
+    def __init__(self, llm, tools: list):
+        self.llm = llm
+        self.tools = tools
+        self._digest = None
+        self._agent = None
+        self._lock = threading.Lock()
+
+    def agent_for(self, username: str, name: str, schema_digest: str):
+        """Returns the agent for a digest, rebuilding only the prompt when the digest changed."""
+        with self._lock:
+            if schema_digest != self._digest:
+                self._agent = _build_agent(self.llm, self.tools, username, name, schema_digest)
+                self._digest = schema_digest
+            return self._agent
+
+def setup_agent(username: str, name: str, memory=None, llm=None):
+    """
+    Returns a multi-tool LangChain agent for a specific user.
+
+    The expensive parts (LLM client, database, tools) come from a bounded pool
+    shared across the user's sessions; the executor itself is cheap and is
+    bound to the caller's conversation memory. There is one pool entry per user:
+    when the schema digest changes (after a migration or a write to the user's
+    data) only the prompt is rebuilt, on the pooled LLM client and tools.
+
+    Args:
+        username: The unique username for database filtering.
+        name: The user's full name for conversational context.
+        memory: The session's conversation memory. A new bounded memory is
+            created when omitted.
+        llm: Optional chat model to use instead of Gemini (e.g. the cassette
+            model in `fake_llm`). Agents with a custom model are not pooled.
+
+    Returns:
+        An initialized `agent_budget.BudgetedAgentExecutor`, which applies the
+        configured step, time and token budgets and runs independent tool calls
+        concurrently.
+    """
+    from agent_budget import BudgetedAgentExecutor, budget_settings
+
+    _, schema_digest = get_schema_context(username)
+    if llm is not None:
+        tools = _build_tools(username, llm)
+        agent = _build_agent(llm, tools, username, name, schema_digest)
+    else:
+        pooled = AGENT_POOL.acquire((username, name), lambda: _PooledAgent(*_pooled_components(username)))
+        agent, tools = pooled.agent_for(username, name, schema_digest), pooled.tools
+
+    agent_executor = BudgetedAgentExecutor(
         agent=agent,
         tools=tools,
-        memory=memory,
+        memory=memory if memory is not None else create_session_memory(),
         verbose=False,  # Set to True for detailed debugging in the terminal
         handle_parsing_errors=True,
         return_intermediate_steps=True,
+        **budget_settings(),
     )
     
     return agent_executor
 
-def generate_financial_summary(agent, username: str):
+def _emit_answer(callbacks: list | None, answer: str):
+    """Shows an answer that did not come from the agent through any streaming handlers."""
+    for handler in callbacks or []:
+        if hasattr(handler, "emit_answer"):
+            handler.emit_answer(answer)
+
+def _has_history(agent) -> bool:
+    """Returns True if the agent's conversation memory already holds messages."""
+    memory = agent.memory
+    return memory is not None and bool(memory.chat_memory.messages)
+
+def invoke_with_cache(agent, username: str, question: str, bypass_cache: bool = False,
+                      callbacks: list | None = None) -> dict:
     """
-    Runs a series of pre-defined analytical questions through the agent
-    to generate a formatted financial summary.
+    Answers a question through the answer cache, invoking the agent on a miss.
+
+    Only self-contained turns use the cache: memory-less runs and the first turn
+    of a session. A follow-up such as "and the second one?" depends on the
+    conversation, which is not part of the cache key, so it always goes to the
+    agent. A cached answer is also written to the agent's memory (if it has one)
+    so follow-up questions keep their context. Chart answers are never cached.
+
+    Args:
+        agent: The initialized LangChain agent.
+        username: The username of the currently logged-in user.
+        question: The user's question.
+        bypass_cache: If True, always invoke the agent for this question.
+        callbacks: Optional LangChain callback handlers for the agent run, e.g. a
+            `streaming.AgentStreamHandler`. The instrumentation handler is always
+            added, so every agent turn is recorded. Handlers with an
+            `emit_answer` method receive cached answers in one piece.
+
+    Returns:
+        The agent result dictionary. Cached results have `cached` set to True and
+        no intermediate steps.
+    """
+    cache = get_answer_cache()
+    started = monotonic()
+    answer, key = cache.lookup(username, question, bypass=bypass_cache or _has_history(agent))
+    if answer is not None:
+        if agent.memory is not None:
+            agent.memory.save_context({"input": question}, {"output": answer})
+        record_span("turn", "cached", (monotonic() - started) * 1000)
+        _emit_answer(callbacks, answer)
+        return {"input": question, "output": answer, "intermediate_steps": [], "cached": True}
+
+    inputs = {"input": question}
+    if agent.memory is None:
+        # Memory-less executors (see _stateless_executor) need an explicit empty history.
+        inputs["chat_history"] = []
+    # Handlers passed at invoke time are inherited by the LLM and tool runs, unlike
+    # handlers set on the executor itself, so the instrumentation sees every step.
+    handlers = get_callback_handlers() + list(callbacks or [])
+    result = agent.invoke(inputs, config={"callbacks": handlers} if handlers else None)
+    steps = result.get("intermediate_steps") or []
+    output = result.get("output")
+    # Best-effort answers from a run that hit a budget are not cached.
+    budget_hit = (result.get("budget") or {}).get("exceeded") is not None
+    if (isinstance(output, str) and not output.startswith("Agent stopped") and not budget_hit
+            and not any(isinstance(observation, go.Figure) for _, observation in steps)):
+        cache.store(key, username, question, output)
+    return result
+
+def answer_question(agent, username: str, question: str, bypass_cache: bool = False,
+                    callbacks: list | None = None) -> dict:
+    """
+    Answers a chat question, trying the intent router before the agent.
+
+    Questions that match a SQL template in `intent_router` are answered directly
+    and written to the agent's memory (and passed to the `emit_answer` of any
+    streaming handler in `callbacks`); everything else goes through
+    `invoke_with_cache`.
+
+    Returns:
+        The result dictionary. Routed results have `routed` set to the intent
+        name and no intermediate steps.
+    """
+    try:
+        routed = route(username, question)
+    except sqlite3.Error as e:
+        print(f"Intent router unavailable, falling back to the agent: {e}")
+        routed = None
+
+    if routed is None:
+        return invoke_with_cache(agent, username, question, bypass_cache=bypass_cache, callbacks=callbacks)
+    if agent.memory is not None:
+        agent.memory.save_context({"input": question}, {"output": routed.answer})
+    record_span("turn", f"routed.{routed.intent}", routed.elapsed_ms)
+    _emit_answer(callbacks, routed.answer)
+    return {"input": question, "output": routed.answer, "intermediate_steps": [],
+            "routed": routed.intent, "elapsed_ms": routed.elapsed_ms}
+
+def _stateless_executor(agent):
+    """
+    Builds a copy of an AgentExecutor that shares the agent and tools but has no memory.
+
+    Summary questions are independent of each other, so running them through a
+    memory-less copy lets them execute concurrently without interleaving their
+    turns into the user's ConversationBufferMemory. The copy keeps the agent's budgets.
+    """
+    from agent_budget import BudgetedAgentExecutor
+
+    return BudgetedAgentExecutor(
+        agent=agent.agent,
+        tools=agent.tools,
+        verbose=agent.verbose,
+        handle_parsing_errors=agent.handle_parsing_errors,
+        return_intermediate_steps=agent.return_intermediate_steps,
+        max_iterations=agent.max_iterations,
+        max_execution_time=agent.max_execution_time,
+        max_tokens=getattr(agent, "max_tokens", None),
+        tool_concurrency=getattr(agent, "tool_concurrency", 1),
+    )
+
+def _ask_question(executor, username: str, question: str, started: dict) -> str:
+    """Answers a single question through the cache and a memory-less executor."""
+    started[question] = monotonic()
+    return invoke_with_cache(executor, username, question)["output"]
+
+def _await_answer(future, question: str, started: dict, timeout: float) -> str:
+    """
+    Waits for a question's answer, allowing it `timeout` seconds from the moment it
+    started running. Questions still queued behind the concurrency limit are not
+    charged for the time spent waiting for a free worker.
+    """
+    while True:
+        start = started.get(question)
+        wait_for = 0.05 if start is None else start + timeout - monotonic()
+        try:
+            return future.result(timeout=max(0.0, wait_for))
+        except FutureTimeoutError:
+            if start is not None:
+                raise
+
+def _compute_fast_answers(username: str) -> dict:
+    """Answers the summary questions that have a SQL metric, without using the LLM."""
+    try:
+        with read_connection(user_db_path(username)) as conn:
+            return answer_summary_questions(conn, username, SUMMARY_QUESTIONS)
+    except sqlite3.Error as e:
+        print(f"Summary fast path unavailable, falling back to the agent: {e}")
+        return {}
+
+def _ask_agent(agent, username: str, questions: list, max_concurrency: int, timeout: float) -> dict:
+    """
+    Answers questions concurrently through a memory-less copy of the agent.
+
+    Returns:
+        A dictionary mapping every question to its answer or an error message.
+    """
+    executor = _stateless_executor(agent)
+    pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+    started = {}
+    answers = {}
+
+    try:
+        futures = {q: pool.submit(_ask_question, executor, username, q, started) for q in questions}
+        for q, future in futures.items():
+            try:
+                answers[q] = _await_answer(future, q, started, timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                answers[q] = f"Error generating this insight: timed out after {timeout:g} seconds."
+            except Exception as e:
+                answers[q] = f"Error generating this insight: {e}"
+    finally:
+        # Do not block on questions that timed out; their threads finish in the background.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return answers
+
+def generate_financial_summary(agent, username: str,
+                               max_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+                               timeout: float = SUMMARY_QUESTION_TIMEOUT,
+                               use_fast_path: bool = True):
+    """
+    Runs a series of pre-defined analytical questions to generate a formatted
+    financial summary.
+
+    Questions with a deterministic SQL metric in `summary_engine` are answered
+    directly from the database. The remaining questions are fanned out over a
+    thread pool to memory-less copies of the agent, leaving the chat memory untouched.
 
     Args:
         agent: The initialized LangChain agent.
         username: The username for the summary title.
+        max_concurrency: Maximum number of questions answered by the agent at the
+            same time. A value of 1 answers the questions one after another.
+        timeout: Maximum number of seconds to wait for each agent question.
+        use_fast_path: Whether to answer questions from SQL before using the agent.
 
     Returns:
-        A formatted markdown string containing the financial summary.
+        A formatted markdown string containing the financial summary. Questions that
+        fail or time out are reported in place, in the original order.
     """
-    questions = [
-        "What was my total spending in the last 30 days?",
-        "What were my top 3 spending categories in the last 30 days, by total amount spent in each category?",
-        "What was my largest single transaction in the last 30 days?",
-        "How many transactions did I make in the last 30 days?",
-    ]
-    
+    answers = _compute_fast_answers(username) if use_fast_path else {}
+    remaining = [q for q in SUMMARY_QUESTIONS if q not in answers]
+    if remaining:
+        answers.update(_ask_agent(agent, username, remaining, max_concurrency, timeout))
+
     summary = f"### Financial Summary for {username}\n\nHere is your financial briefing:\n"
-    
-    for q in questions:
-        try:
-            result = agent.invoke({"input": q})
-            answer = result["output"]
-            summary += f"\n**- {q}**\n  - {answer}"
-        except Exception as e:
-            summary += f"\n**- {q}**\n  - Error generating this insight: {e}"
-            
-    return summary
\ No newline at end of file
+    for q in SUMMARY_QUESTIONS:
+        summary += f"\n**- {q}**\n  - {answers[q]}"
+
+    return summary
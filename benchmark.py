@@ -0,0 +1,345 @@
+"""
+Performance benchmark suite for the AI Finance Agent.
+
+Runs entirely offline against a separate database filled by `synthetic_data.py`,
+with `fake_llm.StaticChatModel` standing in for Gemini. It measures:
+1. DB load throughput of the synthetic generator (rows per second).
+2. Chart generation latency and payload size, without the spec cache.
+3. Financial summary latency (SQL fast path plus the offline agent).
+4. Plaid ingest write throughput through `save_transactions_to_db`.
+5. Query latency and throughput under concurrent users (router, summary
+   metrics, charts and raw queries).
+6. The headless agent API under concurrent HTTP clients with the offline model
+   (latency, throughput and how many requests were turned away as busy).
+7. Cold start: import time of the entry-point modules and the time to render
+   the login page, each in a fresh interpreter.
+
+Latencies are reported as p50/p95/p99 in milliseconds. Each run is appended to
+a JSON-lines history file and compared with the previous run of the same scale.
+
+To run, execute `python benchmark.py --users 50 --transactions 2000`.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import database
+from database import read_connection
+
+# --- Configuration Constants ---
+BENCHMARK_DB = "benchmark.db"
+HISTORY_FILE = "benchmark_history.jsonl"
+DEFAULT_USERS = 50
+DEFAULT_TRANSACTIONS = 2000
+DEFAULT_THREADS = 8
+DEFAULT_REQUESTS = 200
+SAMPLE_USERS = 10
+PLAID_BATCHES = 5
+PLAID_BATCH_SIZE = 500
+STARTUP_MODULES = ["app", "app_logic", "run_evaluation", "plaid_service"]
+STARTUP_RUNS = 3
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- Helper Functions ---
+
+def percentile(values: list, pct: float) -> float:
+    """Returns the `pct` percentile (0-100) of a list using linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def latency_stats(samples_ms: list) -> dict:
+    """Summarizes latency samples in milliseconds."""
+    return {
+        "count": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 3) if samples_ms else 0.0,
+    }
+
+def timed(func, *args, **kwargs):
+    """Calls a function and returns (result, elapsed milliseconds)."""
+    started = perf_counter()
+    result = func(*args, **kwargs)
+    return result, (perf_counter() - started) * 1000
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _sample_users(count: int) -> list:
+    with read_connection() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT username FROM mutual_funds ORDER BY username LIMIT ?", (count,)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+# --- Benchmarks ---
+
+def bench_db_load(users: int, transactions: int, seed: int) -> dict:
+    from synthetic_data import populate_synthetic
+    return populate_synthetic(None, users, transactions, seed)
+
+def bench_charts(usernames: list) -> dict:
+    """Builds every chart type for each user, bypassing the spec cache."""
+    from chart_engine import CHART_TYPES, build_chart
+
+    samples, payloads = {t: [] for t in CHART_TYPES}, {t: [] for t in CHART_TYPES}
+    with read_connection() as conn:
+        for username in usernames:
+            for chart_type in CHART_TYPES:
+                fig, elapsed = timed(build_chart, conn, username, chart_type)
+                samples[chart_type].append(elapsed)
+                payloads[chart_type].append(len(fig.to_json()) if fig is not None else 0)
+    return {t: {**latency_stats(samples[t]), "mean_payload_bytes": round(sum(payloads[t]) / len(payloads[t]))}
+            for t in CHART_TYPES if samples[t]}
+
+def bench_summary(usernames: list) -> dict:
+    """Generates a full financial summary per user with the offline model."""
+    from app_logic import generate_financial_summary, setup_agent
+    from fake_llm import StaticChatModel
+
+    samples = []
+    for username in usernames:
+        agent = setup_agent(username, username, llm=StaticChatModel())
+        _, elapsed = timed(generate_financial_summary, agent, username)
+        samples.append(elapsed)
+    return latency_stats(samples)
+
+def bench_plaid_ingest(batches: int = PLAID_BATCHES, batch_size: int = PLAID_BATCH_SIZE) -> dict:
+    """Writes Plaid-shaped transactions through `save_transactions_to_db`."""
+    from fake_plaid import generate_transactions
+    from plaid_service import save_transactions_to_db
+
+    samples = []
+    for batch in range(batches):
+        transactions = generate_transactions(batch_size, seed=batch, prefix="bench")
+        _, elapsed = timed(save_transactions_to_db, "bench_plaid", transactions)
+        samples.append(elapsed)
+    total_s = sum(samples) / 1000
+    return {**latency_stats(samples), "batch_size": batch_size,
+            "rows_per_second": round(batches * batch_size / total_s, 1) if total_s else 0.0}
+
+def bench_concurrent_queries(usernames: list, threads: int, requests: int, seed: int = 0) -> dict:
+    """Runs a mix of read paths for random users from several threads at once."""
+    from chart_engine import get_chart_spec
+    from intent_router import route
+    from summary_engine import SUMMARY_QUESTIONS, answer_summary_questions
+
+    def summary(username):
+        with read_connection() as conn:
+            return answer_summary_questions(conn, username, SUMMARY_QUESTIONS)
+
+    def raw_query(username):
+        with read_connection() as conn:
+            return conn.execute(
+                "SELECT Description, -SUM(AmountMinor) FROM bank_transactions "
+                "WHERE username = ? AND Type = 'Debit' GROUP BY Description", (username,)
+            ).fetchall()
+
+    operations = {
+        "router": lambda u: route(u, "How much did I spend on Zomato?"),
+        "summary_metrics": summary,
+        "chart_spec": lambda u: get_chart_spec(u, "spending_breakdown"),
+        "raw_query": raw_query,
+    }
+    rng = random.Random(seed)
+    plan = [(rng.choice(list(operations)), rng.choice(usernames)) for _ in range(requests)]
+
+    def run(step):
+        name, username = step
+        _, elapsed = timed(operations[name], username)
+        return name, elapsed
+
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(run, plan))
+    wall = perf_counter() - started
+
+    by_operation = {name: latency_stats([e for n, e in results if n == name]) for name in operations}
+    return {"threads": threads, "overall": latency_stats([e for _, e in results]),
+            "requests_per_second": round(requests / wall, 1) if wall else 0.0, "operations": by_operation}
+
+def bench_api(usernames: list, threads: int, requests: int, seed: int = 0) -> dict:
+    """Sends chat and chart requests to an in-process API server from several HTTP clients."""
+    import app_logic
+    from api_client import ApiBusyError, ApiClient
+    from api_server import AgentService, start_server
+
+    app_logic.AGENT_FAKE_LLM = True
+    service = AgentService()
+    server = start_server("127.0.0.1", 0, service)
+    client = ApiClient(f"http://127.0.0.1:{server.server_address[1]}")
+    operations = {
+        "chat": lambda u: client.chat(u, "Give me one tip to save money.", session_id="bench"),
+        "chart": lambda u: client.chart_spec(u, "spending_breakdown"),
+    }
+    rng = random.Random(seed)
+    plan = [(rng.choice(list(operations)), rng.choice(usernames)) for _ in range(requests)]
+
+    def run(step):
+        name, username = step
+        try:
+            _, elapsed = timed(operations[name], username)
+            return name, elapsed, False
+        except ApiBusyError:
+            return name, None, True
+
+    started = perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(run, plan))
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.pool.shutdown()
+    wall = perf_counter() - started
+
+    served = [(n, e) for n, e, busy in results if not busy]
+    return {"threads": threads, "overall": latency_stats([e for _, e in served]),
+            "requests_per_second": round(len(served) / wall, 1) if wall else 0.0,
+            "busy": sum(busy for _, _, busy in results),
+            "operations": {name: latency_stats([e for n, e in served if n == name]) for name in operations}}
+
+def _fresh_interpreter_ms(code: str) -> float:
+    """Runs Python code in a new interpreter and returns the milliseconds it prints."""
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True,
+                            text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def bench_startup(runs: int = STARTUP_RUNS) -> dict:
+    """Measures cold import times and the login page's first render, each in a new interpreter."""
+    timer = "import time; started = time.perf_counter()\n{}\nprint((time.perf_counter() - started) * 1000)"
+    results = {"imports": {}}
+    for module in STARTUP_MODULES:
+        samples = [_fresh_interpreter_ms(timer.format(f"import {module}")) for _ in range(runs)]
+        results["imports"][module] = latency_stats(samples)
+    render = "from streamlit.testing.v1 import AppTest\nAppTest.from_file('app.py', default_timeout=60).run()"
+    results["first_render"] = latency_stats([_fresh_interpreter_ms(timer.format(render)) for _ in range(runs)])
+    return results
+
+# --- History ---
+
+def load_previous(history_file: str, params: dict) -> dict | None:
+    """Returns the most recent history entry with the same parameters."""
+    if not os.path.exists(history_file):
+        return None
+    previous = None
+    with open(history_file) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("params") == params:
+                previous = entry
+    return previous
+
+def _p50s(results: dict, prefix: str = "") -> dict:
+    """Flattens a results tree into {path: p50_ms} for comparison."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            if "p50_ms" in value:
+                flat[prefix + key] = value["p50_ms"]
+            flat.update(_p50s(value, prefix + key + "."))
+    return flat
+
+def print_report(results: dict, previous: dict | None):
+    print("\n--- Benchmark Results ---")
+    print(json.dumps(results, indent=2))
+    if previous is None:
+        return
+    print(f"\n--- Change in p50 since {previous['timestamp']} ({previous.get('revision')}) ---")
+    before = _p50s(previous["results"])
+    for path, p50 in _p50s(results).items():
+        if before.get(path):
+            print(f"  {path}: {before[path]:.2f} -> {p50:.2f} ms ({(p50 / before[path] - 1) * 100:+.1f}%)")
+
+# --- Main ---
+
+def run_benchmarks(users: int = DEFAULT_USERS, transactions: int = DEFAULT_TRANSACTIONS,
+                   threads: int = DEFAULT_THREADS, requests: int = DEFAULT_REQUESTS,
+                   seed: int = 0, load: bool = True) -> dict:
+    """
+    Runs every benchmark against the current database (`database.DB_PATH`).
+
+    Returns:
+        A dictionary of results keyed by benchmark name.
+    """
+    from answer_cache import get_answer_cache
+
+    # Measure the work itself, not answers cached by a previous run.
+    get_answer_cache().enabled = False
+
+    results = {}
+    if load:
+        print(f"Loading {users} users x {transactions} transactions...")
+        results["db_load"] = bench_db_load(users, transactions, seed)
+    usernames = _sample_users(max(users, SAMPLE_USERS))
+    sample = usernames[:SAMPLE_USERS]
+
+    print("Benchmarking charts...")
+    results["charts"] = bench_charts(sample)
+    print("Benchmarking summaries...")
+    results["summary"] = bench_summary(sample)
+    print("Benchmarking Plaid ingest...")
+    results["plaid_ingest"] = bench_plaid_ingest()
+    print(f"Benchmarking {requests} queries from {threads} threads...")
+    results["concurrent_queries"] = bench_concurrent_queries(usernames, threads, requests, seed)
+    print(f"Benchmarking {requests} API requests from {threads} clients...")
+    results["api"] = bench_api(usernames, threads, requests, seed)
+    print("Benchmarking cold start...")
+    results["startup"] = bench_startup()
+    return results
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description="Benchmark the AI Finance Agent offline.")
+    parser.add_argument("--db", default=BENCHMARK_DB, help="Benchmark database (not the app database).")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--transactions", type=int, default=DEFAULT_TRANSACTIONS, help="Transactions per user.")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS)
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-load", action="store_true", help="Reuse the data already in --db.")
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--startup-only", action="store_true", help="Only measure import and first render times.")
+    args = parser.parse_args()
+
+    if args.startup_only:
+        print_report({"startup": bench_startup()}, None)
+        return
+
+    # Every module resolves the default database at call time, so this redirects them all;
+    # clearing the shard directory keeps a sharded deployment's files out of the run.
+    database.DB_PATH = args.db
+    database.SHARD_DIR = ""
+    params = {"users": args.users, "transactions": args.transactions,
+              "threads": args.threads, "requests": args.requests}
+
+    results = run_benchmarks(args.users, args.transactions, args.threads, args.requests,
+                             args.seed, load=not args.skip_load)
+    previous = load_previous(args.history, params)
+    print_report(results, previous)
+
+    entry = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": _git_revision(),
+             "params": params, "results": results}
+    with open(args.history, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    print(f"\nResults appended to '{args.history}'.")
+
+if __name__ == "__main__":
+    main()
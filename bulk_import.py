@@ -0,0 +1,387 @@
+"""
+Bulk importer for bank statement CSVs in the AI Finance Agent.
+
+Loads statement exports of any size into `bank_transactions` for a given user:
+1. The file is streamed with the `csv` module and written in chunks, so memory
+   use depends on the chunk size, not the file size.
+2. Headers are matched against common export names (e.g. "Narration",
+   "Transaction Date", separate "Withdrawal"/"Deposit" columns), and dates and
+   amounts are normalized to ISO dates and integer minor units (see `schema.py`).
+   One date format is detected per file from its first rows, so a file is never
+   read partly day-first and partly month-first.
+3. Invalid rows are skipped and reported with their line numbers.
+4. Rows are given a merchant and category on the way in (see `categorization.py`).
+5. Each chunk is written in one transaction with a single prepared statement.
+   In "upsert" mode rows get a stable `transaction_id` derived from their content
+   (`csv:<user>:<source>:<hash of date, description, amount>:<occurrence>`), so
+   re-importing the same file, or an export whose window overlaps an earlier one,
+   does not duplicate rows. In "append" mode rows are inserted without an id.
+   Other users' rows are never touched.
+
+To run, execute `python bulk_import.py statement.csv --user jsmith`.
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from itertools import chain, islice
+from time import perf_counter
+
+from categorization import categorize
+from database import bump_data_version, user_db_path, write_transaction
+from instrumentation import instrumented
+
+# --- Configuration Constants ---
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "20000"))
+MAX_REPORTED_ERRORS = 20
+IMPORT_MODES = ("upsert", "append")
+DATE_SAMPLE_ROWS = 500  # Rows whose dates decide a file's date format.
+# Candidates when no explicit format is given. When several parse the sampled
+# dates equally well the earlier wins: day-first formats come before month-first
+# ones, matching the statements the app is used with.
+DATE_FORMATS = [
+    "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d-%m-%y",
+    "%d %b %Y", "%d-%b-%Y", "%d-%b-%y", "%b %d, %Y", "%Y/%m/%d", "%m/%d/%Y",
+]
+# Accepted header names per field, compared case-insensitively without spaces or punctuation.
+COLUMN_ALIASES = {
+    "date": ["date", "transactiondate", "txndate", "valuedate", "postingdate", "posteddate"],
+    "description": ["description", "narration", "particulars", "details", "memo", "name", "remarks"],
+    "amount": ["amount", "transactionamount", "amountinr", "value"],
+    "debit": ["debit", "withdrawal", "withdrawalamount", "withdrawalamt", "debitamount", "dr"],
+    "credit": ["credit", "deposit", "depositamount", "depositamt", "creditamount", "cr"],
+    "type": ["type", "transactiontype", "drcr", "crdr"],
+}
+DEBIT_TYPES = {"debit", "dr", "d", "withdrawal"}
+CREDIT_TYPES = {"credit", "cr", "c", "deposit"}
+
+INSERT_SQL = """
+INSERT INTO bank_transactions (transaction_id, Date, Description, AmountMinor, Type, username, Merchant, Category)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+UPSERT_SQL = INSERT_SQL + """
+ON CONFLICT(transaction_id) WHERE transaction_id IS NOT NULL DO UPDATE SET
+    Date = excluded.Date,
+    Description = excluded.Description,
+    AmountMinor = excluded.AmountMinor,
+    Type = excluded.Type,
+    Merchant = excluded.Merchant,
+    Category = excluded.Category
+"""
+
+class ImportFormatError(ValueError):
+    """Raised when a file's header has no usable date, description or amount columns."""
+
+@dataclass
+class ImportResult:
+    rows_read: int = 0
+    rows_written: int = 0
+    rows_invalid: int = 0
+    errors: list = field(default_factory=list)  # (line number, message), first MAX_REPORTED_ERRORS only
+    date_format: str | None = None  # The format given or detected for the file.
+    elapsed_s: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return round(self.rows_read / self.elapsed_s, 1) if self.elapsed_s else 0.0
+
+# --- Parsing ---
+
+def _normalize_header(name: str) -> str:
+    return re.sub(r"[^a-z]", "", (name or "").lower())
+
+def map_columns(header: list) -> dict:
+    """
+    Maps the importer's fields onto a CSV header.
+
+    Returns:
+        A dictionary of field name to column index.
+
+    Raises:
+        ImportFormatError: If the date, description or amount columns are missing.
+    """
+    normalized = [_normalize_header(h) for h in header]
+    mapping = {}
+    for field_name, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                mapping[field_name] = normalized.index(alias)
+                break
+    if "date" not in mapping or "description" not in mapping:
+        raise ImportFormatError(f"Need date and description columns, found: {header}")
+    if "amount" not in mapping and not ("debit" in mapping or "credit" in mapping):
+        raise ImportFormatError(f"Need an amount column or debit/credit columns, found: {header}")
+    return mapping
+
+@lru_cache(maxsize=4096)  # Statements repeat the same dates many times.
+def parse_date(value: str, date_format: str | None = None) -> str:
+    """Parses a statement date into ISO `YYYY-MM-DD`."""
+    value = value.strip()
+    for fmt in [date_format] if date_format else DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date '{value}'")
+
+def _matches_format(value: str, fmt: str) -> bool:
+    try:
+        datetime.strptime(value.strip(), fmt)
+        return True
+    except ValueError:
+        return False
+
+def detect_date_format(values: list) -> str:
+    """
+    Picks the date format of a file from a sample of its date cells.
+
+    Returns:
+        The entry of DATE_FORMATS that parses the most sampled dates; earlier
+        entries win ties.
+
+    Raises:
+        ImportFormatError: If no format parses any of the dates.
+    """
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = sum(_matches_format(value, fmt) for value in values)
+        if count > best_count:
+            best, best_count = fmt, count
+    if best is None:
+        raise ImportFormatError(f"Could not recognize dates such as {values[:3]}; pass --date-format.")
+    return best
+
+def parse_amount_minor(value: str) -> int | None:
+    """
+    Parses an amount such as '1,234.50', '(99.00)', '₹ 500 Dr' or '-12' into minor units.
+
+    A trailing 'Dr' or parentheses make the amount negative. Returns None for an
+    empty cell.
+    """
+    text = (value or "").strip()
+    if not text or text in ("-", "--"):
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    suffix = re.search(r"(dr|cr)\.?$", text, re.IGNORECASE)
+    if suffix:
+        negative = negative or suffix.group(1).lower() == "dr"
+        text = text[:suffix.start()]
+    cleaned = re.sub(r"[^0-9.\-]", "", text)
+    try:
+        amount = Decimal(cleaned)
+    except InvalidOperation:
+        raise ValueError(f"unrecognized amount '{value}'") from None
+    minor = int((amount * 100).to_integral_value())
+    return -abs(minor) if negative else minor
+
+def normalize_row(cells: list, columns: dict, date_format: str | None = None) -> tuple:
+    """
+    Normalizes one CSV row into (Date, Description, AmountMinor, Type).
+
+    Debits are stored as negative amounts. When the file has a Type column its
+    value decides the sign; otherwise the sign of the amount (or the debit/credit
+    column it came from) does.
+
+    Raises:
+        ValueError: If the row cannot be normalized.
+    """
+    def cell(name):
+        index = columns.get(name)
+        return cells[index].strip() if index is not None and index < len(cells) else ""
+
+    description = cell("description")
+    if not description:
+        raise ValueError("missing description")
+    date = parse_date(cell("date"), date_format)
+
+    if "amount" in columns:
+        amount = parse_amount_minor(cell("amount"))
+    else:
+        debit = parse_amount_minor(cell("debit")) or 0
+        credit = parse_amount_minor(cell("credit")) or 0
+        amount = abs(credit) - abs(debit) if (debit or credit) else None
+    if amount is None:
+        raise ValueError("missing amount")
+
+    declared = cell("type").lower().rstrip(".")
+    if declared in DEBIT_TYPES:
+        amount = -abs(amount)
+    elif declared in CREDIT_TYPES:
+        amount = abs(amount)
+    elif declared:
+        raise ValueError(f"unrecognized type '{cell('type')}'")
+    return date, description, amount, "Debit" if amount < 0 else "Credit"
+
+def iter_statement_rows(lines, date_format: str | None = None, on_date_format=None):
+    """
+    Yields (line number, normalized row or None, error or None) for a CSV stream.
+
+    Args:
+        lines: An iterable of text lines, e.g. an open file.
+        date_format: Optional `strptime` format for the date column; by default
+            it is detected from the first DATE_SAMPLE_ROWS rows and used for every row.
+        on_date_format: Optional callable receiving the format the rows are parsed with.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        raise ImportFormatError("The file is empty.")
+    columns = map_columns(header)
+    numbered = ((reader.line_num, cells) for cells in reader if any(c.strip() for c in cells))
+    sample = list(islice(numbered, DATE_SAMPLE_ROWS))
+    if date_format is None and sample:
+        index = columns["date"]
+        date_format = detect_date_format([cells[index] for _, cells in sample
+                                          if index < len(cells) and cells[index].strip()])
+    if on_date_format is not None:
+        on_date_format(date_format)
+    for line, cells in chain(sample, numbered):
+        try:
+            yield line, normalize_row(cells, columns, date_format), None
+        except ValueError as e:
+            yield line, None, str(e)
+
+# --- Writing ---
+
+def upsert_ids(username: str, source: str, rows: list, occurrences: Counter) -> list:
+    """
+    Returns content-based transaction ids for normalized rows.
+
+    Identical rows (same date, description and amount) are told apart by an
+    occurrence number counted from the start of the file, so two equal purchases
+    on one day stay two rows, and the ids do not depend on line numbers.
+
+    Args:
+        username: The user the rows belong to.
+        source: Identifies the account or file.
+        rows: (line number, (Date, Description, AmountMinor, Type)) pairs.
+        occurrences: Counts of the rows seen so far in the file; updated in place.
+    """
+    ids = []
+    for _, (date, description, amount, _) in rows:
+        digest = hashlib.sha1(f"{date}\x1f{description}\x1f{amount}".encode()).hexdigest()[:16]
+        occurrences[digest] += 1
+        ids.append(f"csv:{username}:{source}:{digest}:{occurrences[digest]}")
+    return ids
+
+def write_rows(conn, username: str, rows: list, mode: str = "upsert", source: str = "import",
+               occurrences: Counter | None = None) -> int:
+    """
+    Categorizes normalized rows (see `categorization.py`) and writes them with one
+    prepared statement inside the caller's transaction.
+
+    Args:
+        conn: The writer connection (see `database.write_transaction`).
+        username: The user the rows belong to.
+        rows: (line number, (Date, Description, AmountMinor, Type)) pairs.
+        mode: "upsert" keys rows on their content (see `upsert_ids`); "append" inserts them without an id.
+        source: Identifies the file in upsert ids.
+        occurrences: Row counts carried across the chunks of one file; a new file starts empty.
+
+    Returns:
+        The number of rows written.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+    sql = UPSERT_SQL if mode == "upsert" else INSERT_SQL
+    ids = (upsert_ids(username, source, rows, Counter() if occurrences is None else occurrences)
+           if mode == "upsert" else [None] * len(rows))
+    merchants, categories = categorize([row[1] for _, row in rows], [row[3] for _, row in rows])
+    conn.executemany(sql, (
+        (transaction_id, *row, username, merchant, category)
+        for transaction_id, (_, row), merchant, category in zip(ids, rows, merchants, categories)
+    ))
+    return len(rows)
+
+@instrumented("import")
+def import_csv(path: str, username: str, mode: str = "upsert", source: str | None = None,
+               chunk_size: int = IMPORT_CHUNK_SIZE, date_format: str | None = None,
+               encoding: str = "utf-8-sig", db_path: str | None = None, progress=None) -> ImportResult:
+    """
+    Streams a bank statement CSV into `bank_transactions` for a user.
+
+    Args:
+        path: The CSV file.
+        username: The user the transactions belong to.
+        mode: "upsert" (re-importable) or "append".
+        source: Name used in upsert ids; defaults to the file name. Use the same
+            source when importing later or overlapping exports of the same account.
+        chunk_size: Rows written per transaction.
+        date_format: Optional `strptime` format; by default one is detected from the first rows.
+        encoding: File encoding; the default also strips a byte-order mark.
+        db_path: Target database; defaults to the file holding the user's shard.
+        progress: Optional callable receiving the ImportResult after each chunk.
+
+    Returns:
+        An ImportResult with counts, the first errors and the elapsed time.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+    source = source or os.path.basename(path)
+    db_path = db_path or user_db_path(username)
+    result = ImportResult()
+    occurrences = Counter()
+    started = perf_counter()
+
+    with open(path, newline="", encoding=encoding) as f:
+        parsed = iter_statement_rows(f, date_format,
+                                     on_date_format=lambda fmt: setattr(result, "date_format", fmt))
+        while chunk := list(islice(parsed, chunk_size)):
+            valid = []
+            for line, row, error in chunk:
+                if error is None:
+                    valid.append((line, row))
+                    continue
+                result.rows_invalid += 1
+                if len(result.errors) < MAX_REPORTED_ERRORS:
+                    result.errors.append((line, error))
+            result.rows_read += len(chunk)
+
+            if valid:
+                with write_transaction(db_path) as conn:
+                    result.rows_written += write_rows(conn, username, valid, mode, source, occurrences)
+                    bump_data_version(conn, username)
+            result.elapsed_s = perf_counter() - started
+            if progress is not None:
+                progress(result)
+
+    result.elapsed_s = perf_counter() - started
+    return result
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description="Import a bank statement CSV for a user.")
+    parser.add_argument("path", help="CSV file to import.")
+    parser.add_argument("--user", required=True, help="Username the transactions belong to.")
+    parser.add_argument("--mode", choices=IMPORT_MODES, default="upsert")
+    parser.add_argument("--source", default=None, help="Stable name for the account in upsert ids.")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--date-format", default=None,
+                        help="strptime format, e.g. %%m/%%d/%%Y (default: detected from the first rows).")
+    parser.add_argument("--encoding", default="utf-8-sig")
+    parser.add_argument("--db", default=None, help="Target database (default: the user's shard).")
+    args = parser.parse_args()
+
+    def report(progress):
+        print(f"  {progress.rows_read} rows read ({progress.rows_per_second} rows/s)...")
+
+    result = import_csv(args.path, args.user, mode=args.mode, source=args.source, chunk_size=args.chunk_size,
+                        date_format=args.date_format, encoding=args.encoding, db_path=args.db, progress=report)
+    print(f"Imported {result.rows_written} of {result.rows_read} rows for '{args.user}' in "
+          f"{result.elapsed_s:.2f}s ({result.rows_per_second} rows/s).")
+    if result.date_format:
+        print(f"Dates were read as {result.date_format}; pass --date-format if that is wrong.")
+    if result.rows_invalid:
+        print(f"Skipped {result.rows_invalid} invalid rows:")
+        for line, error in result.errors:
+            print(f"  line {line}: {error}")
+
+if __name__ == "__main__":
+    main()
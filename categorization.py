@@ -0,0 +1,227 @@
+"""
+Transaction categorization for the AI Finance Agent.
+
+Assigns every bank transaction a normalized `Merchant` and a `Category` when it
+is written, so category questions become an indexed GROUP BY instead of the LLM
+guessing from free-text descriptions:
+1. Descriptions are cleaned of payment-rail prefixes, reference numbers and
+   card/terminal noise, and matched against a merchant alias table.
+2. Categories come from Plaid's own category when the transaction has one,
+   otherwise from a keyword rule set compiled into a single regular expression.
+3. Batches are categorized per distinct description, so repeated merchants
+   (the common case) cost one dictionary lookup.
+
+`recategorize` re-applies the current rules to stored rows in id-ordered
+batches, e.g. after the rules change.
+
+To run, execute `python categorization.py [--user jsmith]`.
+"""
+
+import argparse
+import re
+from functools import lru_cache
+
+# --- Rules ---
+CATEGORIES = [
+    "Food & Dining", "Groceries", "Transport", "Travel", "Shopping", "Bills & Utilities",
+    "Rent", "Entertainment", "Health & Fitness", "Investments", "Transfers", "Income", "Other",
+]
+DEFAULT_CATEGORY = "Other"
+# Category -> keywords matched as whole words in the cleaned, lower-cased description.
+CATEGORY_RULES = {
+    "Food & Dining": ["zomato", "swiggy", "restaurant", "cafe", "starbucks", "mcdonald's", "mcdonalds", "kfc",
+                      "dominos", "pizza", "burger", "bakery", "food"],
+    "Groceries": ["bigbasket", "instamart", "blinkit", "zepto", "dmart", "grocery", "groceries", "supermarket"],
+    "Transport": ["uber", "ola", "rapido", "metro", "petrol", "fuel", "parking", "toll", "fastag"],
+    "Travel": ["airlines", "airways", "indigo", "irctc", "makemytrip", "hotel", "airbnb"],
+    "Shopping": ["amazon", "flipkart", "myntra", "ajio", "nykaa", "purchase", "store", "shop"],
+    "Bills & Utilities": ["electricity", "recharge", "broadband", "internet", "water bill", "gas bill",
+                          "bill payment", "insurance", "airtel", "jio"],
+    "Rent": ["rent"],
+    "Entertainment": ["netflix", "spotify", "hotstar", "prime video", "movie", "movies", "pvr", "bookmyshow"],
+    "Health & Fitness": ["pharmacy", "hospital", "clinic", "apollo", "medical", "gym", "fitness", "climbing",
+                         "bicycle"],
+    "Investments": ["mutual fund", "sip", "zerodha", "groww", "upstox", "stocks"],
+    "Transfers": ["credit card payment", "card payment", "transfer", "neft", "imps", "rtgs"],
+    "Income": ["salary", "payroll", "interest credit", "dividend", "refund"],
+}
+# Lower-cased alias -> canonical merchant name.
+MERCHANT_ALIASES = {
+    "zomato": "Zomato", "swiggy instamart": "Swiggy Instamart", "instamart": "Swiggy Instamart",
+    "swiggy": "Swiggy", "uber": "Uber", "ola": "Ola", "amazon": "Amazon", "amzn": "Amazon",
+    "flipkart": "Flipkart", "bigbasket": "BigBasket", "starbucks": "Starbucks", "netflix": "Netflix",
+    "zerodha": "Zerodha", "mcdonald's": "McDonald's", "mcdonalds": "McDonald's", "kfc": "KFC",
+    "united airlines": "United Airlines", "airtel": "Airtel", "jio": "Jio",
+}
+# Plaid personal_finance_category.primary (or the first legacy `category` entry) -> category.
+PLAID_CATEGORY_MAP = {
+    "FOOD_AND_DRINK": "Food & Dining", "Food and Drink": "Food & Dining",
+    "TRANSPORTATION": "Transport", "TRAVEL": "Travel", "Travel": "Travel",
+    "GENERAL_MERCHANDISE": "Shopping", "Shops": "Shopping",
+    "RENT_AND_UTILITIES": "Bills & Utilities", "Service": "Bills & Utilities",
+    "ENTERTAINMENT": "Entertainment", "Recreation": "Entertainment",
+    "MEDICAL": "Health & Fitness", "Healthcare": "Health & Fitness", "PERSONAL_CARE": "Health & Fitness",
+    "INCOME": "Income", "TRANSFER_IN": "Transfers", "TRANSFER_OUT": "Transfers", "Transfer": "Transfers",
+    "LOAN_PAYMENTS": "Transfers", "Payment": "Transfers", "BANK_FEES": "Bills & Utilities",
+}
+RECATEGORIZE_BATCH_SIZE = 5000
+
+# Payment-rail prefixes, reference numbers and other noise removed before matching.
+_NOISE_PATTERN = re.compile(
+    r"^(upi|pos|neft|imps|rtgs|ach|nach|ecom|vps|bil|mmt)[\s/\-:*]+"
+    r"|\b[a-z]*\d[a-z\d]{5,}\b"  # references such as 063015 or TXN12AB34CD
+    r"|[*#/\\]+|\s{2,}",
+    re.IGNORECASE,
+)
+
+def _keyword_pattern(keywords) -> str:
+    return "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+
+# One alternation per table; the named group tells which category matched.
+_CATEGORY_PATTERN = re.compile(
+    "|".join(f"(?P<c{i}>\\b(?:{_keyword_pattern(words)})\\b)" for i, words in enumerate(CATEGORY_RULES.values()))
+)
+_CATEGORY_BY_GROUP = {f"c{i}": category for i, category in enumerate(CATEGORY_RULES)}
+_MERCHANT_PATTERN = re.compile(rf"\b(?:{_keyword_pattern(MERCHANT_ALIASES)})\b")
+
+# --- Core Functions ---
+
+def clean_description(description: str) -> str:
+    """Removes payment-rail prefixes, reference numbers and separators from a description."""
+    text = description or ""
+    previous = None
+    while previous != text:
+        previous, text = text, _NOISE_PATTERN.sub(" ", text).strip()
+    return text
+
+@lru_cache(maxsize=65536)
+def categorize_description(description: str, txn_type: str = "Debit") -> tuple:
+    """
+    Returns (merchant, category) for one description using the rule set.
+
+    Unmatched credits are categorized as "Income" only when a rule says so;
+    everything else unmatched is DEFAULT_CATEGORY.
+    """
+    cleaned = clean_description(description)
+    lowered = cleaned.lower()
+
+    alias = _MERCHANT_PATTERN.search(lowered)
+    merchant = MERCHANT_ALIASES[alias.group(0)] if alias else (cleaned.title() if cleaned.islower() else cleaned)
+
+    match = _CATEGORY_PATTERN.search(lowered)
+    category = _CATEGORY_BY_GROUP[match.lastgroup] if match else DEFAULT_CATEGORY
+    if category == "Income" and txn_type == "Debit":
+        category = DEFAULT_CATEGORY
+    return merchant or description, category
+
+def plaid_category(transaction: dict) -> str | None:
+    """Maps Plaid's category fields on a transaction onto CATEGORIES, if present."""
+    primary = (transaction.get("personal_finance_category") or {}).get("primary")
+    if primary in PLAID_CATEGORY_MAP:
+        return PLAID_CATEGORY_MAP[primary]
+    legacy = transaction.get("category") or []
+    return PLAID_CATEGORY_MAP.get(legacy[0]) if legacy else None
+
+def categorize(descriptions, types=None, known_categories=None) -> tuple:
+    """
+    Categorizes a batch of transactions.
+
+    Args:
+        descriptions: Transaction descriptions.
+        types: Optional matching "Debit"/"Credit" values (default: all debits).
+        known_categories: Optional matching categories from the source (e.g. Plaid);
+            None entries fall back to the rules.
+
+    Returns:
+        A tuple of (merchants, categories) lists in input order.
+    """
+    types = types if types is not None else ["Debit"] * len(descriptions)
+    known = known_categories if known_categories is not None else [None] * len(descriptions)
+    merchants, categories = [], []
+    for description, txn_type, source_category in zip(descriptions, types, known):
+        merchant, category = categorize_description(description, txn_type)
+        merchants.append(merchant)
+        categories.append(source_category or category)
+    return merchants, categories
+
+# --- Batch Recategorization ---
+
+def recategorize_rows(conn, username: str | None = None, batch_size: int = RECATEGORIZE_BATCH_SIZE,
+                      after_id: int = 0, limit_batches: int | None = None) -> tuple:
+    """
+    Re-applies the rules to stored transactions in id order, inside the caller's transaction.
+
+    Rows are read and updated `batch_size` at a time using keyset pagination on id.
+    Only rows whose merchant or category changes are written. A stored category
+    (e.g. from Plaid) is never replaced by DEFAULT_CATEGORY.
+
+    Returns:
+        A tuple of (rows updated, last id processed, usernames with changes).
+    """
+    where = "WHERE id > ?" + (" AND username = ?" if username else "")
+    updated, changed_users, batches = 0, set(), 0
+    while limit_batches is None or batches < limit_batches:
+        params = (after_id, username) if username else (after_id,)
+        rows = conn.execute(
+            f"SELECT id, Description, Type, Merchant, Category, username FROM bank_transactions "
+            f"{where} ORDER BY id LIMIT ?", (*params, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        merchants, categories = categorize([r[1] for r in rows], [r[2] for r in rows])
+        changes = []
+        for (row_id, _, _, old_merchant, old_category, owner), merchant, category in zip(rows, merchants, categories):
+            if category == DEFAULT_CATEGORY and old_category:
+                category = old_category
+            if (old_merchant, old_category) != (merchant, category):
+                changes.append((merchant, category, row_id))
+                changed_users.add(owner)
+        conn.executemany("UPDATE bank_transactions SET Merchant = ?, Category = ? WHERE id = ?", changes)
+        updated += len(changes)
+        after_id = rows[-1][0]
+        batches += 1
+    return updated, after_id, changed_users
+
+def recategorize(username: str | None = None, batch_size: int = RECATEGORIZE_BATCH_SIZE,
+                 db_path: str | None = None) -> int:
+    """
+    Re-categorizes stored transactions, committing one batch at a time so writers
+    are never blocked for long. Without `db_path`, the user's shard (or every
+    shard, for all users) is processed.
+
+    Returns:
+        The number of rows whose merchant or category changed.
+    """
+    from database import all_db_paths, bump_data_version, user_db_path, write_transaction
+
+    if db_path:
+        db_paths = [db_path]
+    else:
+        db_paths = [user_db_path(username)] if username else all_db_paths()
+    total = 0
+    for path in db_paths:
+        after_id = 0
+        while True:
+            with write_transaction(path) as conn:
+                updated, last_id, users = recategorize_rows(conn, username, batch_size, after_id, limit_batches=1)
+                for changed in users:
+                    bump_data_version(conn, changed)
+            total += updated
+            if last_id == after_id:
+                break
+            after_id = last_id
+    return total
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description="Re-categorize stored bank transactions.")
+    parser.add_argument("--user", default=None, help="Limit to one user (default: all users).")
+    parser.add_argument("--batch-size", type=int, default=RECATEGORIZE_BATCH_SIZE)
+    parser.add_argument("--db", default=None, help="Target database (default: FINANCE_DB_PATH, or every shard).")
+    args = parser.parse_args()
+
+    updated = recategorize(args.user, args.batch_size, args.db)
+    print(f"Re-categorized {updated} transactions for {args.user or 'all users'}.")
+
+if __name__ == "__main__":
+    main()
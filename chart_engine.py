@@ -0,0 +1,241 @@
+"""
+Chart engine for spending and portfolio visualizations in the AI Finance Agent.
+
+Charts are built from data aggregated in SQL, so their size does not grow with
+the number of transactions:
+1. Spending breakdown: top-N descriptions by debit total, plus an "Other" slice.
+2. Monthly trend: debits and credits per calendar month.
+3. Portfolio allocation: current value of each stock and mutual fund.
+
+Spending charts accept an optional inclusive date range. Figure specs (plain
+Plotly JSON) are cached per user, chart parameters and data version, and turned
+back into `go.Figure` objects on demand.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+import plotly.graph_objects as go
+
+if TYPE_CHECKING:
+    import pandas as pd
+# pandas and plotly.express are imported when a chart is first built, which keeps
+# them out of the login page's startup time.
+
+from database import get_data_version, read_connection, user_db_path
+
+# --- Configuration Constants ---
+CHART_TOP_N = int(os.getenv("CHART_TOP_N", "8"))
+CHART_CACHE_MAX_ENTRIES = 256
+GROUP_BY_COLUMNS = {"description": "Description", "merchant": "Merchant", "category": "Category"}
+CHART_TYPES = ("spending_breakdown", "monthly_trend", "portfolio_allocation")
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# --- Helper Functions ---
+
+def _date_filter(start: str | None, end: str | None, column: str = "Date") -> tuple:
+    """Returns an SQL fragment and parameters for an inclusive date range."""
+    clause, params = "", []
+    if start:
+        clause += f" AND {column} >= ?"
+        params.append(start)
+    if end:
+        clause += f" AND {column} <= ?"
+        params.append(end)
+    return clause, params
+
+def parse_date_range(text: str | None) -> tuple:
+    """
+    Extracts an optional date range from free text, e.g. a tool input such as
+    "2025-07-01 to 2025-07-31".
+
+    Returns:
+        A tuple of (start, end); either may be None.
+    """
+    dates = sorted(DATE_PATTERN.findall(text or ""))
+    if not dates:
+        return None, None
+    if len(dates) == 1:
+        return dates[0], None
+    return dates[0], dates[-1]
+
+def _range_label(start: str | None, end: str | None) -> str:
+    if start and end:
+        return f" ({start} to {end})"
+    if start:
+        return f" (since {start})"
+    if end:
+        return f" (until {end})"
+    return ""
+
+# --- Aggregations ---
+
+def spending_breakdown(conn, username: str, group_by: str = "description",
+                       start: str | None = None, end: str | None = None,
+                       top_n: int = CHART_TOP_N) -> "pd.DataFrame":
+    """
+    Aggregates a user's debits by a column, keeping the top N groups.
+
+    Args:
+        conn: An active sqlite3 connection object.
+        username: The user whose spending is aggregated.
+        group_by: A key of GROUP_BY_COLUMNS.
+        start: Optional first date (inclusive), 'YYYY-MM-DD'.
+        end: Optional last date (inclusive), 'YYYY-MM-DD'.
+        top_n: Number of groups shown individually; the rest become "Other".
+
+    Returns:
+        A DataFrame with `label` and `total` (major units) columns.
+    """
+    import pandas as pd
+
+    column = GROUP_BY_COLUMNS[group_by]
+    clause, params = _date_filter(start, end)
+    where = f"WHERE username = ? AND Type = 'Debit'{clause}"
+
+    rows = conn.execute(
+        f"SELECT COALESCE({column}, 'Unknown') AS label, -SUM(AmountMinor) AS total FROM bank_transactions "
+        f"{where} GROUP BY label ORDER BY total DESC, label LIMIT ?",
+        [username, *params, top_n],
+    ).fetchall()
+    grand_total = conn.execute(
+        f"SELECT COALESCE(-SUM(AmountMinor), 0) FROM bank_transactions {where}", [username, *params]
+    ).fetchone()[0]
+
+    other = grand_total - sum(total for _, total in rows)
+    if other > 0:
+        rows.append(("Other", other))
+    return pd.DataFrame([(label, total / 100) for label, total in rows], columns=["label", "total"])
+
+def monthly_totals(conn, username: str, start: str | None = None, end: str | None = None) -> "pd.DataFrame":
+    """
+    Aggregates a user's debits and credits per calendar month.
+
+    Returns:
+        A DataFrame with `month`, `spending` and `income` (major units) columns.
+    """
+    import pandas as pd
+
+    # One row per day from the daily rollups instead of every transaction.
+    clause, params = _date_filter(start, end, column="Day")
+    rows = conn.execute(
+        "SELECT substr(Day, 1, 7) AS month, "
+        "-SUM(CASE WHEN Type = 'Debit' THEN AmountMinor ELSE 0 END), "
+        "SUM(CASE WHEN Type = 'Credit' THEN AmountMinor ELSE 0 END) "
+        f"FROM daily_rollups WHERE username = ?{clause} GROUP BY month ORDER BY month",
+        [username, *params],
+    ).fetchall()
+    return pd.DataFrame([(m, d / 100, c / 100) for m, d, c in rows], columns=["month", "spending", "income"])
+
+def portfolio_allocation(conn, username: str) -> "pd.DataFrame":
+    """
+    Lists the current value of every holding in `stock_portfolio` and `mutual_funds`.
+
+    Returns:
+        A DataFrame with `holding`, `asset_class` and `value` columns.
+    """
+    import pandas as pd
+
+    rows = conn.execute(
+        "SELECT Ticker, 'Stocks', SUM(Quantity * CurrentPrice) FROM stock_portfolio WHERE username = ? "
+        "GROUP BY Ticker "
+        "UNION ALL "
+        "SELECT FundName, 'Mutual Funds', SUM(CurrentValue) FROM mutual_funds WHERE username = ? "
+        "GROUP BY FundName "
+        "ORDER BY 3 DESC",
+        (username, username),
+    ).fetchall()
+    return pd.DataFrame(rows, columns=["holding", "asset_class", "value"])
+
+# --- Figure Builders ---
+
+def build_chart(conn, username: str, chart_type: str, start: str | None = None,
+                end: str | None = None, top_n: int = CHART_TOP_N) -> go.Figure | None:
+    """
+    Builds a chart from aggregated data.
+
+    Args:
+        conn: An active sqlite3 connection object.
+        username: The user the chart is for.
+        chart_type: One of CHART_TYPES.
+        start: Optional first date (inclusive) for spending charts.
+        end: Optional last date (inclusive) for spending charts.
+        top_n: Number of individual slices in the spending breakdown.
+
+    Returns:
+        A Plotly Figure object if data is found, otherwise None.
+    """
+    import plotly.express as px
+
+    label = _range_label(start, end)
+    if chart_type == "spending_breakdown":
+        df = spending_breakdown(conn, username, start=start, end=end, top_n=top_n)
+        if df.empty:
+            return None
+        fig = px.pie(df, names="label", values="total", title=f"Spending Breakdown for {username}{label}", hole=.3)
+        fig.update_traces(textinfo="percent+label")
+    elif chart_type == "monthly_trend":
+        df = monthly_totals(conn, username, start=start, end=end)
+        if df.empty:
+            return None
+        fig = px.bar(df, x="month", y=["spending", "income"], barmode="group",
+                     title=f"Monthly Spending and Income for {username}{label}")
+        fig.update_layout(xaxis_title="Month", yaxis_title="Amount", legend_title_text="")
+    elif chart_type == "portfolio_allocation":
+        df = portfolio_allocation(conn, username)
+        if df.empty:
+            return None
+        fig = px.sunburst(df, path=["asset_class", "holding"], values="value",
+                          title=f"Portfolio Allocation for {username}")
+    else:
+        raise ValueError(f"Unknown chart type: {chart_type}")
+    return fig
+
+# --- Cache ---
+
+_specs = OrderedDict()  # (db_path, username, chart_type, start, end, top_n) -> (data_version, spec)
+_specs_lock = threading.Lock()
+_stats = {"hits": 0, "builds": 0}
+
+def get_chart_spec(username: str, chart_type: str, start: str | None = None, end: str | None = None,
+                   top_n: int = CHART_TOP_N, db_path: str | None = None) -> dict | None:
+    """
+    Returns the Plotly JSON spec of a chart, building it if the user's data changed.
+
+    Returns:
+        The figure as a JSON-compatible dictionary, or None if there is no data.
+    """
+    db_path = db_path or user_db_path(username)
+    key = (db_path, username, chart_type, start, end, top_n)
+    with read_connection(db_path) as conn:
+        version = get_data_version(conn, username)
+        with _specs_lock:
+            entry = _specs.get(key)
+            if entry is not None and entry[0] == version:
+                _specs.move_to_end(key)
+                _stats["hits"] += 1
+                return entry[1]
+        fig = build_chart(conn, username, chart_type, start=start, end=end, top_n=top_n)
+
+    spec = json.loads(fig.to_json()) if fig is not None else None
+    with _specs_lock:
+        _specs[key] = (version, spec)
+        _specs.move_to_end(key)
+        while len(_specs) > CHART_CACHE_MAX_ENTRIES:
+            _specs.popitem(last=False)
+        _stats["builds"] += 1
+    return spec
+
+def get_chart(username: str, chart_type: str, start: str | None = None, end: str | None = None,
+              top_n: int = CHART_TOP_N, db_path: str | None = None) -> go.Figure | None:
+    """Returns a chart as a Plotly Figure (see `get_chart_spec`), or None if there is no data."""
+    spec = get_chart_spec(username, chart_type, start=start, end=end, top_n=top_n, db_path=db_path)
+    return go.Figure(spec) if spec is not None else None
+
+def chart_cache_stats() -> dict:
+    with _specs_lock:
+        return {**_stats, "entries": len(_specs)}
@@ -0,0 +1,29 @@
+"""
+Bounded conversation memory for chat sessions.
+
+Kept apart from `app_logic.py` because `langchain.memory` is slow to import;
+it is only loaded when the first chat session is created.
+"""
+
+from langchain.memory import ConversationBufferWindowMemory
+
+class WindowedChatMemory(ConversationBufferWindowMemory):
+    """
+    Conversation memory bounded by a message window and an approximate token budget.
+
+    Unlike `ConversationBufferWindowMemory`, messages outside the window are
+    dropped from the stored history, so both the prompt size and the RAM used by a
+    long chat stay flat.
+    """
+    max_token_limit: int = 2000
+
+    def save_context(self, inputs, outputs) -> None:
+        super().save_context(inputs, outputs)
+        messages = self.chat_memory.messages
+        kept = messages[-2 * self.k:] if self.k > 0 else []
+        # Drop the oldest turns until the history fits the budget (~4 characters per token).
+        while len(kept) > 2 and sum(len(str(m.content)) for m in kept) // 4 > self.max_token_limit:
+            kept = kept[2:]
+        if len(kept) != len(messages):
+            self.chat_memory.clear()
+            self.chat_memory.add_messages(kept)
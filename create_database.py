@@ -2,22 +2,32 @@
 Database Setup Script for the AI Finance Agent.
 
 This script initializes a new SQLite database (`finance.db`). It performs two main tasks:
-1. Creates the necessary tables for the application.
+1. Creates the necessary tables for the application (see `schema.py`).
 2. Populates the tables with sample data from the `data/` directory for a default user.
 
 To run, execute `python create_database.py` from the project's root directory.
 This will delete and replace the existing `finance.db` file to ensure a clean setup.
+When FINANCE_SHARD_DIR is set, the shard directory is reset instead: its database
+files are deleted, a new layout (FINANCE_SHARD_MODE, FINANCE_SHARD_BUCKETS) is
+written and the sample data goes into the default user's shard.
 """
 
 import sqlite3
 import pandas as pd
 import os
 
+from bulk_import import iter_statement_rows, write_rows
+import database
+from database import (all_db_paths, bump_data_version, user_db_path, write_shard_layout,
+                      write_transaction)
+from schema import migrate
+from sharding import remove_database_file
+
 # --- Configuration Constants ---
 DB_FILE = "finance.db"
 DATA_DIR = "data"
 CSV_FILES = {
-    "bank_transactions": "bank_transactions.csv",
+    "bank_transactions": "bank_transaction.csv",
     "stock_portfolio": "stock_portfolio.csv",
     "mutual_funds": "mutual_funds.csv",
 }
@@ -25,67 +35,104 @@ DEFAULT_USER = "jsmith"
 
 def create_tables(conn):
     """
-    Creates the database schema (tables).
+    Creates the database schema (tables and indexes) at the latest version.
 
     Args:
         conn: An active sqlite3 connection object.
     """
-    cursor = conn.cursor()
-    # Table for storing Plaid API credentials
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS plaid_items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT NOT NULL,
-        access_token TEXT NOT NULL,
-        item_id TEXT NOT NULL,
-        UNIQUE(username, item_id)
+    version = migrate(conn)
+    print(f"Database schema created successfully (version {version}).")
+
+def insert_dataframe(conn, table_name: str, df: pd.DataFrame):
+    """
+    Appends a DataFrame to a table with a single prepared INSERT statement.
+
+    Unlike `DataFrame.to_sql`, this does not commit, so it can run inside the
+    caller's transaction.
+    """
+    columns = ", ".join(df.columns)
+    placeholders = ", ".join("?" for _ in df.columns)
+    conn.executemany(
+        f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})",
+        df.astype(object).itertuples(index=False, name=None),
     )
-    """)
-    # The data tables will be created by pandas later, but we ensure they don't exist
-    # from a previous run to guarantee a clean slate.
-    cursor.execute("DROP TABLE IF EXISTS bank_transactions")
-    cursor.execute("DROP TABLE IF EXISTS stock_portfolio")
-    cursor.execute("DROP TABLE IF EXISTS mutual_funds")
-    conn.commit()
-    print("Database schema created successfully.")
 
 def populate_sample_data(conn, username):
     """
     Populates the database with sample data from CSV files for a given user.
 
+    Any existing rows for the user are replaced so that each run starts with fresh
+    sample data, while other users' rows are left untouched.
+
     Args:
         conn: An active sqlite3 connection object.
         username: The default username to assign the sample data to.
     """
     print(f"\nAttempting to populate sample data for user: '{username}'...")
+    # A savepoint keeps the load all-or-nothing, whether or not the caller
+    # already holds a transaction.
+    conn.execute("SAVEPOINT sample_data")
     try:
         for table_name, file_name in CSV_FILES.items():
             csv_path = os.path.join(DATA_DIR, file_name)
-            df = pd.read_csv(csv_path)
-            df['username'] = username
-            # Use 'replace' to ensure that each run starts with fresh sample data
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
-            print(f"  - Table '{table_name}' populated with {len(df)} rows.")
+            conn.execute(f"DELETE FROM {table_name} WHERE username = ?", (username,))
+            if table_name == "bank_transactions":
+                # Statements go through the bulk importer's normalization (see bulk_import.py).
+                with open(csv_path, newline="", encoding="utf-8-sig") as f:
+                    rows = [(line, row) for line, row, error in iter_statement_rows(f) if error is None]
+                count = write_rows(conn, username, rows, mode="append")
+            else:
+                df = pd.read_csv(csv_path)
+                df['username'] = username
+                insert_dataframe(conn, table_name, df)
+                count = len(df)
+            print(f"  - Table '{table_name}' populated with {count} rows.")
+        bump_data_version(conn, username)
+        conn.execute("RELEASE sample_data")
         print("Sample data populated successfully.")
     except FileNotFoundError as e:
+        conn.execute("ROLLBACK TO sample_data")
+        conn.execute("RELEASE sample_data")
         print(f"Warning: Could not populate sample data. CSV file not found: {e.filename}")
     except Exception as e:
+        conn.execute("ROLLBACK TO sample_data")
+        conn.execute("RELEASE sample_data")
         print(f"An error occurred during data population: {e}")
 
+def reset_shards():
+    """
+    Deletes the database files of the current shard layout and writes a new layout.
+
+    Returns:
+        The path of the default user's shard.
+    """
+    for path in all_db_paths():
+        remove_database_file(path)
+        print(f"Removed old shard: {path}")
+    layout = write_shard_layout(database.SHARD_DIR, database.SHARD_MODE, database.SHARD_BUCKETS)
+    print(f"Wrote shard layout to {database.SHARD_DIR}: {layout}")
+    return user_db_path(DEFAULT_USER)
+
 def main():
     """
     Main function to orchestrate the database setup.
     """
-    print(f"--- Initializing Database: {DB_FILE} ---")
+    if database.SHARD_DIR:
+        db_file = reset_shards()
+    else:
+        db_file = DB_FILE
+    print(f"--- Initializing Database: {db_file} ---")
     
     # Ensure a clean start by deleting the old database file if it exists
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
-        print(f"Removed old database file: {DB_FILE}")
+    # (with its -wal/-shm files, which SQLite would otherwise replay into the new one)
+    existed = os.path.exists(db_file)
+    remove_database_file(db_file)
+    if existed:
+        print(f"Removed old database file: {db_file}")
 
     try:
-        # Use a 'with' statement for robust connection handling
-        with sqlite3.connect(DB_FILE) as conn:
+        # The shared writer commits on success and rolls back on error
+        with write_transaction(db_file) as conn:
             create_tables(conn)
             populate_sample_data(conn, DEFAULT_USER)
         print(f"\n--- Database setup complete. ---")
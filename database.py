@@ -0,0 +1,362 @@
+"""
+Shared SQLite connection layer for the AI Finance Agent.
+
+Every module reaches `finance.db` through this layer, which provides:
+1. Connections configured for concurrency: WAL journaling, a busy timeout and
+   tuned pragmas (synchronous, cache_size, mmap_size).
+2. One pooled, read-only connection per thread for queries.
+3. A single writer connection per database file; writes are serialized through it.
+4. A SQLAlchemy engine over the same settings for the LangChain `SQLDatabase`.
+5. Basic pool statistics to spot contention, and timing spans for reads,
+   writes and agent SQL statements (see `instrumentation.py`).
+6. Per-user data versions, bumped by every writer so caches can detect stale results.
+7. Optional sharding: when FINANCE_SHARD_DIR holds a shard layout (see
+   `sharding.py`), each user's rows live in their own database file, or in one of
+   N hash buckets, and `user_db_path` routes a username to that file.
+
+The schema is migrated (see `schema.py`) the first time a database file is opened.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import zlib
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from instrumentation import instrument_engine, record_span
+from schema import migrate
+
+# --- Configuration Constants ---
+DB_PATH = os.getenv("FINANCE_DB_PATH", "finance.db")
+BUSY_TIMEOUT_MS = 5000
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # Safe with WAL; fsync only at checkpoints.
+    "cache_size": -16000,  # Negative values are KiB, i.e. ~16 MB of page cache.
+    "mmap_size": 268435456,  # 256 MB memory-mapped I/O for reads.
+    "temp_store": "MEMORY",
+}
+ENGINE_POOL_SIZE = 5
+# Sharding is off until FINANCE_SHARD_DIR is set and contains a layout file.
+SHARD_DIR = os.getenv("FINANCE_SHARD_DIR", "")
+SHARD_MODE = os.getenv("FINANCE_SHARD_MODE", "hash")  # Default for new layouts: "user" or "hash".
+SHARD_BUCKETS = int(os.getenv("FINANCE_SHARD_BUCKETS", "16"))
+SHARD_MODES = ("user", "hash")
+SHARD_LAYOUT_FILE = "shards.json"
+
+# --- Connection Helpers ---
+
+def open_connection(db_path: str | None = None, read_only: bool = False):
+    """
+    Opens a new sqlite3 connection with the shared pragmas applied.
+
+    Args:
+        db_path: Path to the SQLite database file. Defaults to `DB_PATH`.
+        read_only: If True, the connection rejects writes (`PRAGMA query_only`).
+
+    Returns:
+        A configured sqlite3 connection that may be used from any thread.
+    """
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def _is_busy_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+# --- Connection Manager ---
+
+class ConnectionManager:
+    """
+    Owns the connections to a single database file.
+
+    Reads use a per-thread connection in autocommit mode, so WAL lets them run
+    while a write is in progress. Writes go through one connection guarded by a
+    lock, so writers in this process queue up instead of failing with
+    "database is locked".
+    """
+
+    def __init__(self, db_path: str | None = None):
+        self.db_path = db_path or DB_PATH
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._engine = None
+        self._stats = {
+            "connections_opened": 0,
+            "read_checkouts": 0,
+            "write_transactions": 0,
+            "write_rollbacks": 0,
+            "write_contended": 0,
+            "write_wait_seconds_total": 0.0,
+            "write_wait_seconds_max": 0.0,
+            "busy_errors": 0,
+        }
+
+        self._writer = self._open(read_only=False)
+        migrate(self._writer)
+
+    def _open(self, read_only: bool):
+        conn = open_connection(self.db_path, read_only=read_only)
+        self._count("connections_opened")
+        return conn
+
+    def _count(self, key: str, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    @contextmanager
+    def read(self):
+        """Yields this thread's read-only connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open(read_only=True)
+            conn.isolation_level = None
+            self._local.conn = conn
+        self._count("read_checkouts")
+        started = perf_counter()
+        error = None
+        try:
+            yield conn
+        except sqlite3.OperationalError as e:
+            error = str(e)
+            if _is_busy_error(e):
+                self._count("busy_errors")
+            raise
+        finally:
+            record_span("db", "read", (perf_counter() - started) * 1000, error=error)
+
+    @contextmanager
+    def write(self):
+        """
+        Yields the shared writer connection inside an immediate transaction.
+
+        The transaction is committed when the block exits normally and rolled back
+        if it raises.
+        """
+        start = perf_counter()
+        contended = not self._write_lock.acquire(blocking=False)
+        if contended:
+            self._write_lock.acquire()
+        waited = perf_counter() - start
+        with self._stats_lock:
+            self._stats["write_transactions"] += 1
+            self._stats["write_contended"] += int(contended)
+            self._stats["write_wait_seconds_total"] += waited
+            self._stats["write_wait_seconds_max"] = max(self._stats["write_wait_seconds_max"], waited)
+
+        conn = self._writer
+        error = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            conn.rollback()
+            self._count("write_rollbacks")
+            if isinstance(e, sqlite3.OperationalError) and _is_busy_error(e):
+                self._count("busy_errors")
+            raise
+        finally:
+            self._write_lock.release()
+            record_span("db", "write", (perf_counter() - start) * 1000, error=error,
+                        lock_wait_ms=round(waited * 1000, 3))
+
+    def engine(self):
+        """
+        Returns a SQLAlchemy engine that hands out read-only connections with the
+        shared pragmas, for use by LangChain's `SQLDatabase`.
+        """
+        if self._engine is None:
+            from sqlalchemy import create_engine
+            from sqlalchemy.pool import QueuePool
+
+            def creator():
+                return self._open(read_only=True)
+
+            self._engine = create_engine(
+                "sqlite://", creator=creator, poolclass=QueuePool,
+                pool_size=ENGINE_POOL_SIZE, max_overflow=ENGINE_POOL_SIZE,
+            )
+            instrument_engine(self._engine)
+        return self._engine
+
+    def close(self):
+        """Closes the writer, this thread's reader and the engine's pooled connections."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+        self._writer.close()
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the pool statistics."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["db_path"] = self.db_path
+        snapshot["write_lock_held"] = self._write_lock.locked()
+        if self._engine is not None:
+            snapshot["engine_pool"] = self._engine.pool.status()
+        return snapshot
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_manager(db_path: str | None = None) -> ConnectionManager:
+    """Returns the process-wide connection manager for a database file."""
+    db_path = db_path or DB_PATH
+    with _managers_lock:
+        manager = _managers.get(db_path)
+        if manager is None:
+            manager = _managers[db_path] = ConnectionManager(db_path)
+        return manager
+
+def close_manager(db_path: str | None = None):
+    """
+    Closes and forgets a database file's connection manager, e.g. before the file
+    is deleted. Readers on other threads keep their connections until they exit.
+    """
+    with _managers_lock:
+        manager = _managers.pop(db_path or DB_PATH, None)
+    if manager is not None:
+        manager.close()
+
+# --- Shard Routing ---
+
+_layouts = {}  # shard_dir -> layout dict, or None when the directory has no layout
+_layouts_lock = threading.Lock()
+
+def read_shard_layout(shard_dir: str) -> dict | None:
+    """
+    Reads the shard layout of a directory.
+
+    Returns:
+        A dictionary with `mode` ("user" or "hash") and `buckets`, or None if the
+        directory has no layout file.
+    """
+    try:
+        with open(os.path.join(shard_dir, SHARD_LAYOUT_FILE)) as f:
+            layout = json.load(f)
+    except FileNotFoundError:
+        return None
+    if layout.get("mode") not in SHARD_MODES:
+        raise ValueError(f"Unknown shard mode in {shard_dir}: {layout.get('mode')}")
+    return layout
+
+def make_shard_layout(mode: str, buckets: int = SHARD_BUCKETS) -> dict:
+    """Validates and returns a layout; `buckets` only applies to the "hash" mode."""
+    if mode not in SHARD_MODES:
+        raise ValueError(f"Unknown shard mode: {mode}")
+    if mode == "hash" and buckets < 1:
+        raise ValueError("A hash layout needs at least one bucket.")
+    return {"mode": mode, "buckets": buckets if mode == "hash" else 0}
+
+def write_shard_layout(shard_dir: str, mode: str, buckets: int = SHARD_BUCKETS) -> dict:
+    """Atomically replaces the shard layout of a directory and returns it."""
+    layout = make_shard_layout(mode, buckets)
+    os.makedirs(shard_dir, exist_ok=True)
+    path = os.path.join(shard_dir, SHARD_LAYOUT_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(layout, f)
+    os.replace(path + ".tmp", path)
+    reload_shard_layout()
+    return layout
+
+def reload_shard_layout():
+    """Forgets cached layouts so the next lookup reads the layout files again."""
+    with _layouts_lock:
+        _layouts.clear()
+
+def shard_layout() -> dict | None:
+    """Returns the active shard layout, or None when every user lives in `DB_PATH`."""
+    if not SHARD_DIR:
+        return None
+    with _layouts_lock:
+        if SHARD_DIR not in _layouts:
+            _layouts[SHARD_DIR] = read_shard_layout(SHARD_DIR)
+        return _layouts[SHARD_DIR]
+
+def shard_file_name(username: str, layout: dict) -> str:
+    """
+    Returns the file name holding a user's rows under a layout.
+
+    Hash buckets use CRC32, which is stable across processes, and carry the
+    bucket count in their names so a rebalance never writes into a live file.
+    """
+    checksum = zlib.crc32(username.encode("utf-8"))
+    if layout["mode"] == "hash":
+        return f"bucket-{layout['buckets']}-{checksum % layout['buckets']:04d}.db"
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", username)[:64]
+    if safe != username:
+        safe += f"-{checksum:08x}"  # Keeps users that sanitize to the same name apart.
+    return f"user-{safe}.db"
+
+def user_db_path(username: str) -> str:
+    """Returns the database file that holds a user's rows."""
+    layout = shard_layout()
+    if layout is None:
+        return DB_PATH
+    return os.path.join(SHARD_DIR, shard_file_name(username, layout))
+
+def layout_db_paths(shard_dir: str, layout: dict) -> list:
+    """Returns the existing database files of a layout in a shard directory."""
+    if layout["mode"] == "hash":
+        names = [f"bucket-{layout['buckets']}-{index:04d}.db" for index in range(layout["buckets"])]
+    else:
+        names = sorted(name for name in os.listdir(shard_dir) if name.startswith("user-") and name.endswith(".db"))
+    return [os.path.join(shard_dir, name) for name in names if os.path.exists(os.path.join(shard_dir, name))]
+
+def all_db_paths() -> list:
+    """Returns every database file holding user rows, for jobs that cover all users."""
+    layout = shard_layout()
+    if layout is None:
+        return [DB_PATH]
+    return layout_db_paths(SHARD_DIR, layout)
+
+# --- Public API ---
+
+def read_connection(db_path: str | None = None):
+    """Context manager yielding a pooled read-only connection for this thread."""
+    return get_manager(db_path).read()
+
+def write_transaction(db_path: str | None = None):
+    """Context manager yielding the serialized writer connection inside a transaction."""
+    return get_manager(db_path).write()
+
+def get_engine(db_path: str | None = None):
+    """Returns the shared SQLAlchemy engine for a database file."""
+    return get_manager(db_path).engine()
+
+def pool_stats(db_path: str | None = None) -> dict:
+    """Returns connection pool statistics for a database file."""
+    return get_manager(db_path).stats()
+
+# --- Data Versions ---
+
+def get_data_version(conn, username: str) -> int:
+    """Returns the user's data version; it changes whenever their rows are written."""
+    row = conn.execute("SELECT version FROM data_versions WHERE username = ?", (username,)).fetchone()
+    return row[0] if row else 0
+
+def bump_data_version(conn, username: str):
+    """
+    Marks the user's data as changed. Call inside the write transaction that
+    changed their rows so readers never see new rows with an old version.
+    """
+    conn.execute(
+        "INSERT INTO data_versions (username, version) VALUES (?, 1) "
+        "ON CONFLICT(username) DO UPDATE SET version = version + 1",
+        (username,),
+    )
@@ -0,0 +1,153 @@
+"""
+Record/replay chat model for offline evaluation of the AI Finance Agent.
+
+`CassetteChatModel` is a LangChain chat model with two modes:
+1. "record": forwards every request to a real chat model (Gemini by default)
+   and stores the response, keyed by a hash of the request, in a cassette.
+2. "replay": answers requests from a cassette file without any network access.
+   Responses are deterministic; unknown requests raise `CassetteMissError`.
+
+Tool bindings are part of the request key, and recorded responses keep their
+tool calls and token usage, so agent runs, SQL tool calls and token metrics
+replay exactly as recorded as long as the database content is unchanged.
+
+`StaticChatModel` always answers with fixed text and never calls tools; the
+benchmarks use it to measure everything around the LLM offline.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+# --- Configuration Constants ---
+CASSETTE_FORMAT_VERSION = 1
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+# --- Request Keys ---
+
+def _message_fingerprint(message) -> dict:
+    """Returns the parts of a message that determine the model's response."""
+    fingerprint = {"type": message.type, "content": message.content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        fingerprint["tool_calls"] = [
+            {"name": call["name"], "args": call["args"], "id": call.get("id")} for call in tool_calls
+        ]
+    if getattr(message, "tool_call_id", None):
+        fingerprint["tool_call_id"] = message.tool_call_id
+    return fingerprint
+
+def request_key(messages, tools=None, stop=None) -> str:
+    """Hashes a chat request (messages, bound tools and stop words) into a cassette key."""
+    payload = {
+        "messages": [_message_fingerprint(m) for m in messages],
+        "tools": [t.get("function", t).get("name") for t in tools or []],
+        "stop": stop or [],
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# --- Cassette Model ---
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that records responses from a real model or replays them.
+
+    Args:
+        cassette_path: Path of the cassette JSON file.
+        mode: "record" or "replay".
+        inner: The real chat model used in record mode.
+        simulate_latency: In replay mode, sleep for each response's recorded
+            latency so timing comparisons stay meaningful.
+    """
+
+    cassette_path: str
+    mode: str = "replay"
+    inner: Any = None
+    simulate_latency: bool = False
+
+    _interactions: dict = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _stats: dict = PrivateAttr(default_factory=lambda: {"hits": 0, "misses": 0, "recorded": 0})
+
+    def model_post_init(self, __context):
+        if self.mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {self.mode}")
+        if os.path.exists(self.cassette_path):
+            with open(self.cassette_path) as f:
+                self._interactions = json.load(f).get("interactions", {})
+        elif self.mode == "replay":
+            raise FileNotFoundError(f"Cassette not found at '{self.cassette_path}'. Record it first.")
+        if self.mode == "record" and self.inner is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            from app_logic import LLM_MODEL
+            self.inner = ChatGoogleGenerativeAI(model=LLM_MODEL, temperature=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        """Binds tools in OpenAI format; they are forwarded to the real model when recording."""
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tools = kwargs.get("tools")
+        key = request_key(messages, tools, stop)
+
+        with self._lock:
+            entry = self._interactions.get(key)
+        if entry is not None and self.mode == "replay":
+            if self.simulate_latency:
+                time.sleep(entry.get("latency", 0.0))
+            with self._lock:
+                self._stats["hits"] += 1
+            message = messages_from_dict([entry["message"]])[0]
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        if self.mode == "replay":
+            with self._lock:
+                self._stats["misses"] += 1
+            raise CassetteMissError(
+                f"No recorded response for request {key[:12]} in '{self.cassette_path}'. Re-record the cassette."
+            )
+
+        model = self.inner.bind_tools(tools) if tools else self.inner
+        started = time.perf_counter()
+        # The wrapped call must not report to this run's callbacks a second time.
+        message = model.invoke(messages, stop=stop, config={"callbacks": []})
+        latency = time.perf_counter() - started
+        with self._lock:
+            self._interactions[key] = {"message": messages_to_dict([message])[0], "latency": round(latency, 4)}
+            self._stats["recorded"] += 1
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def save(self):
+        """Writes the recorded interactions to the cassette file."""
+        with self._lock:
+            data = {"version": CASSETTE_FORMAT_VERSION, "interactions": self._interactions}
+            with open(self.cassette_path, "w") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "interactions": len(self._interactions)}
+
+class StaticChatModel(FakeListChatModel):
+    """Chat model that cycles through fixed answers and ignores tool bindings."""
+
+    responses: list = ["This is a placeholder answer from the offline model."]
+
+    def bind_tools(self, tools, **kwargs):
+        return self
@@ -0,0 +1,186 @@
+"""
+Offline stand-in for the Plaid API used by the AI Finance Agent.
+
+`FakePlaidApi` implements the subset of `plaid_api.PlaidApi` that
+`plaid_service.py` calls, so syncing can be exercised without network access
+or Plaid credentials. It can:
+1. Replay transaction sets recorded from a real Plaid item (see `record_transactions`).
+2. Generate large synthetic transaction sets for load testing.
+3. Simulate later additions, modifications and removals for incremental syncs.
+
+Responses are plain dictionaries shaped like Plaid's JSON responses.
+"""
+
+import json
+import random
+import threading
+from datetime import date, timedelta
+
+# --- Constants ---
+DEFAULT_SYNC_COUNT = 100
+MAX_SYNC_COUNT = 500
+SAMPLE_MERCHANTS = [
+    ("Uber 063015 SF**POOL**", 5.4), ("United Airlines", 500), ("KFC", 500),
+    ("Starbucks", 4.33), ("McDonald's", 12), ("Tectra Inc", 500),
+    ("Madison Bicycle Shop", 500), ("SparkFun", 89.4), ("Touchstone Climbing", 78.5),
+]
+
+# --- Helper Functions ---
+
+def _field(request, name: str, default=None):
+    """Reads a field from a Plaid request model or a plain dictionary."""
+    if hasattr(request, "get"):
+        return request.get(name, default)
+    return getattr(request, name, default)
+
+def generate_transactions(count: int, seed: int = 0, start: date = date(2025, 1, 1),
+                          prefix: str = "txn") -> list:
+    """
+    Generates a deterministic list of Plaid-shaped transactions.
+
+    Args:
+        count: Number of transactions to generate.
+        seed: Seed for the random generator, so runs are reproducible.
+        start: Date of the oldest transaction.
+        prefix: Prefix for the generated `transaction_id` values.
+
+    Returns:
+        A list of transaction dictionaries with Plaid's sign convention
+        (positive amounts are outflows).
+    """
+    rng = random.Random(seed)
+    transactions = []
+    for i in range(count):
+        name, typical = rng.choice(SAMPLE_MERCHANTS)
+        amount = round(typical * rng.uniform(0.5, 1.5), 2)
+        if rng.random() < 0.1:
+            name, amount = "Payroll Deposit", -round(rng.uniform(1000, 3000), 2)
+        transactions.append({
+            "transaction_id": f"{prefix}-{seed}-{i}",
+            "account_id": "fake-account",
+            "date": (start + timedelta(days=i * 365 // max(count, 1))).isoformat(),
+            "name": name,
+            "amount": amount,
+            "iso_currency_code": "USD",
+            "pending": False,
+        })
+    return transactions
+
+def record_transactions(path: str, transactions: list):
+    """
+    Saves transactions returned by the real Plaid API so they can be replayed offline.
+
+    Args:
+        path: Destination JSON file.
+        transactions: Plaid transaction models or dictionaries.
+    """
+    rows = [t.to_dict() if hasattr(t, "to_dict") else dict(t) for t in transactions]
+    with open(path, "w") as f:
+        json.dump({"transactions": rows}, f, default=str, indent=2)
+
+def load_recording(path: str) -> list:
+    """Loads a transaction recording written by `record_transactions`."""
+    with open(path) as f:
+        data = json.load(f)
+    return data["transactions"] if isinstance(data, dict) else data
+
+# --- Fake API ---
+
+class FakePlaidApi:
+    """
+    In-process replacement for `plaid_api.PlaidApi`.
+
+    Each item keeps an ordered change log of ("added" | "modified" | "removed",
+    transaction) entries. A sync cursor is simply an offset into that log, so
+    paginated and incremental syncs behave like Plaid's `/transactions/sync`.
+    """
+
+    def __init__(self, transactions: list | None = None):
+        self._lock = threading.Lock()
+        self._initial = list(transactions or [])
+        self._items = {}
+        self._public_tokens = {}
+        self.calls = {"sandbox_public_token_create": 0, "item_public_token_exchange": 0,
+                      "transactions_sync": 0, "transactions_get": 0}
+
+    @classmethod
+    def from_recording(cls, path: str):
+        """Creates a fake API whose new items start with a recorded transaction set."""
+        return cls(load_recording(path))
+
+    # --- Link Flow ---
+
+    def sandbox_public_token_create(self, request):
+        with self._lock:
+            self.calls["sandbox_public_token_create"] += 1
+            token = f"public-fake-{len(self._public_tokens) + 1}"
+            self._public_tokens[token] = f"item-fake-{len(self._public_tokens) + 1}"
+        return {"public_token": token, "request_id": "fake"}
+
+    def item_public_token_exchange(self, request):
+        public_token = _field(request, "public_token")
+        with self._lock:
+            self.calls["item_public_token_exchange"] += 1
+            item_id = self._public_tokens.pop(public_token)
+            access_token = f"access-fake-{item_id}"
+            self._items[access_token] = {
+                "item_id": item_id,
+                "log": [("added", dict(t)) for t in self._initial],
+            }
+        return {"access_token": access_token, "item_id": item_id, "request_id": "fake"}
+
+    def add_item(self, access_token: str, item_id: str, transactions: list | None = None):
+        """Registers an item directly, bypassing the public token exchange."""
+        with self._lock:
+            self._items[access_token] = {
+                "item_id": item_id,
+                "log": [("added", dict(t)) for t in (transactions or [])],
+            }
+
+    # --- Simulated Bank Activity ---
+
+    def add_transactions(self, access_token: str, transactions: list):
+        with self._lock:
+            self._items[access_token]["log"].extend(("added", dict(t)) for t in transactions)
+
+    def modify_transactions(self, access_token: str, transactions: list):
+        with self._lock:
+            self._items[access_token]["log"].extend(("modified", dict(t)) for t in transactions)
+
+    def remove_transactions(self, access_token: str, transaction_ids: list):
+        with self._lock:
+            self._items[access_token]["log"].extend(
+                ("removed", {"transaction_id": tid}) for tid in transaction_ids
+            )
+
+    # --- Transactions ---
+
+    def transactions_sync(self, request):
+        access_token = _field(request, "access_token")
+        cursor = _field(request, "cursor") or "0"
+        count = min(_field(request, "count") or DEFAULT_SYNC_COUNT, MAX_SYNC_COUNT)
+        with self._lock:
+            self.calls["transactions_sync"] += 1
+            log = self._items[access_token]["log"]
+            offset = int(cursor)
+            page = log[offset:offset + count]
+
+        response = {"added": [], "modified": [], "removed": [], "request_id": "fake"}
+        for kind, transaction in page:
+            response[kind].append(transaction)
+        response["next_cursor"] = str(offset + len(page))
+        response["has_more"] = offset + len(page) < len(log)
+        return response
+
+    def transactions_get(self, request):
+        access_token = _field(request, "access_token")
+        with self._lock:
+            self.calls["transactions_get"] += 1
+            current = {}
+            for kind, transaction in self._items[access_token]["log"]:
+                if kind == "removed":
+                    current.pop(transaction["transaction_id"], None)
+                else:
+                    current[transaction["transaction_id"]] = transaction
+        transactions = list(current.values())
+        return {"transactions": transactions, "total_transactions": len(transactions), "request_id": "fake"}
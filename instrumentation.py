@@ -0,0 +1,345 @@
+"""
+Hot-path instrumentation for the AI Finance Agent.
+
+Records timed spans for the parts of a chat turn that take time and exposes them
+in three ways:
+1. Structured JSON log lines (one per chat turn; one per span when
+   INSTRUMENTATION_LOG_SPANS is set).
+2. A Prometheus-style text export, optionally served over HTTP on METRICS_PORT
+   (bound to METRICS_HOST, loopback by default).
+3. `snapshot()`, used by the admin panel in the Streamlit sidebar to show
+   recent p50/p95 latencies.
+
+Spans come from:
+- `InstrumentationHandler`, a LangChain callback handler attached to every
+  agent executor (chat turns, LLM calls with token counts, tool calls and rows
+  returned by SQL tools).
+- `instrumented`, a decorator used on chart and Plaid functions.
+- `span`, a context manager used by the database layer around reads and writes.
+- `instrument_engine`, which times SQL statements run by the agent's engine.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# --- Configuration Constants ---
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_DISABLED", "").lower() not in ("1", "true", "yes")
+INSTRUMENTATION_LOG_TURNS = os.getenv("INSTRUMENTATION_LOG_TURNS", "true").lower() in ("1", "true", "yes")
+INSTRUMENTATION_LOG_SPANS = os.getenv("INSTRUMENTATION_LOG_SPANS", "").lower() in ("1", "true", "yes")
+RECENT_SPANS = 500  # Latency samples kept per span name for percentiles.
+METRICS_PREFIX = "finance_agent"
+# The metrics endpoint has no authentication; set e.g. 0.0.0.0 to expose it beyond this machine.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# --- Metrics Registry ---
+
+def _percentile(ordered: list, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+class MetricsRegistry:
+    """Thread-safe counters and recent latency samples, keyed by (kind, name)."""
+
+    def __init__(self, recent: int = RECENT_SPANS):
+        self.recent = recent
+        self._lock = threading.Lock()
+        self._series = {}
+        self._counters = {}
+
+    def observe(self, kind: str, name: str, duration_ms: float, error: bool = False, rows: int | None = None):
+        with self._lock:
+            series = self._series.get((kind, name))
+            if series is None:
+                series = self._series[(kind, name)] = {
+                    "count": 0, "errors": 0, "sum_ms": 0.0, "rows": 0, "samples": deque(maxlen=self.recent),
+                }
+            series["count"] += 1
+            series["errors"] += int(error)
+            series["sum_ms"] += duration_ms
+            series["rows"] += rows or 0
+            series["samples"].append(duration_ms)
+
+    def increment(self, name: str, amount: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self) -> list:
+        """Returns one row per span name with counts and recent p50/p95 latencies."""
+        with self._lock:
+            items = [(key, dict(series, samples=sorted(series["samples"]))) for key, series in self._series.items()]
+        rows = []
+        for (kind, name), series in sorted(items):
+            rows.append({
+                "kind": kind, "name": name, "count": series["count"], "errors": series["errors"],
+                "rows": series["rows"],
+                "p50_ms": round(_percentile(series["samples"], 50), 2),
+                "p95_ms": round(_percentile(series["samples"], 95), 2),
+                "mean_ms": round(series["sum_ms"] / series["count"], 2),
+                "sum_ms": series["sum_ms"],
+            })
+        return rows
+
+    def counters(self) -> dict:
+        with self._lock:
+            return {(name + "".join(f"[{k}={v}]" for k, v in labels)): value
+                    for (name, labels), value in self._counters.items()}
+
+    def prometheus_text(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# TYPE {METRICS_PREFIX}_span_duration_ms summary",
+            f"# TYPE {METRICS_PREFIX}_span_errors_total counter",
+            f"# TYPE {METRICS_PREFIX}_span_rows_total counter",
+        ]
+        for row in self.snapshot():
+            labels = f'kind="{row["kind"]}",name="{_escape(row["name"])}"'
+            lines.append(f'{METRICS_PREFIX}_span_duration_ms{{{labels},quantile="0.5"}} {row["p50_ms"]}')
+            lines.append(f'{METRICS_PREFIX}_span_duration_ms{{{labels},quantile="0.95"}} {row["p95_ms"]}')
+            lines.append(f"{METRICS_PREFIX}_span_duration_ms_sum{{{labels}}} {row['sum_ms']:.3f}")
+            lines.append(f"{METRICS_PREFIX}_span_duration_ms_count{{{labels}}} {row['count']}")
+            lines.append(f"{METRICS_PREFIX}_span_errors_total{{{labels}}} {row['errors']}")
+            lines.append(f"{METRICS_PREFIX}_span_rows_total{{{labels}}} {row['rows']}")
+        with self._lock:
+            counters = sorted(self._counters.items())
+        for (name, labels), value in counters:
+            label_text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels)
+            lines.append(f"{METRICS_PREFIX}_{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+REGISTRY = MetricsRegistry()
+
+def log_event(event: dict):
+    """Prints a structured JSON log line."""
+    print(json.dumps({"ts": round(time.time(), 3), **event}, default=str))
+
+def record_span(kind: str, name: str, duration_ms: float, error: str | None = None,
+                rows: int | None = None, **attributes):
+    """Records a finished span in the registry and, if enabled, the span log."""
+    if not INSTRUMENTATION_ENABLED:
+        return
+    REGISTRY.observe(kind, name, duration_ms, error=error is not None, rows=rows)
+    if INSTRUMENTATION_LOG_SPANS:
+        log_event({"event": "span", "kind": kind, "name": name, "duration_ms": round(duration_ms, 3),
+                   "error": error, "rows": rows, **attributes})
+
+# --- Timing Helpers ---
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """Times the enclosed block as a span; exceptions are recorded and re-raised."""
+    started = perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record_span(kind, name, (perf_counter() - started) * 1000, error=error, **attributes)
+
+def instrumented(kind: str, name: str | None = None):
+    """Decorator that records every call of a function as a span."""
+    def decorate(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(kind, span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def instrument_engine(engine):
+    """Records every statement executed through a SQLAlchemy engine as an "sql" span."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_span_started", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["_span_started"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        record_span("sql", f"engine.{verb.lower()}", (perf_counter() - started) * 1000,
+                    statement=statement[:500])
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        stack = context.connection.info.get("_span_started") if context.connection is not None else None
+        if stack:
+            started = stack.pop()
+            record_span("sql", "engine.error", (perf_counter() - started) * 1000,
+                        error=str(context.original_exception))
+    return engine
+
+# --- LangChain Callback Handler ---
+
+def _count_sql_rows(output) -> int | None:
+    """Counts rows in a `sql_db_query` result, which `SQLDatabase` returns as str(list of tuples)."""
+    text = str(getattr(output, "content", output)).strip()
+    if not text.startswith("[("):
+        return 0 if text in ("", "[]") else None
+    return text.count("), (") + 1
+
+class InstrumentationHandler(BaseCallbackHandler):
+    """
+    Records spans for chat turns, LLM calls and tool calls.
+
+    One handler is shared by every agent executor; in-flight runs are tracked
+    by their LangChain run ids, so concurrent turns do not interfere.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}   # run_id -> (kind, name, started, root_id) for timed runs
+        self._roots = {}  # run_id -> root run_id for every run in flight, including nested chains
+        self._turns = {}  # root run_id -> aggregated turn metrics
+
+    def _start(self, run_id, parent_run_id, kind: str, name: str):
+        with self._lock:
+            root = self._roots.get(parent_run_id, parent_run_id) if parent_run_id else run_id
+            self._roots[run_id] = root
+            self._runs[run_id] = (kind, name, perf_counter(), root)
+            if parent_run_id is None and kind == "turn":
+                self._turns[run_id] = {"llm_calls": 0, "llm_ms": 0.0, "tool_calls": 0, "tool_ms": 0.0,
+                                       "sql_queries": 0, "input_tokens": 0, "output_tokens": 0, "errors": 0}
+
+    def _end(self, run_id, error=None, rows=None, tokens=None):
+        with self._lock:
+            self._roots.pop(run_id, None)
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                return
+            kind, name, started, root = run
+            duration_ms = (perf_counter() - started) * 1000
+            turn = self._turns.get(root)
+            if turn is not None and kind != "turn":
+                prefix = "llm" if kind == "llm" else "tool"
+                turn[f"{prefix}_calls"] += 1
+                turn[f"{prefix}_ms"] += duration_ms
+                turn["sql_queries"] += int(name == "sql_db_query")
+                turn["errors"] += int(error is not None)
+                if tokens:
+                    turn["input_tokens"] += tokens[0]
+                    turn["output_tokens"] += tokens[1]
+            finished_turn = self._turns.pop(run_id, None) if kind == "turn" else None
+
+        record_span(kind, name, duration_ms, error=error, rows=rows)
+        if tokens:
+            REGISTRY.increment("llm_tokens_total", tokens[0], direction="input")
+            REGISTRY.increment("llm_tokens_total", tokens[1], direction="output")
+        if finished_turn is not None and INSTRUMENTATION_ENABLED and INSTRUMENTATION_LOG_TURNS:
+            log_event({"event": "turn", "duration_ms": round(duration_ms, 1), "error": error,
+                       **{k: round(v, 1) if isinstance(v, float) else v for k, v in finished_turn.items()}})
+
+    # --- Chain (turn) events ---
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._start(run_id, None, "turn", "agent_turn")
+        else:
+            # Nested chains are not timed, but LLM and tool runs below them must find their turn.
+            with self._lock:
+                self._roots[run_id] = self._roots.get(parent_run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._end(run_id)
+        else:
+            with self._lock:
+                self._roots.pop(run_id, None)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._end(run_id, error=f"{type(error).__name__}: {error}")
+        else:
+            with self._lock:
+                self._roots.pop(run_id, None)
+
+    # --- LLM events ---
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "llm", (serialized or {}).get("name") or "chat_model")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "llm", (serialized or {}).get("name") or "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        self._end(run_id, tokens=(input_tokens, output_tokens))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    # --- Tool events ---
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "tool", (serialized or {}).get("name") or "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+        rows = _count_sql_rows(output) if run and run[1] == "sql_db_query" else None
+        self._end(run_id, rows=rows)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+_handler = InstrumentationHandler()
+
+def get_callback_handlers() -> list:
+    """Returns the callback handlers to attach to agent executors."""
+    return [_handler] if INSTRUMENTATION_ENABLED else []
+
+# --- Metrics Endpoint ---
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("/metrics", ""):
+            self.send_error(404)
+            return
+        body = REGISTRY.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port: int, host: str = METRICS_HOST):
+    """Serves the Prometheus text export at /metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    print(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,329 @@
+"""
+Intent router for common questions in the AI Finance Agent.
+
+Most chat questions have a handful of shapes ("how much did I spend on Zomato",
+"profit for ticker X") that a single parameterized query answers exactly. This
+module answers them without the LLM:
+1. Classifies the question with keyword/regex patterns.
+2. Resolves merchants, tickers and company names against per-user lookups built
+   from the database, with fuzzy matching for typos.
+3. Runs a parameterized query scoped to the current username.
+
+Questions that match no pattern, mention qualifiers the templates do not handle
+(time ranges, charts, comparisons) or resolve with low confidence return None
+and are escalated to the LangChain agent.
+"""
+
+import difflib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import perf_counter
+
+from database import get_data_version, read_connection, user_db_path
+from summary_engine import format_amount, format_minor
+
+# --- Configuration Constants ---
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_DISABLED", "").lower() not in ("1", "true", "yes")
+ROUTER_MIN_CONFIDENCE = 0.8
+LOOKUP_CACHE_MAX_USERS = 256
+MIN_MERCHANT_TOKEN_LENGTH = 3
+
+# Words that ask for something the templates cannot express.
+ESCALATE_PATTERN = re.compile(
+    r"\b(chart|graph|plot|pie|visual\w*|diagram|last|past|previous|this|month\w*|week\w*|year\w*|"
+    r"today|yesterday|since|between|before|after|average|compare\w*|versus|vs|each|per|every|"
+    r"why|should|trend\w*|and|or|except|excluding|january|february|march|april|may|june|july|august|"
+    r"september|october|november|december|\d{4}-\d{2})\b",
+    re.IGNORECASE,
+)
+MERCHANT_PATTERN = re.compile(
+    r"\bhow much\b.*?\b(?:spend|spent|spending|pay|paid)\s+(?:on|at|to|for)\s+(?P<entity>.+?)"
+    r"(?:\s+(?:according|in|from|on|based)\b.*)?[?.!]*$",
+    re.IGNORECASE,
+)
+TICKER_PATTERN = re.compile(r"\b(?:ticker|symbol)\s+(?P<entity>[A-Za-z0-9&.\-]+)", re.IGNORECASE)
+# "shares in X" names a holding even when X is not one of the user's tickers.
+HOLDING_PATTERN = re.compile(
+    r"\b(?:stocks?|shares?)\s+(?:in|of|for)\s+(?!(?:my|the|all)\b|portfolio\b)\w", re.IGNORECASE
+)
+MERCHANT_STOPWORDS = {"the", "and", "for", "from", "payment", "transfer", "order", "credit", "debit", "upi"}
+# Legal suffixes that a question naming a company usually leaves out.
+COMPANY_SUFFIXES = {"ltd", "limited", "inc", "corp", "corporation", "co", "plc", "pvt"}
+
+@dataclass
+class RoutedAnswer:
+    """A question answered by a SQL template instead of the agent."""
+    intent: str
+    answer: str
+    confidence: float
+    elapsed_ms: float = 0.0
+
+# --- Lookups ---
+
+def _tokens(text: str) -> list:
+    return re.findall(r"[a-z0-9&]+", text.lower())
+
+def build_lookups(conn, username: str) -> dict:
+    """
+    Builds the per-user entity lookups used for matching.
+
+    Returns:
+        A dictionary with `merchant_tokens` (token -> descriptions containing it),
+        `tickers` (lowercase ticker -> ticker) and `companies` (lowercase company
+        name -> ticker).
+    """
+    merchant_tokens = {}
+    for (description,) in conn.execute(
+        "SELECT DISTINCT Description FROM bank_transactions WHERE username = ? AND Type = 'Debit'", (username,)
+    ):
+        for token in _tokens(description or ""):
+            if len(token) >= MIN_MERCHANT_TOKEN_LENGTH and token not in MERCHANT_STOPWORDS:
+                merchant_tokens.setdefault(token, set()).add(description)
+
+    tickers, companies = {}, {}
+    for ticker, company in conn.execute(
+        "SELECT DISTINCT Ticker, CompanyName FROM stock_portfolio WHERE username = ?", (username,)
+    ):
+        tickers[ticker.lower()] = ticker
+        if company:
+            companies[company.lower()] = ticker
+    return {"merchant_tokens": merchant_tokens, "tickers": tickers, "companies": companies}
+
+def _fuzzy(word: str, candidates) -> tuple:
+    """Returns the closest candidate and its similarity ratio, or (None, 0.0)."""
+    match = difflib.get_close_matches(word, list(candidates), n=1, cutoff=ROUTER_MIN_CONFIDENCE)
+    if not match:
+        return None, 0.0
+    return match[0], difflib.SequenceMatcher(None, word, match[0]).ratio()
+
+def _resolve_merchant(phrase: str, lookups: dict) -> tuple:
+    """
+    Resolves a merchant phrase to a lowercase token found in the user's descriptions.
+
+    Returns:
+        A tuple of (token or None, confidence).
+    """
+    words = [w for w in _tokens(phrase) if w not in ("my", "the", "a", "an")]
+    if len(words) != 1:
+        return None, 0.0
+    word = words[0]
+    index = lookups["merchant_tokens"]
+    if word in index:
+        return word, 1.0
+    return _fuzzy(word, index)
+
+def _company_match(company: str, question: str, words: list) -> float:
+    """
+    Scores how well a question names a company.
+
+    Returns:
+        0.9 if the full name appears in the question, otherwise the lowest
+        similarity of the name's words (legal suffixes aside) to the question's
+        words, or 0.0 if any of them has no close match.
+    """
+    if company in question:
+        return 0.9
+    name_words = [w for w in _tokens(company) if w not in COMPANY_SUFFIXES] or _tokens(company)
+    ratios = []
+    for word in name_words:
+        if word in words:
+            ratios.append(1.0)
+            continue
+        _, ratio = _fuzzy(word, words)
+        if not ratio:
+            return 0.0
+        ratios.append(ratio)
+    return min(ratios + [0.9])
+
+def _resolve_ticker(question: str, lookups: dict) -> tuple:
+    """
+    Finds the ticker a question refers to, by ticker symbol or company name.
+
+    A company only matches when every word of its name (legal suffixes aside)
+    appears in the question, allowing for typos, so "Tata Steel" does not
+    resolve to Tata Motors.
+
+    Returns:
+        A tuple of (ticker or None, confidence).
+    """
+    tickers, companies = lookups["tickers"], lookups["companies"]
+    explicit = TICKER_PATTERN.search(question)
+    candidates = [explicit.group("entity").lower()] if explicit else _tokens(question)
+
+    for word in candidates:
+        if word in tickers:
+            return tickers[word], 1.0
+    lowered, words = question.lower(), _tokens(question)
+    scored = [(_company_match(company, lowered, words), ticker) for company, ticker in companies.items()]
+    confidence, ticker = max(scored, default=(0.0, None))
+    if confidence:
+        return ticker, confidence
+    if explicit:
+        match, ratio = _fuzzy(candidates[0], tickers)
+        if match:
+            return tickers[match], ratio
+    return None, 0.0
+
+# --- Intent Handlers ---
+# Each handler returns (answer, confidence) or None if the question is not its shape.
+
+def _mutual_fund_count(conn, username, question, lookups):
+    if not re.search(r"\bhow many\b.*\bmutual funds?\b", question, re.IGNORECASE):
+        return None
+    count = conn.execute("SELECT COUNT(*) FROM mutual_funds WHERE username = ?", (username,)).fetchone()[0]
+    return f"You own {count} mutual funds.", 1.0
+
+def _mutual_fund_value(conn, username, question, lookups):
+    if not re.search(r"\b(total|current)\b.*\bvalue\b.*\bmutual funds?\b", question, re.IGNORECASE):
+        return None
+    invested, current = conn.execute(
+        "SELECT COALESCE(SUM(InvestedAmount), 0), COALESCE(SUM(CurrentValue), 0) FROM mutual_funds WHERE username = ?",
+        (username,),
+    ).fetchone()
+    return (f"Your mutual funds are currently worth {format_amount(current)} "
+            f"(invested {format_amount(invested)})."), 1.0
+
+def _stock_portfolio_value(conn, username, question, lookups):
+    if not re.search(r"\b(total|current)\b.*\bvalue\b.*\b(stock|share)s?\b", question, re.IGNORECASE):
+        return None
+    # A question naming one holding must not get the portfolio total.
+    ticker, confidence = _resolve_ticker(question, lookups)
+    if ticker is not None:
+        quantity, value = conn.execute(
+            "SELECT SUM(Quantity), SUM(Quantity * CurrentPrice) FROM stock_portfolio WHERE username = ? AND Ticker = ?",
+            (username, ticker),
+        ).fetchone()
+        return f"Your {quantity:g} shares of {ticker} are currently worth {format_amount(value)}.", confidence
+    if TICKER_PATTERN.search(question) or HOLDING_PATTERN.search(question):
+        return None
+    value = conn.execute(
+        "SELECT COALESCE(SUM(Quantity * CurrentPrice), 0) FROM stock_portfolio WHERE username = ?", (username,)
+    ).fetchone()[0]
+    return f"The total current value of your stock portfolio is {format_amount(value)}.", 1.0
+
+def _ticker_company(conn, username, question, lookups):
+    if not re.search(r"\bcompany\b", question, re.IGNORECASE) or not TICKER_PATTERN.search(question):
+        return None
+    ticker, confidence = _resolve_ticker(question, lookups)
+    if ticker is None:
+        return None
+    company = conn.execute(
+        "SELECT CompanyName FROM stock_portfolio WHERE username = ? AND Ticker = ? LIMIT 1", (username, ticker)
+    ).fetchone()[0]
+    return f"The ticker {ticker} corresponds to {company}.", confidence
+
+def _stock_profit(conn, username, question, lookups):
+    if not re.search(r"\b(profit|gain|loss)\b", question, re.IGNORECASE):
+        return None
+    if re.search(r"\b(mutual|funds?)\b", question, re.IGNORECASE):
+        return None
+    ticker, confidence = _resolve_ticker(question, lookups)
+    if ticker is None:
+        return None
+    quantity, purchase, current = conn.execute(
+        "SELECT SUM(Quantity), SUM(Quantity * PurchasePrice), SUM(Quantity * CurrentPrice) "
+        "FROM stock_portfolio WHERE username = ? AND Ticker = ?",
+        (username, ticker),
+    ).fetchone()
+    profit = current - purchase
+    return (f"Your profit on {ticker} is {format_amount(profit)} "
+            f"({quantity:g} shares, bought for {format_amount(purchase)}, now worth {format_amount(current)})."), confidence
+
+def _merchant_spend(conn, username, question, lookups):
+    match = MERCHANT_PATTERN.search(question)
+    if not match:
+        return None
+    token, confidence = _resolve_merchant(match.group("entity"), lookups)
+    if token is None:
+        return None
+    # Only the descriptions that contain the token as a word: "ola" must not match "Coca Cola".
+    descriptions = sorted(lookups["merchant_tokens"][token])
+    total, count = conn.execute(
+        "SELECT COALESCE(-SUM(AmountMinor), 0), COUNT(*) FROM bank_transactions "
+        f"WHERE username = ? AND Type = 'Debit' AND Description IN ({', '.join('?' for _ in descriptions)})",
+        (username, *descriptions),
+    ).fetchone()
+    merchants = ", ".join(descriptions)
+    noun = "transaction" if count == 1 else "transactions"
+    return (f"You spent {format_minor(total)} on {token.title()} across {count} "
+            f"{noun} ({merchants})."), confidence
+
+# Checked in order; the first handler that recognizes the question wins.
+INTENT_HANDLERS = [
+    ("mutual_fund_count", _mutual_fund_count),
+    ("mutual_fund_value", _mutual_fund_value),
+    ("ticker_company", _ticker_company),
+    ("stock_profit", _stock_profit),
+    ("stock_portfolio_value", _stock_portfolio_value),
+    ("merchant_spend", _merchant_spend),
+]
+
+def route_question(conn, username: str, question: str, lookups: dict | None = None) -> RoutedAnswer | None:
+    """
+    Answers a question with a SQL template if it confidently matches one.
+
+    Args:
+        conn: An active sqlite3 connection object.
+        username: The user whose data is queried.
+        question: The question as typed.
+        lookups: Entity lookups from `build_lookups`; built on demand when omitted.
+
+    Returns:
+        A RoutedAnswer, or None if the question should go to the agent.
+    """
+    started = perf_counter()
+    if ESCALATE_PATTERN.search(question):
+        return None
+    if lookups is None:
+        lookups = build_lookups(conn, username)
+
+    for intent, handler in INTENT_HANDLERS:
+        result = handler(conn, username, question, lookups)
+        if result is None:
+            continue
+        answer, confidence = result
+        if confidence < ROUTER_MIN_CONFIDENCE:
+            return None
+        return RoutedAnswer(intent, answer, confidence, (perf_counter() - started) * 1000)
+    return None
+
+# --- Cached Entry Point ---
+
+_lookups = OrderedDict()  # (db_path, username) -> (data_version, lookups)
+_lookups_lock = threading.Lock()
+
+def route(username: str, question: str, db_path: str | None = None) -> RoutedAnswer | None:
+    """
+    Routes a question using lookups cached per user and data version.
+
+    Returns:
+        A RoutedAnswer, or None if routing is disabled or the agent should answer.
+    """
+    if not INTENT_ROUTER_ENABLED:
+        return None
+    started = perf_counter()
+    db_path = db_path or user_db_path(username)
+    key = (db_path, username)
+    with read_connection(db_path) as conn:
+        version = get_data_version(conn, username)
+        with _lookups_lock:
+            entry = _lookups.get(key)
+            if entry is not None and entry[0] == version:
+                _lookups.move_to_end(key)
+                lookups = entry[1]
+            else:
+                lookups = None
+        if lookups is None:
+            lookups = build_lookups(conn, username)
+            with _lookups_lock:
+                _lookups[key] = (version, lookups)
+                while len(_lookups) > LOOKUP_CACHE_MAX_USERS:
+                    _lookups.popitem(last=False)
+        routed = route_question(conn, username, question, lookups)
+
+    if routed is not None:
+        routed.elapsed_ms = (perf_counter() - started) * 1000
+    return routed
@@ -1,70 +1,93 @@
 # plaid_service.py
+import json
 import os
-import plaid
-import sqlite3
-import pandas as pd
+import threading
 from datetime import datetime, timedelta
-from plaid.api import plaid_api
-# We no longer need the Link Token imports, but we need new ones for the sandbox
-from plaid.model.sandbox_public_token_create_request import SandboxPublicTokenCreateRequest
-from plaid.model.products import Products
-from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
-from plaid.model.transactions_get_request import TransactionsGetRequest
-
-# --- Plaid Client Initialization (same as before) ---
+
+# The package root is light; the generated API client and request models are
+# imported on first use, so processes that never talk to Plaid skip them.
+import plaid
+
+from categorization import categorize, plaid_category
+from database import bump_data_version, read_connection, user_db_path, write_transaction
+from instrumentation import instrumented
+
+# --- Plaid Client Initialization ---
 PLAID_CLIENT_ID = os.getenv("PLAID_CLIENT_ID")
 PLAID_SECRET = os.getenv("PLAID_SECRET")
 PLAID_ENV = os.getenv("PLAID_ENV", "sandbox")
-DB_PATH = "finance.db"
+SYNC_PAGE_SIZE = 500  # Maximum page size accepted by /transactions/sync
+MAX_SYNC_RESTARTS = 3
+
+_client = None
+_client_lock = threading.Lock()
 
-host = plaid.Environment.Sandbox
-configuration = plaid.Configuration(
-    host=host,
-    api_key={'clientId': PLAID_CLIENT_ID, 'secret': PLAID_SECRET,}
-)
-api_client = plaid.ApiClient(configuration)
-client = plaid_api.PlaidApi(api_client)
+def get_client():
+    """Returns the process-wide PlaidApi client, constructing it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from plaid.api import plaid_api
+                configuration = plaid.Configuration(
+                    host=plaid.Environment.Sandbox,
+                    api_key={'clientId': PLAID_CLIENT_ID, 'secret': PLAID_SECRET,}
+                )
+                _client = plaid_api.PlaidApi(plaid.ApiClient(configuration))
+    return _client
 
 # --- NEW Sandbox Simulation Function ---
-def create_sandbox_public_token():
+@instrumented("plaid")
+def create_sandbox_public_token(api=None):
     """
     Directly creates a public_token in the sandbox environment,
     bypassing the need for the Link UI popup.
+
+    `api` may be any object implementing the PlaidApi methods used here
+    (e.g. `fake_plaid.FakePlaidApi`); it defaults to the configured client.
     """
+    api = api or get_client()
+    from plaid.model.products import Products
+    from plaid.model.sandbox_public_token_create_request import SandboxPublicTokenCreateRequest
     try:
         # This special request is only available in the sandbox
         request = SandboxPublicTokenCreateRequest(
             institution_id='ins_109508', # A default sandbox institution
             initial_products=[Products('transactions')]
         )
-        response = client.sandbox_public_token_create(request)
+        response = api.sandbox_public_token_create(request)
         return response['public_token']
     except plaid.ApiException as e:
         print(f"Plaid API error in create_sandbox_public_token: {e.body}")
         return None
 
 # --- Other functions remain the same ---
-def exchange_public_token(public_token: str):
+@instrumented("plaid")
+def exchange_public_token(public_token: str, api=None):
+    api = api or get_client()
+    from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
     try:
         request = ItemPublicTokenExchangeRequest(public_token=public_token)
-        response = client.item_public_token_exchange(request)
+        response = api.item_public_token_exchange(request)
         return response['access_token'], response['item_id']
     except plaid.ApiException as e:
         print(f"Plaid API error in exchange_public_token: {e.body}")
         return None, None
 
+@instrumented("plaid")
 def save_credentials_to_db(username, access_token, item_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO plaid_items (username, access_token, item_id) VALUES (?, ?, ?)",
-        (username, access_token, item_id)
-    )
-    conn.commit()
-    conn.close()
+    with write_transaction(user_db_path(username)) as conn:
+        conn.execute(
+            "INSERT INTO plaid_items (username, access_token, item_id) VALUES (?, ?, ?) "
+            "ON CONFLICT(username, item_id) DO UPDATE SET access_token = excluded.access_token",
+            (username, access_token, item_id)
+        )
     print(f"Saved credentials for user {username}, item {item_id}")
 
-def get_transactions(access_token: str):
+@instrumented("plaid")
+def get_transactions(access_token: str, api=None):
+    api = api or get_client()
+    from plaid.model.transactions_get_request import TransactionsGetRequest
     try:
         start_date = (datetime.now() - timedelta(days=30)).date()
         end_date = datetime.now().date()
@@ -73,31 +96,164 @@ def get_transactions(access_token: str):
             start_date=start_date,
             end_date=end_date,
         )
-        response = client.transactions_get(request)
+        response = api.transactions_get(request)
         return response['transactions']
     except plaid.ApiException as e:
         print(f"Plaid API error in get_transactions: {e.body}")
         return []
 
-def save_transactions_to_db(username: str, transactions: list):
-    conn = sqlite3.connect(DB_PATH)
+def _error_code(e: plaid.ApiException):
+    try:
+        return json.loads(e.body).get("error_code")
+    except (TypeError, ValueError, AttributeError):
+        return None
 
-    transactions_data = [t.to_dict() for t in transactions]
-    df = pd.DataFrame(transactions_data)
+@instrumented("plaid")
+def fetch_transaction_updates(access_token: str, cursor: str | None = None, api=None):
+    """
+    Fetches every change since `cursor` from /transactions/sync, following pagination.
+
+    Plaid asks clients to restart from the original cursor if the data changes
+    while paginating, so the whole batch is only returned once `has_more` is false.
+
+    Returns:
+        A tuple of (added, modified, removed, next_cursor).
+    """
+    api = api or get_client()
+    from plaid.model.transactions_sync_request import TransactionsSyncRequest
+    for _ in range(MAX_SYNC_RESTARTS):
+        added, modified, removed = [], [], []
+        next_cursor = cursor
+        try:
+            while True:
+                kwargs = {"access_token": access_token, "count": SYNC_PAGE_SIZE}
+                if next_cursor:
+                    kwargs["cursor"] = next_cursor
+                response = api.transactions_sync(TransactionsSyncRequest(**kwargs))
+                added.extend(response['added'])
+                modified.extend(response['modified'])
+                removed.extend(response['removed'])
+                next_cursor = response['next_cursor']
+                if not response['has_more']:
+                    return added, modified, removed, next_cursor
+        except plaid.ApiException as e:
+            if _error_code(e) != "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION":
+                raise
+            print("Plaid data changed during pagination, restarting sync from the saved cursor.")
+    raise RuntimeError(f"Transactions sync did not settle after {MAX_SYNC_RESTARTS} attempts.")
+
+def _to_dicts(transactions: list) -> list:
+    return [t.to_dict() if hasattr(t, "to_dict") else dict(t) for t in transactions]
+
+def _map_transactions(username: str, transactions: list):
+    """Maps Plaid transactions onto `bank_transactions` rows, or returns None if malformed."""
+    import pandas as pd
+
+    records = _to_dicts(transactions)
+    df = pd.DataFrame(records)
 
     if df.empty or not all(col in df.columns for col in ['date', 'name', 'amount']):
-        print("No new transactions to save or data is malformed.")
-        conn.close()
-        return
+        return None
 
-    df_mapped = pd.DataFrame({
-        'Date': pd.to_datetime(df['date']),
+    # Plaid reports outflows as positive amounts; the app stores debits as negative
+    # integer minor units with ISO dates (see schema.py).
+    types = ['Debit' if amount > 0 else 'Credit' for amount in df['amount']]
+    merchants, categories = categorize(
+        df['name'].tolist(), types, [plaid_category(record) for record in records]
+    )
+    # Prefer Plaid's cleaned merchant name when it sent one.
+    if 'merchant_name' in df.columns:
+        merchants = [name if pd.notna(name) and name else merchant
+                     for name, merchant in zip(df['merchant_name'], merchants)]
+    return pd.DataFrame({
+        'transaction_id': df['transaction_id'] if 'transaction_id' in df.columns else None,
+        'Date': pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'),
         'Description': df['name'],
-        'Amount': -df['amount'],
-        'Type': df['amount'].apply(lambda x: 'Debit' if x > 0 else 'Credit'),
-        'username': username
+        'AmountMinor': (-df['amount'] * 100).round().astype('int64'),
+        'Type': types,
+        'username': username,
+        'Merchant': merchants,
+        'Category': categories,
     })
 
-    df_mapped.to_sql('bank_transactions', conn, if_exists='append', index=False)
-    conn.close()
-    print(f"Saved {len(df_mapped)} new transactions for user {username}")
\ No newline at end of file
+# Re-syncing a transaction Plaid has already sent updates the row in place.
+UPSERT_TRANSACTION_SQL = """
+INSERT INTO bank_transactions (transaction_id, Date, Description, AmountMinor, Type, username, Merchant, Category)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(transaction_id) WHERE transaction_id IS NOT NULL DO UPDATE SET
+    Date = excluded.Date,
+    Description = excluded.Description,
+    AmountMinor = excluded.AmountMinor,
+    Type = excluded.Type,
+    Merchant = excluded.Merchant,
+    Category = excluded.Category
+"""
+
+def _upsert_transactions(conn, df):
+    rows = df.astype(object).where(df.notna(), None)
+    conn.executemany(UPSERT_TRANSACTION_SQL, rows.itertuples(index=False, name=None))
+
+def get_sync_cursor(username: str, item_id: str):
+    with read_connection(user_db_path(username)) as conn:
+        row = conn.execute(
+            "SELECT cursor FROM plaid_items WHERE username = ? AND item_id = ?", (username, item_id)
+        ).fetchone()
+    return row[0] if row else None
+
+@instrumented("plaid")
+def apply_transaction_updates(username: str, item_id: str, added: list, modified: list,
+                              removed: list, next_cursor: str):
+    """
+    Applies one sync batch and advances the item's cursor in a single transaction,
+    so a failed write never skips changes on the next sync.
+    """
+    upserts = _map_transactions(username, list(added) + list(modified))
+    removed_ids = [r['transaction_id'] for r in _to_dicts(removed)]
+
+    with write_transaction(user_db_path(username)) as conn:
+        if upserts is not None:
+            _upsert_transactions(conn, upserts)
+        conn.executemany(
+            "DELETE FROM bank_transactions WHERE username = ? AND transaction_id = ?",
+            [(username, tid) for tid in removed_ids],
+        )
+        if upserts is not None or removed_ids:
+            bump_data_version(conn, username)
+        conn.execute(
+            "UPDATE plaid_items SET cursor = ?, last_synced_at = ? WHERE username = ? AND item_id = ?",
+            (next_cursor, datetime.now().isoformat(timespec="seconds"), username, item_id),
+        )
+
+@instrumented("plaid")
+def sync_transactions(username: str, access_token: str, item_id: str, api=None):
+    """
+    Incrementally syncs an item's transactions using its stored cursor.
+
+    Returns:
+        A dict with the number of added, modified and removed transactions,
+        or None if the Plaid API call failed.
+    """
+    cursor = get_sync_cursor(username, item_id)
+    try:
+        added, modified, removed, next_cursor = fetch_transaction_updates(access_token, cursor, api)
+    except plaid.ApiException as e:
+        print(f"Plaid API error in sync_transactions: {e.body}")
+        return None
+
+    apply_transaction_updates(username, item_id, added, modified, removed, next_cursor)
+    counts = {"added": len(added), "modified": len(modified), "removed": len(removed)}
+    print(f"Synced item {item_id} for user {username}: {counts}")
+    return counts
+
+@instrumented("plaid")
+def save_transactions_to_db(username: str, transactions: list):
+    df_mapped = _map_transactions(username, transactions)
+
+    if df_mapped is None:
+        print("No new transactions to save or data is malformed.")
+        return
+
+    with write_transaction(user_db_path(username)) as conn:
+        _upsert_transactions(conn, df_mapped)
+        bump_data_version(conn, username)
+    print(f"Saved {len(df_mapped)} new transactions for user {username}")
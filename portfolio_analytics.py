@@ -0,0 +1,228 @@
+"""
+Portfolio analytics for the AI Finance Agent.
+
+Investment questions ("total value of my stocks", "profit on TATAMOTORS",
+"how are my funds allocated") are answered from one vectorized pass over a
+user's `stock_portfolio` and `mutual_funds` rows instead of arithmetic SQL
+written by the LLM. The module:
+1. Loads every holding with two indexed queries and computes value, cost,
+   absolute and percentage P&L and portfolio weight with pandas column
+   operations, so users with hundreds of holdings cost the same few calls.
+2. Aggregates the holdings by asset class and by category (allocation).
+3. Caches the result per user and data version (see `database.bump_data_version`),
+   like the chart specs in `chart_engine.py`.
+4. Renders a compact text report for the agent's `portfolio_analytics` tool.
+"""
+
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+# pandas and numpy are imported when analytics are first computed, which keeps
+# them out of the login page's startup time.
+
+from database import get_data_version, read_connection, user_db_path
+from summary_engine import format_amount
+
+# --- Configuration Constants ---
+PORTFOLIO_CACHE_MAX_USERS = int(os.getenv("PORTFOLIO_CACHE_MAX_USERS", "256"))
+PORTFOLIO_REPORT_TOP_N = int(os.getenv("PORTFOLIO_REPORT_TOP_N", "10"))  # Holdings listed in a report.
+STOCKS = "Stocks"
+MUTUAL_FUNDS = "Mutual Funds"
+HOLDING_COLUMNS = ["asset_class", "holding", "name", "category", "quantity", "cost", "value"]
+
+# --- Analytics ---
+
+@dataclass
+class PortfolioAnalytics:
+    """
+    A user's portfolio metrics. Every frame has `cost`, `value`, `pnl`, `pnl_pct`
+    and `weight_pct` columns and is sorted by value, largest first.
+    """
+    holdings: "pd.DataFrame"  # One row per ticker or fund, with lots of the same ticker combined.
+    asset_classes: "pd.DataFrame"  # Stocks and mutual funds.
+    categories: "pd.DataFrame"  # Allocation by fund category; stocks form one category.
+    totals: dict  # cost, value, pnl and pnl_pct of the whole portfolio; pnl_pct is NaN without cost.
+
+    @property
+    def empty(self) -> bool:
+        return self.holdings.empty
+
+def load_holdings(conn, username: str) -> "pd.DataFrame":
+    """
+    Reads a user's stocks and mutual funds into one frame of holdings.
+
+    Returns:
+        A DataFrame with the `HOLDING_COLUMNS`; `quantity` is NaN for funds.
+    """
+    import numpy as np
+    import pandas as pd
+
+    stocks = pd.DataFrame(conn.execute(
+        "SELECT Ticker, CompanyName, Quantity, PurchasePrice, CurrentPrice FROM stock_portfolio WHERE username = ?",
+        (username,),
+    ).fetchall(), columns=["ticker", "company", "quantity", "purchase_price", "current_price"])
+    funds = pd.DataFrame(conn.execute(
+        "SELECT FundName, Category, InvestedAmount, CurrentValue FROM mutual_funds WHERE username = ?",
+        (username,),
+    ).fetchall(), columns=["fund", "category", "invested", "current"])
+
+    frames = [
+        pd.DataFrame({
+            "asset_class": STOCKS, "holding": stocks["ticker"],
+            "name": stocks["company"].fillna(stocks["ticker"]), "category": STOCKS,
+            "quantity": stocks["quantity"].astype(float),
+            "cost": stocks["quantity"] * stocks["purchase_price"],
+            "value": stocks["quantity"] * stocks["current_price"],
+        }),
+        pd.DataFrame({
+            "asset_class": MUTUAL_FUNDS, "holding": funds["fund"], "name": funds["fund"],
+            "category": funds["category"].fillna("Other"), "quantity": np.nan,
+            "cost": funds["invested"].astype(float), "value": funds["current"].astype(float),
+        }),
+    ]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=HOLDING_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[HOLDING_COLUMNS]
+
+def _with_returns(frame: "pd.DataFrame", total_value: float) -> "pd.DataFrame":
+    """Adds P&L, return and weight columns and sorts by value."""
+    import numpy as np
+
+    frame = frame.assign(pnl=frame["value"] - frame["cost"])
+    cost = frame["cost"].to_numpy(dtype=float)
+    frame["pnl_pct"] = np.divide(frame["pnl"].to_numpy(dtype=float) * 100, cost,
+                                 out=np.full(len(frame), np.nan), where=cost != 0)
+    frame["weight_pct"] = frame["value"] * 100 / total_value if total_value else 0.0
+    return frame.sort_values("value", ascending=False, ignore_index=True)
+
+def compute_analytics(holdings: "pd.DataFrame") -> PortfolioAnalytics:
+    """
+    Computes holding, asset class, category and portfolio metrics in one pass.
+
+    Args:
+        holdings: A frame from `load_holdings`.
+
+    Returns:
+        A PortfolioAnalytics; its frames are empty when there are no holdings.
+    """
+    sums = {"cost": ("cost", "sum"), "value": ("value", "sum")}
+    combined = holdings.groupby(["asset_class", "holding"], as_index=False, sort=False).agg(
+        name=("name", "first"), category=("category", "first"),
+        quantity=("quantity", "sum"), **sums,
+    )
+    combined["quantity"] = combined["quantity"].where(combined["asset_class"] == STOCKS)  # Funds have no units.
+    total_cost, total_value = float(combined["cost"].sum()), float(combined["value"].sum())
+    pnl = total_value - total_cost
+    return PortfolioAnalytics(
+        holdings=_with_returns(combined, total_value),
+        asset_classes=_with_returns(combined.groupby("asset_class", as_index=False).agg(**sums), total_value),
+        categories=_with_returns(
+            combined.groupby(["asset_class", "category"], as_index=False).agg(**sums), total_value),
+        totals={"cost": total_cost, "value": total_value, "pnl": pnl,
+                "pnl_pct": pnl * 100 / total_cost if total_cost else math.nan},
+    )
+
+# --- Cache ---
+
+_analytics = OrderedDict()  # (db_path, username) -> (data_version, PortfolioAnalytics)
+_analytics_lock = threading.Lock()
+_stats = {"hits": 0, "builds": 0}
+
+def get_portfolio_analytics(username: str, db_path: str | None = None) -> PortfolioAnalytics:
+    """Returns a user's portfolio analytics, recomputing them if the user's data changed."""
+    db_path = db_path or user_db_path(username)
+    key = (db_path, username)
+    with read_connection(db_path) as conn:
+        version = get_data_version(conn, username)
+        with _analytics_lock:
+            entry = _analytics.get(key)
+            if entry is not None and entry[0] == version:
+                _analytics.move_to_end(key)
+                _stats["hits"] += 1
+                return entry[1]
+        holdings = load_holdings(conn, username)
+
+    analytics = compute_analytics(holdings)
+    with _analytics_lock:
+        _analytics[key] = (version, analytics)
+        _analytics.move_to_end(key)
+        while len(_analytics) > PORTFOLIO_CACHE_MAX_USERS:
+            _analytics.popitem(last=False)
+        _stats["builds"] += 1
+    return analytics
+
+def portfolio_cache_stats() -> dict:
+    with _analytics_lock:
+        return {**_stats, "entries": len(_analytics)}
+
+# --- Report ---
+
+def _pnl_text(row) -> str:
+    pct = "" if math.isnan(row["pnl_pct"]) else f" ({row['pnl_pct']:.2f}%)"
+    return f"P&L {format_amount(row['pnl'])}{pct}"
+
+def _holding_line(row) -> str:
+    label = row["holding"] if row["name"] == row["holding"] else f"{row['holding']} ({row['name']})"
+    units = "" if math.isnan(row["quantity"]) else f"{row['quantity']:g} shares, "
+    return (f"- {label}: {units}value {format_amount(row['value'])}, cost {format_amount(row['cost'])}, "
+            f"{_pnl_text(row)}, {row['weight_pct']:.1f}% of portfolio")
+
+def match_holdings(analytics: PortfolioAnalytics, query: str) -> "pd.DataFrame":
+    """Returns the holdings whose ticker is a word of the query or whose name appears in it."""
+    holdings = analytics.holdings
+    words = {word.upper() for word in re.findall(r"[A-Za-z0-9&.-]+", query)}
+    text = query.lower()
+    by_ticker = (holdings["asset_class"] == STOCKS) & holdings["holding"].str.upper().isin(words)
+    by_name = holdings["name"].map(lambda name: len(text) > 3 and (name.lower() in text or text in name.lower()))
+    return holdings[by_ticker | by_name.astype(bool)]
+
+def portfolio_report(analytics: PortfolioAnalytics, query: str = "", top_n: int = PORTFOLIO_REPORT_TOP_N) -> str:
+    """
+    Renders the analytics as text for the agent.
+
+    Args:
+        analytics: The user's analytics.
+        query: Optional tool input; holdings named in it are listed first.
+        top_n: Number of holdings listed by value.
+
+    Returns:
+        The report: matching holdings, portfolio and asset class totals,
+        allocation by category, the largest holdings and the best and worst returns.
+    """
+    if analytics.empty:
+        return "The user has no stocks or mutual funds."
+    lines = []
+    matches = match_holdings(analytics, query) if query.strip() else analytics.holdings.iloc[:0]
+    if not matches.empty:
+        lines.append("Matching holdings:")
+        lines += [_holding_line(row) for _, row in matches.iterrows()]
+
+    totals = analytics.totals
+    lines.append(f"Portfolio: value {format_amount(totals['value'])}, invested {format_amount(totals['cost'])}, "
+                 f"{_pnl_text(totals)}.")
+    for _, row in analytics.asset_classes.iterrows():
+        count = int((analytics.holdings["asset_class"] == row["asset_class"]).sum())
+        lines.append(f"{row['asset_class']} ({count} holdings): value {format_amount(row['value'])}, "
+                     f"invested {format_amount(row['cost'])}, {_pnl_text(row)}, {row['weight_pct']:.1f}% of portfolio.")
+    lines.append("Allocation by category: " + ", ".join(
+        f"{row['category']} {row['weight_pct']:.1f}%" for _, row in analytics.categories.iterrows()) + ".")
+
+    holdings = analytics.holdings
+    lines.append("Largest holdings:")
+    lines += [_holding_line(row) for _, row in holdings.head(top_n).iterrows()]
+    if len(holdings) > top_n:
+        lines.append(f"... and {len(holdings) - top_n} more holdings.")
+    ranked = holdings.dropna(subset=["pnl_pct"]).sort_values("pnl_pct")
+    if len(ranked) > 1:
+        best, worst = ranked.iloc[-1], ranked.iloc[0]
+        lines.append(f"Best return: {best['holding']} ({best['pnl_pct']:.2f}%). "
+                     f"Worst return: {worst['holding']} ({worst['pnl_pct']:.2f}%).")
+    return "\n".join(lines)
@@ -0,0 +1,137 @@
+"""
+Spending rollups for the AI Finance Agent.
+
+`daily_rollups` (per user, day, type and category) and `monthly_rollups` (per
+user, month, type, category, merchant and description) are maintained by triggers on `bank_transactions` (see
+`schema.py`), so every write path (Plaid syncs, CSV imports, deletes) keeps them
+current. This module provides:
+1. Window queries whose cost grows with the number of days in the window rather
+   than the number of transactions.
+2. A consistency check against `bank_transactions` and a rebuild command.
+
+To run, execute `python rollups.py --check` or `python rollups.py --rebuild [--user jsmith]`.
+"""
+
+import argparse
+
+from database import all_db_paths, bump_data_version, read_connection, user_db_path, write_transaction
+from schema import ROLLUP_REBUILD_SQL
+
+# --- Window Queries ---
+
+def window_totals(conn, username: str, start: str, end: str) -> dict:
+    """
+    Sums a user's rollups for days in (start, end].
+
+    Args:
+        conn: An active sqlite3 connection object.
+        username: The user whose totals are returned.
+        start: Exclusive first day, 'YYYY-MM-DD'.
+        end: Inclusive last day, 'YYYY-MM-DD'.
+
+    Returns:
+        A dictionary keyed by "Debit" and "Credit" with (AmountMinor, TxnCount) tuples.
+    """
+    rows = conn.execute(
+        "SELECT Type, SUM(AmountMinor), SUM(TxnCount) FROM daily_rollups "
+        "WHERE username = ? AND Day > ? AND Day <= ? GROUP BY Type",
+        (username, start, end),
+    ).fetchall()
+    totals = {"Debit": (0, 0), "Credit": (0, 0)}
+    totals.update({txn_type: (amount, count) for txn_type, amount, count in rows})
+    return totals
+
+def window_category_totals(conn, username: str, start: str, end: str, txn_type: str = "Debit") -> list:
+    """
+    Sums a user's rollups by category for days in (start, end].
+
+    Returns:
+        (Category, AmountMinor) tuples, largest spending (most negative) first.
+    """
+    return conn.execute(
+        "SELECT Category, SUM(AmountMinor) AS total FROM daily_rollups "
+        "WHERE username = ? AND Day > ? AND Day <= ? AND Type = ? GROUP BY Category ORDER BY total, Category",
+        (username, start, end, txn_type),
+    ).fetchall()
+
+def last_activity_day(conn, username: str) -> str | None:
+    """Returns the user's most recent transaction day from the rollups."""
+    return conn.execute("SELECT MAX(Day) FROM daily_rollups WHERE username = ?", (username,)).fetchone()[0]
+
+# --- Consistency ---
+
+_CHECK_SQL = {
+    "daily_rollups": (
+        "SELECT username, Date, Type, COALESCE(Category, 'Other') AS category, SUM(AmountMinor), COUNT(*) "
+        "FROM bank_transactions {where} GROUP BY username, Date, Type, category",
+        "SELECT username, Day, Type, Category, AmountMinor, TxnCount FROM daily_rollups {where}",
+    ),
+    "monthly_rollups": (
+        "SELECT username, substr(Date, 1, 7), Type, COALESCE(Category, 'Other') AS category, "
+        "COALESCE(Merchant, Description) AS merchant, Description, SUM(AmountMinor), COUNT(*) "
+        "FROM bank_transactions {where} GROUP BY username, substr(Date, 1, 7), Type, category, merchant, Description",
+        "SELECT username, Month, Type, Category, Merchant, Description, AmountMinor, TxnCount "
+        "FROM monthly_rollups {where}",
+    ),
+}
+
+def check_rollups(conn, username: str | None = None) -> dict:
+    """
+    Compares the rollups with totals recomputed from `bank_transactions`.
+
+    Returns:
+        A dictionary mapping each rollup table to its number of mismatched rows
+        (missing, extra or with different totals).
+    """
+    where, params = ("WHERE username = ?", (username,)) if username else ("", ())
+    mismatches = {}
+    for table, (expected_sql, actual_sql) in _CHECK_SQL.items():
+        expected = {tuple(r[:-2]): tuple(r[-2:]) for r in conn.execute(expected_sql.format(where=where), params)}
+        actual = {tuple(r[:-2]): tuple(r[-2:]) for r in conn.execute(actual_sql.format(where=where), params)}
+        mismatches[table] = sum(1 for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key))
+    return mismatches
+
+def rebuild_rollups(conn, username: str | None = None):
+    """Recomputes the rollups from `bank_transactions` inside the caller's transaction."""
+    where, params = ("WHERE username = ?", (username,)) if username else ("", ())
+    for table, sql in ROLLUP_REBUILD_SQL.items():
+        conn.execute(f"DELETE FROM {table} {where}", params)
+        conn.execute(sql.format(where=where), params)
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description="Check or rebuild the spending rollups.")
+    parser.add_argument("--check", action="store_true", help="Report rows that differ from the transactions.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the rollups from the transactions.")
+    parser.add_argument("--user", default=None, help="Limit to one user (default: all users).")
+    parser.add_argument("--db", default=None, help="Target database (default: FINANCE_DB_PATH, or every shard).")
+    args = parser.parse_args()
+    if not (args.check or args.rebuild):
+        parser.error("Pass --check and/or --rebuild.")
+
+    if args.db:
+        db_paths = [args.db]
+    else:
+        db_paths = [user_db_path(args.user)] if args.user else all_db_paths()
+
+    for db_path in db_paths:
+        if len(db_paths) > 1:
+            print(f"--- {db_path} ---")
+        if args.check:
+            with read_connection(db_path) as conn:
+                mismatches = check_rollups(conn, args.user)
+            for table, count in mismatches.items():
+                print(f"{table}: {'OK' if count == 0 else f'{count} mismatched rows'}")
+        if args.rebuild:
+            with write_transaction(db_path) as conn:
+                rebuild_rollups(conn, args.user)
+                users = [args.user] if args.user else [
+                    row[0] for row in conn.execute("SELECT DISTINCT username FROM bank_transactions")
+                ]
+                for username in users:
+                    bump_data_version(conn, username)
+    if args.rebuild:
+        print(f"Rebuilt rollups for {args.user or 'all users'}.")
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,90 @@
 """
 Evaluation Script for the AI Finance Agent.
 
-This script tests the accuracy of the LangChain agent against a predefined
-set of questions and expected answers from an evaluation dataset.
+This script tests the accuracy and cost of the LangChain agent against a
+predefined set of questions and expected answers from an evaluation dataset.
 
 It performs the following steps:
 1. Loads the evaluation dataset from a JSON file.
-2. Initializes the agent for a default test user ('jsmith').
-3. Iterates through each question, invoking the agent.
-4. Compares the agent's output to the expected answer.
-5. Prints a detailed report and a final accuracy score.
+2. Answers the questions concurrently for a default test user ('jsmith'). Every
+   question gets its own agent executor and memory, so no context leaks between
+   questions, and the answer cache is bypassed. Questions go through the intent
+   router first unless `--agent-only` is given.
+3. Records per-question wall time, agent iterations, LLM calls, SQL queries,
+   token usage, per-step timings and budget hits (see `agent_budget.py`), and
+   compares the output to the expected answer.
+4. Prints a report, with routed and agent answers reported separately, and
+   writes all results as JSON.
+5. Optionally compares the run to a baseline results file and exits with a
+   non-zero status on regressions.
 
-To run, execute `python run_evaluation.py` from the project's root directory.
+Budgets can be overridden per run to tune them against the dataset, e.g.
+`--max-iterations 5 --max-tokens 20000`.
+
+LLM responses can be recorded to a cassette and replayed offline by the
+deterministic `fake_llm.CassetteChatModel`:
+
+    python run_evaluation.py --mode record --cassette evaluation_cassette.json
+    python run_evaluation.py --mode replay --cassette evaluation_cassette.json \\
+        --output results.json --baseline baseline.json
+
+To run against the live model, execute `python run_evaluation.py` from the
+project's root directory.
 """
 
 # --- Imports ---
+import argparse
 import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import perf_counter
+
+from langchain_core.callbacks import BaseCallbackHandler
 from tqdm import tqdm
 
 # Import the agent setup function from the core application logic
-from app_logic import setup_agent
+import agent_budget
+from app_logic import answer_question, create_session_memory, invoke_with_cache, setup_agent
+from benchmark import percentile
 
 # --- Configuration Constants ---
 DATASET_FILE = "evaluation_dataset.json"
+CASSETTE_FILE = "evaluation_cassette.json"
+RESULTS_FILE = "evaluation_results.json"
 TEST_USERNAME = "jsmith"
 TEST_NAME = "John Smith"
+EVALUATION_CONCURRENCY = 4
+
+# Regression gate tolerances relative to the baseline run.
+ACCURACY_TOLERANCE = 0.0     # Allowed drop in accuracy, in percentage points.
+LATENCY_TOLERANCE = 0.25     # Allowed relative increase in median latency.
+TOKEN_TOLERANCE = 0.10       # Allowed relative increase in mean tokens per question.
+
+# --- Metrics Collection ---
+
+class EvaluationCallback(BaseCallbackHandler):
+    """Counts LLM calls, tokens and tool calls for one question."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.tool_calls = 0
+        self.sql_queries = 0
+
+    def on_llm_end(self, response, **kwargs):
+        self.llm_calls += 1
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_calls += 1
+        if (serialized or {}).get("name") == "sql_db_query":
+            self.sql_queries += 1
 
 # --- Helper Functions ---
 
@@ -48,72 +108,246 @@ def load_dataset(file_path: str) -> list | None:
         print(f" Error: Could not decode JSON from '{file_path}'. Please check its format.")
         return None
 
-def print_report(results: list):
+def create_llm(mode: str, cassette: str):
+    """Returns the chat model for an evaluation mode, or None to use the live default."""
+    if mode == "live":
+        return None
+    from fake_llm import CassetteChatModel
+    return CassetteChatModel(cassette_path=cassette, mode=mode)
+
+# --- Evaluation Logic ---
+
+def evaluate_question(item: dict, llm=None, use_router: bool = True) -> dict:
+    """
+    Answers one dataset question with an isolated agent and records its metrics.
+
+    Args:
+        item: A dataset entry with `question` and `answer`.
+        llm: Optional chat model passed to `setup_agent`.
+        use_router: Whether to try the intent router before the agent.
+
+    Returns:
+        A dictionary with the answer, correctness and metrics for the question.
+    """
+    question = item["question"]
+    expected_answer = item["answer"]
+    metrics = EvaluationCallback()
+    result, error = {}, None
+
+    started = perf_counter()
+    try:
+        agent = setup_agent(TEST_USERNAME, TEST_NAME, memory=create_session_memory(), llm=llm)
+        ask = answer_question if use_router else invoke_with_cache
+        result = ask(agent, TEST_USERNAME, question, bypass_cache=True, callbacks=[metrics])
+        agent_output = result.get("output", "No output found.")
+        if not isinstance(agent_output, str):
+            agent_output = str(agent_output)
+        # Check if the expected answer substring is in the agent's output
+        is_correct = expected_answer.lower() in agent_output.lower()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        agent_output = f"AGENT ERROR: {e}"
+        is_correct = False
+    latency_ms = (perf_counter() - started) * 1000
+    budget = result.get("budget") or {}
+
+    return {
+        "question": question,
+        "expected": expected_answer,
+        "actual": agent_output,
+        "correct": is_correct,
+        "route": result.get("routed") or "agent",
+        "latency_ms": round(latency_ms, 2),
+        "iterations": len(result.get("intermediate_steps") or []),
+        "llm_calls": metrics.llm_calls,
+        "tool_calls": metrics.tool_calls,
+        "sql_queries": metrics.sql_queries,
+        "input_tokens": metrics.input_tokens,
+        "output_tokens": metrics.output_tokens,
+        "total_tokens": metrics.input_tokens + metrics.output_tokens,
+        "budget_exceeded": budget.get("exceeded"),
+        "step_ms": [step["ms"] for step in budget.get("steps", [])],
+        "error": error,
+    }
+
+def summarize(results: list) -> dict:
+    """Aggregates per-question results into run-level metrics."""
+    total = len(results)
+    correct = sum(r["correct"] for r in results)
+    latencies = [r["latency_ms"] for r in results]
+    step_latencies = [ms for r in results for ms in r["step_ms"]]
+    summary = {
+        "questions": total,
+        "correct": correct,
+        "accuracy": round(correct / total * 100, 2) if total else 0.0,
+        "errors": sum(r["error"] is not None for r in results),
+        "latency_ms_p50": round(percentile(latencies, 50), 2),
+        "latency_ms_p95": round(percentile(latencies, 95), 2),
+        "latency_ms_mean": round(sum(latencies) / total, 2) if total else 0.0,
+        "mean_iterations": round(sum(r["iterations"] for r in results) / total, 2) if total else 0.0,
+        "total_llm_calls": sum(r["llm_calls"] for r in results),
+        "total_sql_queries": sum(r["sql_queries"] for r in results),
+        "total_tokens": sum(r["total_tokens"] for r in results),
+        "mean_tokens": round(sum(r["total_tokens"] for r in results) / total, 2) if total else 0.0,
+        "step_ms_p50": round(percentile(step_latencies, 50), 2),
+        "step_ms_p95": round(percentile(step_latencies, 95), 2),
+        "budget_hits": {budget: sum(r["budget_exceeded"] == budget for r in results)
+                        for budget in agent_budget.BUDGET_LABELS},
+    }
+    for label, group in (("routed", [r for r in results if r["route"] != "agent"]),
+                         ("agent", [r for r in results if r["route"] == "agent"])):
+        group_latencies = [r["latency_ms"] for r in group]
+        summary[label] = {
+            "questions": len(group),
+            "correct": sum(r["correct"] for r in group),
+            "latency_ms_p50": round(percentile(group_latencies, 50), 2),
+        }
+    return summary
+
+def compare_to_baseline(summary: dict, baseline: dict) -> list:
+    """
+    Compares a run summary with a baseline summary.
+
+    Returns:
+        A list of human-readable regression messages; empty if the run passes.
     """
-    Formats and prints the final evaluation report and accuracy summary.
+    failures = []
+    if summary["accuracy"] < baseline["accuracy"] - ACCURACY_TOLERANCE:
+        failures.append(f"Accuracy dropped from {baseline['accuracy']:.2f}% to {summary['accuracy']:.2f}%.")
+    base_latency = baseline["latency_ms_p50"]
+    if base_latency > 0 and summary["latency_ms_p50"] > base_latency * (1 + LATENCY_TOLERANCE):
+        failures.append(f"Median latency rose from {base_latency:.1f} ms to {summary['latency_ms_p50']:.1f} ms.")
+    base_tokens = baseline["mean_tokens"]
+    if base_tokens > 0 and summary["mean_tokens"] > base_tokens * (1 + TOKEN_TOLERANCE):
+        failures.append(f"Mean tokens per question rose from {base_tokens:.0f} to {summary['mean_tokens']:.0f}.")
+    return failures
+
+def print_report(results: list, summary: dict):
+    """
+    Formats and prints the evaluation report and summary.
 
     Args:
         results: A list of dictionaries, where each dictionary contains the
                  evaluation result for a single question.
+        summary: The run-level metrics from `summarize`.
     """
     print("\n--- Evaluation Report ---")
-    correct_predictions = 0
     for res in results:
         status = "CORRECT" if res["correct"] else "INCORRECT"
         print(f"\nQ: {res['question']}")
         print(f"  - Expected to contain: '{res['expected']}'")
         print(f"  - Actual: '{res['actual']}'")
         print(f"  - Status: {status}")
-        if res["correct"]:
-            correct_predictions += 1
-    
-    total_questions = len(results)
-    accuracy = (correct_predictions / total_questions) * 100 if total_questions > 0 else 0
-    
-    print("\n--- Summary ---")
-    print(f"Accuracy: {correct_predictions}/{total_questions} ({accuracy:.2f}%)")
+        print(f"  - Answered by: {res['route']} in {res['latency_ms']:.1f} ms")
+        print(f"  - Iterations: {res['iterations']}, LLM calls: {res['llm_calls']}, "
+              f"SQL queries: {res['sql_queries']}, tokens: {res['total_tokens']}")
+        if res["budget_exceeded"]:
+            print(f"  - Budget exceeded: {res['budget_exceeded']}")
 
-# --- Main Evaluation Logic ---
+    print("\n--- Summary ---")
+    print(f"Accuracy: {summary['correct']}/{summary['questions']} ({summary['accuracy']:.2f}%)")
+    print(f"Latency: p50 {summary['latency_ms_p50']:.1f} ms, p95 {summary['latency_ms_p95']:.1f} ms")
+    print(f"Average agent iterations per question: {summary['mean_iterations']:.2f}")
+    print(f"LLM calls: {summary['total_llm_calls']}, SQL queries: {summary['total_sql_queries']}, "
+          f"tokens: {summary['total_tokens']}")
+    print(f"Agent steps: p50 {summary['step_ms_p50']:.1f} ms, p95 {summary['step_ms_p95']:.1f} ms; budget hits: "
+          + ", ".join(f"{budget} {count}" for budget, count in summary["budget_hits"].items()))
+    for label in ("routed", "agent"):
+        group = summary[label]
+        print(f"{label.capitalize()}: {group['questions']} questions, {group['correct']} correct, "
+              f"median latency {group['latency_ms_p50']:.1f} ms")
 
-def run_evaluation():
+def run_evaluation(dataset_file: str = DATASET_FILE, mode: str = "live", cassette: str = CASSETTE_FILE,
+                   concurrency: int = EVALUATION_CONCURRENCY, use_router: bool = True) -> dict | None:
     """
     Orchestrates the entire evaluation pipeline.
+
+    Args:
+        dataset_file: Path of the evaluation dataset.
+        mode: "live" to call Gemini, "record" to call Gemini and save a cassette,
+            or "replay" to answer from a cassette offline.
+        cassette: Path of the cassette file used by the record and replay modes.
+        concurrency: Number of questions evaluated at the same time.
+        use_router: Whether questions go through the intent router first.
+
+    Returns:
+        The run report (metadata, summary and per-question results), or None if
+        the dataset could not be loaded.
     """
-    dataset = load_dataset(DATASET_FILE)
+    dataset = load_dataset(dataset_file)
     if not dataset:
-        return
-
-    print(f"Initializing agent for test user '{TEST_USERNAME}'...")
-    agent = setup_agent(username=TEST_USERNAME, name=TEST_NAME)
-    
-    results_log = []
-    print(f"\nStarting evaluation on {len(dataset)} questions...")
-    
-    for item in tqdm(dataset, desc="Evaluating Agent"):
-        question = item["question"]
-        expected_answer = item["answer"]
-        
-        try:
-            result = agent.invoke({"input": question})
-            agent_output = result.get("output", "No output found.")
-            # Check if the expected answer substring is in the agent's output
-            is_correct = expected_answer.lower() in agent_output.lower()
-        except Exception as e:
-            agent_output = f"AGENT ERROR: {e}"
-            is_correct = False
-        
-        results_log.append({
-            "question": question,
-            "expected": expected_answer,
-            "actual": agent_output,
-            "correct": is_correct
-        })
-
-    print_report(results_log)
+        return None
+
+    llm = create_llm(mode, cassette)
+    print(f"Evaluating {len(dataset)} questions for test user '{TEST_USERNAME}' "
+          f"({mode} mode, concurrency {concurrency})...")
+
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(evaluate_question, item, llm, use_router): i for i, item in enumerate(dataset)}
+        results = [None] * len(dataset)
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Evaluating Agent"):
+            results[futures[future]] = future.result()
+    wall_time = perf_counter() - started
+
+    if mode == "record":
+        llm.save()
+        print(f"Recorded {llm.stats()['interactions']} LLM responses to '{cassette}'.")
+
+    summary = summarize(results)
+    summary["wall_time_s"] = round(wall_time, 3)
+    return {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "dataset": dataset_file,
+            "mode": mode,
+            "concurrency": concurrency,
+            "router": use_router,
+            "budgets": agent_budget.budget_settings(),
+        },
+        "summary": summary,
+        "results": results,
+    }
 
 def main():
     """Main entry point for the script."""
-    run_evaluation()
+    parser = argparse.ArgumentParser(description="Evaluate the AI Finance Agent.")
+    parser.add_argument("--dataset", default=DATASET_FILE)
+    parser.add_argument("--mode", choices=["live", "record", "replay"], default="live")
+    parser.add_argument("--cassette", default=CASSETTE_FILE)
+    parser.add_argument("--concurrency", type=int, default=EVALUATION_CONCURRENCY)
+    parser.add_argument("--agent-only", action="store_true", help="Skip the intent router.")
+    parser.add_argument("--output", default=RESULTS_FILE, help="Where to write the JSON results.")
+    parser.add_argument("--baseline", help="Results JSON of a previous run to gate regressions against.")
+    parser.add_argument("--max-iterations", type=int, help="Agent step budget (0 disables).")
+    parser.add_argument("--max-time", type=float, help="Agent wall-clock budget in seconds (0 disables).")
+    parser.add_argument("--max-tokens", type=int, help="Agent token budget per question (0 disables).")
+    parser.add_argument("--tool-concurrency", type=int, help="Tool calls run at once within a step.")
+    args = parser.parse_args()
+
+    # Executors read the budgets when they are built (see agent_budget.budget_settings).
+    for name, value in (("AGENT_MAX_ITERATIONS", args.max_iterations), ("AGENT_MAX_EXECUTION_TIME", args.max_time),
+                        ("AGENT_MAX_TOKENS", args.max_tokens), ("AGENT_TOOL_CONCURRENCY", args.tool_concurrency)):
+        if value is not None:
+            setattr(agent_budget, name, value)
+
+    report = run_evaluation(args.dataset, args.mode, args.cassette, args.concurrency, not args.agent_only)
+    if report is None:
+        sys.exit(1)
+
+    print_report(report["results"], report["summary"])
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare_to_baseline(report["summary"], json.load(f)["summary"])
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            sys.exit(1)
+        print("No regressions against the baseline.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
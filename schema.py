@@ -0,0 +1,416 @@
+"""
+Database schema and migrations for the AI Finance Agent.
+
+This module owns the layout of `finance.db`:
+1. Explicit, typed table definitions with primary keys and indexes.
+2. A list of versioned migrations, tracked with SQLite's `PRAGMA user_version`,
+   that upgrade an existing database file in place.
+
+Call `migrate(conn)` before reading or writing; it is a no-op on an up-to-date database.
+"""
+
+import sqlite3
+
+# --- Table Definitions ---
+# Amounts in `bank_transactions` are stored as integer minor units (e.g. paise or
+# cents) in `AmountMinor`. `Amount` is a generated column in major units so
+# existing queries such as `SUM(Amount)` keep working. Dates are ISO `YYYY-MM-DD`.
+BANK_TRANSACTIONS_DDL = """
+CREATE TABLE bank_transactions (
+    id INTEGER PRIMARY KEY,
+    Date TEXT NOT NULL CHECK (Date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'),
+    Description TEXT NOT NULL,
+    AmountMinor INTEGER NOT NULL,
+    Amount REAL GENERATED ALWAYS AS (AmountMinor / 100.0) VIRTUAL,
+    Type TEXT NOT NULL CHECK (Type IN ('Debit', 'Credit')),
+    username TEXT NOT NULL
+)
+"""
+
+STOCK_PORTFOLIO_DDL = """
+CREATE TABLE stock_portfolio (
+    id INTEGER PRIMARY KEY,
+    Ticker TEXT NOT NULL,
+    CompanyName TEXT,
+    Quantity REAL NOT NULL,
+    PurchasePrice REAL NOT NULL,
+    CurrentPrice REAL NOT NULL,
+    username TEXT NOT NULL
+)
+"""
+
+MUTUAL_FUNDS_DDL = """
+CREATE TABLE mutual_funds (
+    id INTEGER PRIMARY KEY,
+    FundName TEXT NOT NULL,
+    Category TEXT,
+    InvestedAmount REAL NOT NULL,
+    CurrentValue REAL NOT NULL,
+    username TEXT NOT NULL
+)
+"""
+
+PLAID_ITEMS_DDL = """
+CREATE TABLE IF NOT EXISTS plaid_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    access_token TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    UNIQUE(username, item_id)
+)
+"""
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_bank_transactions_user_date ON bank_transactions (username, Date)",
+    "CREATE INDEX IF NOT EXISTS idx_bank_transactions_user_type_date ON bank_transactions (username, Type, Date)",
+    "CREATE INDEX IF NOT EXISTS idx_stock_portfolio_user ON stock_portfolio (username, Ticker)",
+    "CREATE INDEX IF NOT EXISTS idx_mutual_funds_user ON mutual_funds (username)",
+]
+
+# Copies rows from the pandas-created tables of older databases into the typed tables.
+LEGACY_COPY_SQL = {
+    "bank_transactions": """
+        INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username)
+        SELECT date(Date), COALESCE(Description, ''), CAST(ROUND(Amount * 100) AS INTEGER),
+               CASE WHEN Type IN ('Debit', 'Credit') THEN Type
+                    WHEN Amount < 0 THEN 'Debit' ELSE 'Credit' END,
+               username
+        FROM _legacy_bank_transactions
+        WHERE username IS NOT NULL AND date(Date) IS NOT NULL AND Amount IS NOT NULL
+        ORDER BY rowid
+    """,
+    "stock_portfolio": """
+        INSERT INTO stock_portfolio (Ticker, CompanyName, Quantity, PurchasePrice, CurrentPrice, username)
+        SELECT Ticker, CompanyName, Quantity, PurchasePrice, CurrentPrice, username
+        FROM _legacy_stock_portfolio
+        WHERE username IS NOT NULL
+        ORDER BY rowid
+    """,
+    "mutual_funds": """
+        INSERT INTO mutual_funds (FundName, Category, InvestedAmount, CurrentValue, username)
+        SELECT FundName, Category, InvestedAmount, CurrentValue, username
+        FROM _legacy_mutual_funds
+        WHERE username IS NOT NULL
+        ORDER BY rowid
+    """,
+}
+
+# --- Helper Functions ---
+
+def table_columns(conn, table: str) -> list:
+    """Returns the column names of a table, or an empty list if it does not exist."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")]
+
+def get_schema_version(conn) -> int:
+    """Returns the schema version recorded in the database file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+# --- Migrations ---
+
+def _migrate_to_v1(conn):
+    """Replaces pandas-inferred data tables with typed, indexed tables."""
+    conn.execute(PLAID_ITEMS_DDL)
+    for table, ddl in (("bank_transactions", BANK_TRANSACTIONS_DDL),
+                       ("stock_portfolio", STOCK_PORTFOLIO_DDL),
+                       ("mutual_funds", MUTUAL_FUNDS_DDL)):
+        columns = table_columns(conn, table)
+        if "id" in columns:
+            continue
+        if columns:
+            conn.execute(f"ALTER TABLE {table} RENAME TO _legacy_{table}")
+        conn.execute(ddl)
+        if columns:
+            conn.execute(LEGACY_COPY_SQL[table])
+            conn.execute(f"DROP TABLE _legacy_{table}")
+    for statement in INDEXES:
+        conn.execute(statement)
+
+def _migrate_to_v2(conn):
+    """Adds Plaid sync cursors and upsert keys for incremental transaction syncs."""
+    if "cursor" not in table_columns(conn, "plaid_items"):
+        conn.execute("ALTER TABLE plaid_items ADD COLUMN cursor TEXT")
+        conn.execute("ALTER TABLE plaid_items ADD COLUMN last_synced_at TEXT")
+    if "transaction_id" not in table_columns(conn, "bank_transactions"):
+        conn.execute("ALTER TABLE bank_transactions ADD COLUMN transaction_id TEXT")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_bank_transactions_transaction_id "
+        "ON bank_transactions (transaction_id) WHERE transaction_id IS NOT NULL"
+    )
+
+def _migrate_to_v3(conn):
+    """Adds per-user data versions and the persistent answer cache."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS data_versions (
+        username TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS answer_cache (
+        cache_key TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_created_at ON answer_cache (created_at)")
+
+# The first rollup layout: per-user daily totals by type and monthly totals by type
+# and description. Kept as it was so that new databases migrate through the same
+# steps as old ones; `_migrate_to_v6` replaces it with the layout further below.
+_V4_ROLLUP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_rollups (
+        username TEXT NOT NULL,
+        Day TEXT NOT NULL,
+        Type TEXT NOT NULL,
+        AmountMinor INTEGER NOT NULL,
+        Amount REAL GENERATED ALWAYS AS (AmountMinor / 100.0) VIRTUAL,
+        TxnCount INTEGER NOT NULL,
+        PRIMARY KEY (username, Day, Type)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS monthly_rollups (
+        username TEXT NOT NULL,
+        Month TEXT NOT NULL,
+        Type TEXT NOT NULL,
+        Description TEXT NOT NULL,
+        AmountMinor INTEGER NOT NULL,
+        Amount REAL GENERATED ALWAYS AS (AmountMinor / 100.0) VIRTUAL,
+        TxnCount INTEGER NOT NULL,
+        PRIMARY KEY (username, Month, Type, Description)
+    ) WITHOUT ROWID
+    """,
+    # Views in major units for the agent; see schema_context.py.
+    """
+    CREATE VIEW IF NOT EXISTS daily_totals AS
+    SELECT username, Day, Type, Amount, TxnCount FROM daily_rollups
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS monthly_description_totals AS
+    SELECT username, Month, Type, Description, Amount, TxnCount FROM monthly_rollups
+    """,
+]
+
+_V4_ROLLUP_ADD = """
+    INSERT INTO daily_rollups (username, Day, Type, AmountMinor, TxnCount)
+    VALUES (NEW.username, NEW.Date, NEW.Type, NEW.AmountMinor, 1)
+    ON CONFLICT DO UPDATE SET AmountMinor = AmountMinor + excluded.AmountMinor, TxnCount = TxnCount + 1;
+    INSERT INTO monthly_rollups (username, Month, Type, Description, AmountMinor, TxnCount)
+    VALUES (NEW.username, substr(NEW.Date, 1, 7), NEW.Type, NEW.Description, NEW.AmountMinor, 1)
+    ON CONFLICT DO UPDATE SET AmountMinor = AmountMinor + excluded.AmountMinor, TxnCount = TxnCount + 1;
+"""
+_V4_ROLLUP_REMOVE = """
+    UPDATE daily_rollups SET AmountMinor = AmountMinor - OLD.AmountMinor, TxnCount = TxnCount - 1
+    WHERE username = OLD.username AND Day = OLD.Date AND Type = OLD.Type;
+    DELETE FROM daily_rollups
+    WHERE username = OLD.username AND Day = OLD.Date AND Type = OLD.Type AND TxnCount <= 0;
+    UPDATE monthly_rollups SET AmountMinor = AmountMinor - OLD.AmountMinor, TxnCount = TxnCount - 1
+    WHERE username = OLD.username AND Month = substr(OLD.Date, 1, 7) AND Type = OLD.Type
+      AND Description = OLD.Description;
+    DELETE FROM monthly_rollups
+    WHERE username = OLD.username AND Month = substr(OLD.Date, 1, 7) AND Type = OLD.Type
+      AND Description = OLD.Description AND TxnCount <= 0;
+"""
+_V4_ROLLUP_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS trg_bank_transactions_rollup_insert AFTER INSERT ON bank_transactions "
+    f"BEGIN {_V4_ROLLUP_ADD} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_bank_transactions_rollup_delete AFTER DELETE ON bank_transactions "
+    f"BEGIN {_V4_ROLLUP_REMOVE} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_bank_transactions_rollup_update "
+    f"AFTER UPDATE OF Date, Description, AmountMinor, Type, username ON bank_transactions "
+    f"BEGIN {_V4_ROLLUP_REMOVE} {_V4_ROLLUP_ADD} END",
+]
+
+# Recomputes every rollup row from `bank_transactions` (all users, or one user with ?).
+_V4_ROLLUP_REBUILD_SQL = {
+    "daily_rollups": """
+        INSERT INTO daily_rollups (username, Day, Type, AmountMinor, TxnCount)
+        SELECT username, Date, Type, SUM(AmountMinor), COUNT(*) FROM bank_transactions
+        {where} GROUP BY username, Date, Type
+    """,
+    "monthly_rollups": """
+        INSERT INTO monthly_rollups (username, Month, Type, Description, AmountMinor, TxnCount)
+        SELECT username, substr(Date, 1, 7), Type, Description, SUM(AmountMinor), COUNT(*)
+        FROM bank_transactions {where} GROUP BY username, substr(Date, 1, 7), Type, Description
+    """,
+}
+
+def _migrate_to_v4(conn):
+    """Adds incrementally maintained daily and monthly spending rollups."""
+    for statement in _V4_ROLLUP_DDL + _V4_ROLLUP_TRIGGERS:
+        conn.execute(statement)
+    for table, sql in _V4_ROLLUP_REBUILD_SQL.items():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(sql.format(where=""))
+
+def _migrate_to_v5(conn):
+    """Adds merchant and category columns and categorizes existing transactions."""
+    from categorization import recategorize_rows
+
+    columns = table_columns(conn, "bank_transactions")
+    for column in ("Merchant", "Category"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE bank_transactions ADD COLUMN {column} TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bank_transactions_user_category "
+        "ON bank_transactions (username, Category, Date)"
+    )
+    recategorize_rows(conn)
+
+# Per-user daily totals by type and category, and monthly totals by type, category,
+# merchant and description, kept in step with `bank_transactions` by triggers on
+# every insert, update and delete (including recategorization). Uncategorized rows
+# are counted under 'Other' (`categorization.DEFAULT_CATEGORY`) and rows without a
+# merchant under their description.
+ROLLUP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_rollups (
+        username TEXT NOT NULL,
+        Day TEXT NOT NULL,
+        Type TEXT NOT NULL,
+        Category TEXT NOT NULL,
+        AmountMinor INTEGER NOT NULL,
+        Amount REAL GENERATED ALWAYS AS (AmountMinor / 100.0) VIRTUAL,
+        TxnCount INTEGER NOT NULL,
+        PRIMARY KEY (username, Day, Type, Category)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS monthly_rollups (
+        username TEXT NOT NULL,
+        Month TEXT NOT NULL,
+        Type TEXT NOT NULL,
+        Category TEXT NOT NULL,
+        Merchant TEXT NOT NULL,
+        Description TEXT NOT NULL,
+        AmountMinor INTEGER NOT NULL,
+        Amount REAL GENERATED ALWAYS AS (AmountMinor / 100.0) VIRTUAL,
+        TxnCount INTEGER NOT NULL,
+        PRIMARY KEY (username, Month, Type, Category, Merchant, Description)
+    ) WITHOUT ROWID
+    """,
+    # Views in major units for the agent; see schema_context.py.
+    """
+    CREATE VIEW IF NOT EXISTS daily_totals AS
+    SELECT username, Day, Type, Category, Amount, TxnCount FROM daily_rollups
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS monthly_description_totals AS
+    SELECT username, Month, Type, Category, Merchant, Description, Amount, TxnCount FROM monthly_rollups
+    """,
+]
+_ROLLUP_CATEGORY = "COALESCE({row}.Category, 'Other')"
+_ROLLUP_MERCHANT = "COALESCE({row}.Merchant, {row}.Description)"
+
+_ROLLUP_ADD = f"""
+    INSERT INTO daily_rollups (username, Day, Type, Category, AmountMinor, TxnCount)
+    VALUES (NEW.username, NEW.Date, NEW.Type, {_ROLLUP_CATEGORY.format(row="NEW")}, NEW.AmountMinor, 1)
+    ON CONFLICT DO UPDATE SET AmountMinor = AmountMinor + excluded.AmountMinor, TxnCount = TxnCount + 1;
+    INSERT INTO monthly_rollups (username, Month, Type, Category, Merchant, Description, AmountMinor, TxnCount)
+    VALUES (NEW.username, substr(NEW.Date, 1, 7), NEW.Type, {_ROLLUP_CATEGORY.format(row="NEW")},
+            {_ROLLUP_MERCHANT.format(row="NEW")}, NEW.Description, NEW.AmountMinor, 1)
+    ON CONFLICT DO UPDATE SET AmountMinor = AmountMinor + excluded.AmountMinor, TxnCount = TxnCount + 1;
+"""
+_ROLLUP_DAILY_KEY = f"username = OLD.username AND Day = OLD.Date AND Type = OLD.Type " \
+                    f"AND Category = {_ROLLUP_CATEGORY.format(row='OLD')}"
+_ROLLUP_MONTHLY_KEY = f"username = OLD.username AND Month = substr(OLD.Date, 1, 7) AND Type = OLD.Type " \
+                      f"AND Category = {_ROLLUP_CATEGORY.format(row='OLD')} " \
+                      f"AND Merchant = {_ROLLUP_MERCHANT.format(row='OLD')} AND Description = OLD.Description"
+_ROLLUP_REMOVE = f"""
+    UPDATE daily_rollups SET AmountMinor = AmountMinor - OLD.AmountMinor, TxnCount = TxnCount - 1
+    WHERE {_ROLLUP_DAILY_KEY};
+    DELETE FROM daily_rollups WHERE {_ROLLUP_DAILY_KEY} AND TxnCount <= 0;
+    UPDATE monthly_rollups SET AmountMinor = AmountMinor - OLD.AmountMinor, TxnCount = TxnCount - 1
+    WHERE {_ROLLUP_MONTHLY_KEY};
+    DELETE FROM monthly_rollups WHERE {_ROLLUP_MONTHLY_KEY} AND TxnCount <= 0;
+"""
+ROLLUP_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS trg_bank_transactions_rollup_insert AFTER INSERT ON bank_transactions "
+    f"BEGIN {_ROLLUP_ADD} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_bank_transactions_rollup_delete AFTER DELETE ON bank_transactions "
+    f"BEGIN {_ROLLUP_REMOVE} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_bank_transactions_rollup_update "
+    f"AFTER UPDATE OF Date, Description, AmountMinor, Type, username, Merchant, Category ON bank_transactions "
+    f"BEGIN {_ROLLUP_REMOVE} {_ROLLUP_ADD} END",
+]
+
+# Recomputes every rollup row from `bank_transactions` (all users, or one user with ?).
+ROLLUP_REBUILD_SQL = {
+    "daily_rollups": """
+        INSERT INTO daily_rollups (username, Day, Type, Category, AmountMinor, TxnCount)
+        SELECT username, Date, Type, COALESCE(Category, 'Other') AS category, SUM(AmountMinor), COUNT(*)
+        FROM bank_transactions {where} GROUP BY username, Date, Type, category
+    """,
+    "monthly_rollups": """
+        INSERT INTO monthly_rollups (username, Month, Type, Category, Merchant, Description, AmountMinor, TxnCount)
+        SELECT username, substr(Date, 1, 7), Type, COALESCE(Category, 'Other') AS category,
+               COALESCE(Merchant, Description) AS merchant, Description, SUM(AmountMinor), COUNT(*)
+        FROM bank_transactions {where}
+        GROUP BY username, substr(Date, 1, 7), Type, category, merchant, Description
+    """,
+}
+
+def _migrate_to_v6(conn):
+    """Keys the spending rollups on category (and the monthly ones on merchant too)."""
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_bank_transactions_rollup_{trigger}")
+    for view in ("daily_totals", "monthly_description_totals"):
+        conn.execute(f"DROP VIEW IF EXISTS {view}")
+    for table in ROLLUP_REBUILD_SQL:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for statement in ROLLUP_DDL + ROLLUP_TRIGGERS:
+        conn.execute(statement)
+    for sql in ROLLUP_REBUILD_SQL.values():
+        conn.execute(sql.format(where=""))
+
+# Each entry upgrades the schema from version N to N + 1. Append only.
+MIGRATIONS = [
+    _migrate_to_v1,
+    _migrate_to_v2,
+    _migrate_to_v3,
+    _migrate_to_v4,
+    _migrate_to_v5,
+    _migrate_to_v6,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# --- Core Function ---
+
+def migrate(conn) -> int:
+    """
+    Upgrades the database to the latest schema version in place.
+
+    Each pending migration runs in its own transaction together with the
+    `user_version` bump, so an interrupted upgrade never leaves a half-migrated file.
+
+    Args:
+        conn: An active sqlite3 connection object.
+
+    Returns:
+        The schema version of the database after migrating.
+    """
+    version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise sqlite3.DatabaseError(
+            f"Database schema version {version} is newer than this application ({SCHEMA_VERSION})."
+        )
+
+    while version < SCHEMA_VERSION:
+        conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the write lock.
+            if get_schema_version(conn) == version:
+                MIGRATIONS[version](conn)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                print(f"Migrated database schema to version {version + 1}.")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = get_schema_version(conn)
+
+    return get_schema_version(conn)
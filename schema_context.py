@@ -0,0 +1,144 @@
+"""
+Compact schema context for the SQL agent in the AI Finance Agent.
+
+Instead of letting the agent discover tables with list-tables and schema tools
+(full CREATE statements plus sample rows) on every question, this module builds
+a short digest of the data tables once and injects it into the system prompt:
+1. Columns with their declared types and meaning.
+2. Value domains of low-cardinality text columns (e.g. Type: Debit | Credit).
+3. Row counts and date ranges for the current user.
+
+Digests are cached per user and rebuilt when the schema (`PRAGMA schema_version`)
+or the user's data version (see `database.bump_data_version`) changes.
+"""
+
+import threading
+from collections import OrderedDict
+
+from database import get_data_version, read_connection, user_db_path
+
+# --- Configuration Constants ---
+# The last two are views over the spending rollups (see rollups.py).
+SCHEMA_CONTEXT_TABLES = ["bank_transactions", "stock_portfolio", "mutual_funds",
+                         "daily_totals", "monthly_description_totals"]
+SCHEMA_CONTEXT_VIEWS = {"daily_totals", "monthly_description_totals"}
+DOMAIN_MAX_VALUES = 12
+HIDDEN_COLUMNS = {"id", "transaction_id"}
+COLUMN_NOTES = {
+    ("bank_transactions", "Date"): "ISO date 'YYYY-MM-DD'; compare as text, e.g. Date >= date('now', '-30 days')",
+    ("bank_transactions", "Description"): "merchant or free-text description",
+    ("bank_transactions", "AmountMinor"): "integer minor units (Amount * 100), exact for sums",
+    ("bank_transactions", "Amount"): "major currency units; negative for debits, positive for credits",
+    ("bank_transactions", "Merchant"): "normalized merchant name; group by this rather than Description",
+    ("stock_portfolio", "Quantity"): "number of shares held",
+    ("stock_portfolio", "PurchasePrice"): "price per share at purchase",
+    ("stock_portfolio", "CurrentPrice"): "latest price per share; value = Quantity * CurrentPrice",
+    ("mutual_funds", "InvestedAmount"): "total amount invested",
+    ("mutual_funds", "CurrentValue"): "current market value; profit = CurrentValue - InvestedAmount",
+    ("daily_totals", "Day"): "ISO date; one row per user, day, Type and Category. Prefer this view for totals "
+                              "over date ranges, summing across categories",
+    ("daily_totals", "Category"): "spending category; 'Other' when uncategorized",
+    ("daily_totals", "Amount"): "sum of Amount for the day, Type and Category (negative for debits)",
+    ("daily_totals", "TxnCount"): "number of transactions",
+    ("monthly_description_totals", "Month"): "'YYYY-MM'; one row per user, month, Type, Category, Merchant "
+                                             "and Description",
+    ("monthly_description_totals", "Category"): "spending category; use for per-category monthly totals",
+    ("monthly_description_totals", "Merchant"): "normalized merchant name; group by this for per-merchant totals",
+    ("monthly_description_totals", "Description"): "merchant or free-text description",
+    ("monthly_description_totals", "Amount"): "sum of Amount (negative for debits)",
+    ("monthly_description_totals", "TxnCount"): "number of transactions",
+}
+CACHE_MAX_USERS = 256
+
+# --- Digest Builder ---
+
+def _column_domain(conn, table: str, column: str, username: str):
+    """Returns the sorted distinct values of a column if there are few of them."""
+    rows = conn.execute(
+        f'SELECT DISTINCT "{column}" FROM {table} WHERE username = ? AND "{column}" IS NOT NULL LIMIT ?',
+        (username, DOMAIN_MAX_VALUES + 1),
+    ).fetchall()
+    if not rows or len(rows) > DOMAIN_MAX_VALUES:
+        return None
+    return sorted(str(row[0]) for row in rows)
+
+def build_schema_digest(conn, username: str) -> str:
+    """
+    Builds the schema digest text for one user.
+
+    Args:
+        conn: An active sqlite3 connection object.
+        username: The user whose value domains and date ranges are described.
+
+    Returns:
+        A plain-text digest suitable for a system prompt.
+    """
+    lines = []
+    for table in SCHEMA_CONTEXT_TABLES:
+        columns = [(row[1], row[2] or "ANY") for row in conn.execute(f"PRAGMA table_xinfo({table})")]
+        if not columns:
+            continue
+        count = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE username = ?", (username,)).fetchone()[0]
+        kind = "View" if table in SCHEMA_CONTEXT_VIEWS else "Table"
+        header = f"{kind} {table} ({count} rows for this user"
+        if table == "bank_transactions" and count:
+            first, last = conn.execute(
+                "SELECT MIN(Date), MAX(Date) FROM bank_transactions WHERE username = ?", (username,)
+            ).fetchone()
+            header += f"; dates from {first} to {last}"
+        lines.append(header + "):")
+
+        for column, declared_type in columns:
+            if column in HIDDEN_COLUMNS:
+                continue
+            if column == "username":
+                lines.append(f"  - username TEXT: always filter with username = '{username}'")
+                continue
+            detail = COLUMN_NOTES.get((table, column), "")
+            if declared_type.upper().startswith("TEXT") and (table, column) not in COLUMN_NOTES:
+                domain = _column_domain(conn, table, column, username)
+                if domain:
+                    detail = "one of " + " | ".join(domain)
+            lines.append(f"  - {column} {declared_type}" + (f": {detail}" if detail else ""))
+    return "\n".join(lines)
+
+# --- Cache ---
+
+_cache = OrderedDict()  # (db_path, username) -> (fingerprint, digest)
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "builds": 0}
+
+def get_schema_context(username: str, db_path: str | None = None):
+    """
+    Returns the cached schema digest for a user, rebuilding it if stale.
+
+    Returns:
+        A tuple of (fingerprint, digest). The fingerprint changes whenever the
+        digest is rebuilt, so callers can key prompt-dependent caches on it.
+    """
+    db_path = db_path or user_db_path(username)
+    key = (db_path, username)
+    with read_connection(db_path) as conn:
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        fingerprint = (schema_version, get_data_version(conn, username))
+
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                _cache.move_to_end(key)
+                _stats["hits"] += 1
+                return entry
+
+        digest = build_schema_digest(conn, username)
+
+    with _cache_lock:
+        _cache[key] = (fingerprint, digest)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_USERS:
+            _cache.popitem(last=False)
+        _stats["builds"] += 1
+    return fingerprint, digest
+
+def schema_context_stats() -> dict:
+    with _cache_lock:
+        return {**_stats, "cached_users": len(_cache)}
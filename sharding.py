@@ -0,0 +1,235 @@
+"""
+Shard administration for the AI Finance Agent.
+
+With sharding on, every user's rows live in one database file under
+FINANCE_SHARD_DIR: a file per user ("user" mode) or one of N hash buckets
+("hash" mode). `database.user_db_path` routes each username to its file; this
+module moves data between layouts:
+1. `split_database` copies every user of an existing `finance.db` into the shard
+   files and then writes the layout, which switches routing on. The source file is
+   left untouched as a backup.
+2. `rebalance` copies every user into the files of a new layout (e.g. more
+   buckets), switches the layout and deletes the old files. Bucket files carry the
+   bucket count in their names, so the old layout stays intact until the switch.
+3. `shard_status` reports the users and size of each shard file.
+
+Rollups are rebuilt by the triggers on `bank_transactions` as rows are copied,
+and each copied user's data version is bumped. Run these commands while the app,
+the API and the sync worker are stopped: writes made during a copy are lost.
+
+To run, execute `python sharding.py split --mode hash --buckets 16`,
+`python sharding.py rebalance --buckets 32` or `python sharding.py status`.
+"""
+
+import argparse
+import os
+from time import perf_counter
+
+import database
+from database import (bump_data_version, close_manager, layout_db_paths, make_shard_layout, read_connection,
+                      read_shard_layout, shard_file_name, write_shard_layout, write_transaction)
+
+# --- Configuration Constants ---
+# Tables holding per-user rows. The rollup tables are not copied: the triggers on
+# `bank_transactions` rebuild them in the target file.
+USER_TABLES = ["bank_transactions", "stock_portfolio", "mutual_funds", "plaid_items",
+               "data_versions", "answer_cache"]
+COPY_BATCH_SIZE = 5000
+
+# --- Helper Functions ---
+
+def _stored_columns(conn, table: str) -> list:
+    """
+    Returns the columns to copy: those that hold data, skipping generated columns
+    and an INTEGER PRIMARY KEY, which the target file assigns itself.
+    """
+    columns = conn.execute(f"PRAGMA table_xinfo({table})").fetchall()
+    key = [row for row in columns if row[5] > 0]
+    rowid_alias = key[0][1] if len(key) == 1 and key[0][2].upper() == "INTEGER" else None
+    return [row[1] for row in columns if row[6] == 0 and row[1] != rowid_alias]
+
+def list_users(conn) -> list:
+    """Returns every username with rows in any per-user table."""
+    union = " UNION ".join(f"SELECT username FROM {table}" for table in USER_TABLES)
+    return [row[0] for row in conn.execute(f"SELECT username FROM ({union}) ORDER BY username")]
+
+def delete_user(conn, username: str):
+    """Deletes a user's rows inside the caller's transaction (the triggers clear their rollups)."""
+    for table in USER_TABLES:
+        conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+
+def copy_user(source_path: str, target_path: str, username: str, batch_size: int = COPY_BATCH_SIZE) -> int:
+    """
+    Replaces a user's rows in the target file with their rows from the source file.
+
+    The copy runs in a single target transaction, so the user is either fully
+    copied or not at all. Integer row ids are assigned by the target, since the
+    same ids may already be taken there by other users; rows keep their relative
+    order, and Plaid transaction ids are copied like any other column.
+
+    Returns:
+        The number of rows copied.
+
+    Raises:
+        RuntimeError: If the copied row counts do not match the source.
+    """
+    copied = 0
+    with read_connection(source_path) as source, write_transaction(target_path) as target:
+        delete_user(target, username)
+        for table in USER_TABLES:
+            columns = _stored_columns(source, table)
+            insert = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' for _ in columns)})")
+            expected = source.execute(f"SELECT COUNT(*) FROM {table} WHERE username = ?", (username,)).fetchone()[0]
+            count, after = 0, -1
+            while True:
+                rows = source.execute(
+                    f"SELECT rowid, {', '.join(columns)} FROM {table} WHERE username = ? AND rowid > ? "
+                    f"ORDER BY rowid LIMIT ?", (username, after, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                target.executemany(insert, [row[1:] for row in rows])
+                count += len(rows)
+                after = rows[-1][0]
+            if count != expected:
+                raise RuntimeError(f"Copied {count} of {expected} {table} rows for {username}.")
+            copied += count
+        bump_data_version(target, username)
+    return copied
+
+def remove_database_file(path: str):
+    """Closes a database file's connections and deletes it with its WAL side files."""
+    close_manager(path)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+# --- Commands ---
+
+def split_database(source: str | None = None, shard_dir: str | None = None, mode: str | None = None,
+                   buckets: int | None = None, batch_size: int = COPY_BATCH_SIZE) -> dict:
+    """
+    Splits a single database file into shard files and switches routing to them.
+
+    Args:
+        source: The database to split; defaults to `DB_PATH`.
+        shard_dir: Directory for the shard files; defaults to FINANCE_SHARD_DIR.
+        mode: "user" or "hash"; defaults to FINANCE_SHARD_MODE.
+        buckets: Number of hash buckets; defaults to FINANCE_SHARD_BUCKETS.
+        batch_size: Rows read from the source per query.
+
+    Returns:
+        A dictionary with the number of users, rows and shard files, and the elapsed seconds.
+    """
+    source = source or database.DB_PATH
+    shard_dir = shard_dir or database.SHARD_DIR
+    if not shard_dir:
+        raise ValueError("Pass a shard directory or set FINANCE_SHARD_DIR.")
+    if read_shard_layout(shard_dir) is not None:
+        raise ValueError(f"{shard_dir} already has a shard layout; use `rebalance` to change it.")
+    layout = make_shard_layout(mode or database.SHARD_MODE, buckets or database.SHARD_BUCKETS)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    started = perf_counter()
+    with read_connection(source) as conn:
+        users = list_users(conn)
+    rows, targets = 0, set()
+    for username in users:
+        target = os.path.join(shard_dir, shard_file_name(username, layout))
+        rows += copy_user(source, target, username, batch_size)
+        targets.add(target)
+    write_shard_layout(shard_dir, layout["mode"], layout["buckets"])
+    return {"users": len(users), "rows": rows, "shards": len(targets),
+            "elapsed_s": round(perf_counter() - started, 3)}
+
+def rebalance(shard_dir: str | None = None, mode: str | None = None, buckets: int | None = None,
+              batch_size: int = COPY_BATCH_SIZE) -> dict:
+    """
+    Moves every user into the files of a new layout, then deletes the old files.
+
+    Args:
+        shard_dir: The shard directory; defaults to FINANCE_SHARD_DIR.
+        mode: The new mode; defaults to the current one.
+        buckets: The new number of hash buckets; defaults to FINANCE_SHARD_BUCKETS.
+        batch_size: Rows read from the source per query.
+
+    Returns:
+        A dictionary with the number of users and rows moved, the old and new
+        numbers of shard files, and the elapsed seconds.
+    """
+    shard_dir = shard_dir or database.SHARD_DIR
+    current = read_shard_layout(shard_dir) if shard_dir else None
+    if current is None:
+        raise ValueError("There is no shard layout to rebalance; run `split` first.")
+    layout = make_shard_layout(mode or current["mode"], buckets or database.SHARD_BUCKETS)
+    old_paths = layout_db_paths(shard_dir, current)
+    if layout == current:
+        return {"users": 0, "rows": 0, "old_shards": len(old_paths), "new_shards": len(old_paths),
+                "elapsed_s": 0.0}
+
+    started = perf_counter()
+    users, rows, targets = 0, 0, set()
+    for path in old_paths:
+        with read_connection(path) as conn:
+            usernames = list_users(conn)
+        for username in usernames:
+            target = os.path.join(shard_dir, shard_file_name(username, layout))
+            rows += copy_user(path, target, username, batch_size)
+            targets.add(target)
+            users += 1
+
+    # Switch routing before deleting anything, so an interrupted run leaves the
+    # old layout complete.
+    write_shard_layout(shard_dir, layout["mode"], layout["buckets"])
+    for path in old_paths:
+        if path not in targets:
+            remove_database_file(path)
+    return {"users": users, "rows": rows, "old_shards": len(old_paths), "new_shards": len(targets),
+            "elapsed_s": round(perf_counter() - started, 3)}
+
+def shard_status(shard_dir: str | None = None) -> list:
+    """Returns a (path, users, size in bytes) tuple for each shard file."""
+    shard_dir = shard_dir or database.SHARD_DIR
+    layout = read_shard_layout(shard_dir) if shard_dir else None
+    if layout is None:
+        return []
+    status = []
+    for path in layout_db_paths(shard_dir, layout):
+        with read_connection(path) as conn:
+            users = len(list_users(conn))
+        status.append((path, users, os.path.getsize(path)))
+    return status
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description="Split finance.db into shards or rebalance them.")
+    parser.add_argument("--shard-dir", default=None, help="Shard directory (default: FINANCE_SHARD_DIR).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split = commands.add_parser("split", help="Copy every user of a database into shard files.")
+    split.add_argument("--source", default=None, help="Database to split (default: FINANCE_DB_PATH).")
+    split.add_argument("--mode", choices=database.SHARD_MODES, default=None)
+    split.add_argument("--buckets", type=int, default=None)
+    move = commands.add_parser("rebalance", help="Move every user into a new layout.")
+    move.add_argument("--mode", choices=database.SHARD_MODES, default=None)
+    move.add_argument("--buckets", type=int, default=None)
+    commands.add_parser("status", help="Show the users and size of each shard.")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        result = split_database(args.source, args.shard_dir, args.mode, args.buckets)
+        print(f"Copied {result['rows']} rows for {result['users']} users into {result['shards']} shards "
+              f"in {result['elapsed_s']}s. Set FINANCE_SHARD_DIR to route the app to them.")
+    elif args.command == "rebalance":
+        result = rebalance(args.shard_dir, args.mode, args.buckets)
+        print(f"Moved {result['rows']} rows for {result['users']} users from {result['old_shards']} "
+              f"to {result['new_shards']} shards in {result['elapsed_s']}s.")
+    else:
+        status = shard_status(args.shard_dir)
+        if not status:
+            print("Sharding is off: no shard layout found.")
+        for path, users, size in status:
+            print(f"{path}: {users} users, {size / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
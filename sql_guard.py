@@ -0,0 +1,312 @@
+"""
+Guardrails for the SQL the agent writes.
+
+`GuardedSQLDatabase` replaces LangChain's `SQLDatabase` behind the agent's
+`sql_db_query` tool. Every generated query goes through these steps before it
+touches `finance.db`:
+1. Parse: comments are removed (the stripped statement is the one that runs),
+   only a single SELECT (or WITH ... SELECT) statement is accepted, and
+   schema-qualified names such as `main.bank_transactions` are rejected.
+2. Scope: each agent-visible table is shadowed by a CTE that reads a temporary
+   per-connection view filtered on the current username, so the query only sees
+   that user's rows even if the LLM forgot (or was talked out of) the WHERE
+   clause. An SQLite authorizer backs this up: it denies writes, PRAGMAs and
+   ATTACH, and any read of a `main` table that does not go through those views.
+3. Plan check: `EXPLAIN QUERY PLAN` must not contain a full scan of a large table.
+4. Execute: on the thread's read-only connection with a progress-handler
+   deadline, fetching at most SQL_GUARD_MAX_ROWS rows.
+
+Outcomes are counted in the instrumentation registry (`sql_guard_queries_total`)
+and rejected, rewritten, truncated or timed-out queries are logged.
+"""
+
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from time import monotonic, perf_counter
+
+from langchain_community.utilities import SQLDatabase
+from langchain_community.utilities.sql_database import truncate_word
+
+from database import read_connection
+from instrumentation import REGISTRY, log_event, record_span
+from schema_context import SCHEMA_CONTEXT_TABLES
+
+# --- Configuration Constants ---
+SQL_GUARD_MAX_ROWS = int(os.getenv("SQL_GUARD_MAX_ROWS", "200"))
+SQL_GUARD_TIMEOUT = float(os.getenv("SQL_GUARD_TIMEOUT", "5"))  # Seconds per query
+SQL_GUARD_PROGRESS_STEPS = 10000  # SQLite VM instructions between deadline checks
+# Agent-visible tables and views; each is replaced by a per-user CTE.
+SCOPED_TABLES = SCHEMA_CONTEXT_TABLES
+# Tables that grow with the number of transactions; a plan that scans one in
+# full is rejected instead of run.
+LARGE_TABLES = {"bank_transactions", "daily_rollups", "monthly_rollups"}
+
+# Prefix of the temporary views the scoping CTEs read; see `install_guard_views`.
+GUARD_VIEW_PREFIX = "guard_"
+
+# Literals, quoted identifiers and comments, matched together so that a quote
+# inside a comment (or a comment marker inside a literal) is not misread.
+_TOKEN_PATTERN = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)""",
+                            re.DOTALL)
+_QUALIFIED_PATTERN = re.compile(r"""(?:\b(?:main|temp)|"(?:main|temp)"|`(?:main|temp)`|\[(?:main|temp)\])\s*\.""",
+                                re.IGNORECASE)
+_USERNAME_FILTER_PATTERN = re.compile(r"\busername\s*(?:==?|\bIN\b|\bLIKE\b)", re.IGNORECASE)
+_WITH_PATTERN = re.compile(r"^\s*WITH(\s+RECURSIVE)?\s+", re.IGNORECASE)
+_SCAN_PATTERN = re.compile(r"^SCAN (?:main\.)?(\w+)")
+_VIEW_BODY_PATTERN = re.compile(r"^\s*CREATE\s+VIEW\s+(?:IF\s+NOT\s+EXISTS\s+)?\S+\s+AS\s+", re.IGNORECASE)
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+class SQLGuardError(ValueError):
+    """Raised when a generated query is rejected; `reason` is a short counter label."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+# --- Parsing and Rewriting ---
+
+def _strip_comments(sql: str) -> str:
+    """Replaces every comment outside literals and quoted identifiers with a space."""
+    return _TOKEN_PATTERN.sub(lambda m: " " if m.group().startswith(("--", "/*")) else m.group(), sql)
+
+def _blank_literals(sql: str) -> str:
+    """Replaces string literals with '' so their text is not mistaken for SQL."""
+    return _TOKEN_PATTERN.sub(lambda m: "''" if m.group().startswith("'") else m.group(), sql)
+
+def check_query(sql: str) -> str:
+    """
+    Validates that a query is a single, unqualified SELECT statement.
+
+    Returns:
+        The statement without comments or a trailing semicolon. This is the text
+        that must be run, so nothing hidden in a comment escapes the checks.
+
+    Raises:
+        SQLGuardError: If the query is empty, has several statements, is not a
+            SELECT or refers to a schema explicitly.
+    """
+    statement = _strip_comments((sql or "").strip()).strip().rstrip(";").strip()
+    stripped = _blank_literals(statement)
+    if not stripped.strip():
+        raise SQLGuardError("empty", "The query is empty.")
+    if ";" in stripped:
+        raise SQLGuardError("multiple_statements", "Only one statement can be run at a time.")
+    first_word = stripped.split(None, 1)[0].upper()
+    if first_word not in ("SELECT", "WITH"):
+        raise SQLGuardError("not_select", "Only SELECT queries are allowed.")
+    if _QUALIFIED_PATTERN.search(stripped):
+        raise SQLGuardError("qualified_name", "Refer to tables without a schema prefix such as 'main.'.")
+    return statement
+
+def mentions_username(sql: str) -> bool:
+    """True if the query filters on `username` itself (outside literals and comments)."""
+    return _USERNAME_FILTER_PATTERN.search(_blank_literals(_strip_comments(sql))) is not None
+
+def scope_query(sql: str, username: str) -> str:
+    """
+    Prefixes a checked query with CTEs that shadow the agent-visible tables.
+
+    SQLite resolves unqualified table names to CTEs first, so every reference in
+    the query, including joins and subqueries, reads the guard view of the table,
+    which only returns the user's rows. The CTEs are NOT MATERIALIZED so the
+    planner still uses the username indexes. The username filter is repeated in
+    the CTE to keep the rewritten query readable in the logs.
+    """
+    quoted = "'" + username.replace("'", "''") + "'"
+    ctes = ", ".join(
+        f"{table} AS NOT MATERIALIZED (SELECT * FROM temp.{GUARD_VIEW_PREFIX}{table} WHERE username = {quoted})"
+        for table in SCOPED_TABLES
+    )
+    match = _WITH_PATTERN.match(sql)
+    if match:
+        return f"WITH{match.group(1) or ''} {ctes}, {sql[match.end():]}"
+    return f"WITH {ctes} {sql}"
+
+def install_guard_views(conn):
+    """
+    Creates the temporary per-user views the scoping CTEs read, once per connection.
+
+    Each view returns the rows of one agent-visible table (or of the query behind
+    an agent-visible view) whose username is `guard_username()`, a function bound
+    to the current user for the duration of a guarded query. Reads of `main`
+    tables are only authorized from inside these views.
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM temp.sqlite_master WHERE type = 'view'")}
+    missing = [table for table in SCOPED_TABLES if GUARD_VIEW_PREFIX + table not in existing]
+    if not missing:
+        return
+    definitions = dict(conn.execute("SELECT name, sql FROM main.sqlite_master WHERE type = 'view'").fetchall())
+    conn.create_function("guard_username", 0, lambda: None, deterministic=True)
+    # Read connections are query_only, which also blocks temporary schema changes.
+    conn.execute("PRAGMA query_only = OFF")
+    try:
+        for table in missing:
+            # A view is inlined so that its reads of `main` happen inside the guard view.
+            source = (f"({_VIEW_BODY_PATTERN.sub('', definitions[table])})" if table in definitions
+                      else f"main.{table}")
+            conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS {GUARD_VIEW_PREFIX}{table} AS "
+                         f"SELECT * FROM {source} WHERE username = guard_username()")
+    finally:
+        conn.execute("PRAGMA query_only = ON")
+
+def _authorizer(action, arg1, arg2, db_name, source):
+    if action in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_READ:
+        # Reads of CTEs and subqueries have no database name; `main` may only be
+        # read from inside a guard view, and `temp` only holds the guard views.
+        if not db_name:
+            return sqlite3.SQLITE_OK
+        guarded = (source or "").startswith(GUARD_VIEW_PREFIX)
+        if (db_name == "main" and guarded) or (db_name == "temp" and (arg1 or "").startswith(GUARD_VIEW_PREFIX)):
+            return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+def _rejection(error: sqlite3.DatabaseError) -> SQLGuardError:
+    message = str(error)
+    if "interrupted" in message:
+        return SQLGuardError("timeout", "The query ran past its time limit; narrow the date range or aggregate in SQL.")
+    denied = "not authorized" in message or "prohibited" in message
+    return SQLGuardError("not_authorized" if denied else "invalid", f"The query could not be run: {message}")
+
+def plan_violations(conn, sql: str) -> list:
+    """Returns the EXPLAIN QUERY PLAN lines that scan a large table in full."""
+    violations = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        match = _SCAN_PATTERN.match(row[3])
+        if match and match.group(1) in LARGE_TABLES:
+            violations.append(row[3])
+    return violations
+
+# --- Execution ---
+
+def run_guarded_query(conn, sql: str, username: str, max_rows: int = SQL_GUARD_MAX_ROWS,
+                      timeout: float = SQL_GUARD_TIMEOUT) -> tuple:
+    """
+    Checks, scopes and runs an agent-generated query for a user.
+
+    Args:
+        conn: A read-only sqlite3 connection (see `database.read_connection`).
+        sql: The generated query.
+        username: The user whose rows the query may see.
+        max_rows: Rows returned at most; further rows are not fetched.
+        timeout: Seconds the statement may run before it is interrupted.
+
+    Returns:
+        A tuple of (column names, rows, truncated).
+
+    Raises:
+        SQLGuardError: If the query is rejected, not authorized, scans a large
+            table in full or runs past the deadline.
+    """
+    try:
+        statement = check_query(sql)
+        scoped = scope_query(statement, username)
+        if not mentions_username(statement):
+            _count("rewritten")
+            log_event({"event": "sql_guard", "outcome": "rewritten", "username": username, "sql": statement})
+        columns, rows = _execute(conn, scoped, username, max_rows + 1, timeout)
+    except SQLGuardError as e:
+        _count(e.reason)
+        log_event({"event": "sql_guard", "outcome": e.reason, "username": username, "sql": sql, "detail": str(e)})
+        raise
+
+    truncated = len(rows) > max_rows
+    if truncated:
+        rows = rows[:max_rows]
+        _count("truncated")
+        log_event({"event": "sql_guard", "outcome": "truncated", "username": username, "rows": max_rows})
+    _count("allowed")
+    return columns, rows, truncated
+
+@contextmanager
+def guarded(conn, username: str, timeout: float = SQL_GUARD_TIMEOUT):
+    """
+    Binds a read connection to a user for one guarded query.
+
+    Installs the guard views, points `guard_username()` at the user and sets the
+    authorizer and deadline; all of it is undone on exit.
+    """
+    install_guard_views(conn)
+    deadline = monotonic() + timeout
+    conn.create_function("guard_username", 0, lambda: username, deterministic=True)
+    conn.set_authorizer(_authorizer)
+    conn.set_progress_handler(lambda: monotonic() > deadline, SQL_GUARD_PROGRESS_STEPS)
+    try:
+        yield conn
+    finally:
+        conn.set_progress_handler(None, 0)
+        conn.set_authorizer(None)
+        conn.create_function("guard_username", 0, lambda: None, deterministic=True)
+
+def _execute(conn, scoped: str, username: str, limit: int, timeout: float) -> tuple:
+    try:
+        with guarded(conn, username, timeout):
+            violations = plan_violations(conn, scoped)
+            if violations:
+                raise SQLGuardError("full_scan", "The query would scan a whole table "
+                                    f"({'; '.join(violations)}); filter on an indexed column such as Date.")
+            cursor = conn.execute(scoped)
+            rows = cursor.fetchmany(limit)
+            columns = [d[0] for d in cursor.description or []]
+            cursor.close()
+            return columns, rows
+    except sqlite3.DatabaseError as e:
+        raise _rejection(e) from None
+
+def _count(outcome: str):
+    REGISTRY.increment("sql_guard_queries_total", outcome=outcome)
+
+class GuardedSQLDatabase(SQLDatabase):
+    """
+    A `SQLDatabase` whose `run` only executes guarded queries for one user.
+
+    Schema reflection (`get_table_info`, used by `sql_db_schema`) is unchanged.
+    Rejections are returned to the agent as "Error: ..." strings by
+    `run_no_throw`, so it can correct the query.
+    """
+
+    def __init__(self, engine, username: str, db_path: str | None = None,
+                 max_rows: int = SQL_GUARD_MAX_ROWS, timeout: float = SQL_GUARD_TIMEOUT, **kwargs):
+        super().__init__(engine, **kwargs)
+        self.username = username
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.timeout = timeout
+
+    def run(self, command, fetch="all", include_columns=False, *, parameters=None, execution_options=None):
+        if not isinstance(command, str) or fetch == "cursor" or parameters:
+            raise SQLGuardError("unsupported", "Only plain SQL text can be run.")
+        started = perf_counter()
+        error = None
+        try:
+            with read_connection(self.db_path) as conn:
+                columns, rows, truncated = run_guarded_query(conn, command, self.username,
+                                                             self.max_rows, self.timeout)
+        except SQLGuardError as e:
+            error = e.reason
+            raise
+        finally:
+            record_span("sql", "guarded_query", (perf_counter() - started) * 1000, error=error)
+
+        if fetch == "one":
+            rows = rows[:1]
+        rows = [tuple(truncate_word(v, length=self._max_string_length) for v in row) for row in rows]
+        result = [dict(zip(columns, row)) for row in rows] if include_columns else rows
+        if not result:
+            return ""
+        text = str(result)
+        if truncated:
+            text += (f"\n(Only the first {self.max_rows} rows are shown; add filters, aggregate "
+                     "with GROUP BY or use LIMIT.)")
+        return text
+
+    def run_no_throw(self, command, fetch="all", include_columns=False, *, parameters=None,
+                     execution_options=None):
+        try:
+            return self.run(command, fetch, include_columns, parameters=parameters,
+                            execution_options=execution_options)
+        except (SQLGuardError, sqlite3.Error) as e:
+            return f"Error: {e}"
@@ -0,0 +1,112 @@
+"""
+Streaming of agent progress and answers for the AI Finance Agent chat UI.
+
+`AgentStreamHandler` is a LangChain callback handler that turns agent events
+into two UI-agnostic callbacks:
+1. `on_status(text)` for intermediate progress (which tool is running, the SQL
+   being executed, when a tool finishes).
+2. `on_text(text)` with the answer text accumulated so far, called as LLM tokens
+   arrive, or once with the whole answer for routed and cached answers
+   (`emit_answer`, called by `app_logic.answer_question`).
+
+`time_to_first_output` is recorded by the app as a `stream.first_output` span.
+
+Each new LLM call starts a fresh answer buffer, so text from intermediate
+reasoning steps is replaced by the final answer as it streams in. Tool events
+may arrive from several threads at once when the executor runs a step's tool
+calls concurrently (see `agent_budget.py`).
+"""
+
+import threading
+from time import monotonic
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# --- Configuration Constants ---
+STATUS_INPUT_MAX_CHARS = 300
+TOOL_LABELS = {
+    "sql_db_query": "Running SQL",
+    "sql_db_schema": "Reading table schema",
+    "create_user_spending_pie_chart": "Building spending chart",
+    "create_monthly_spending_chart": "Building monthly trend chart",
+    "create_portfolio_allocation_chart": "Building portfolio chart",
+}
+
+def _noop(_text: str):
+    pass
+
+class AgentStreamHandler(BaseCallbackHandler):
+    """
+    Forwards agent progress and answer tokens to UI callbacks.
+
+    Args:
+        on_status: Called with a short progress message when a tool starts or ends.
+        on_text: Called with the full answer text streamed so far.
+    """
+
+    def __init__(self, on_status=_noop, on_text=_noop):
+        self.on_status = on_status
+        self.on_text = on_text
+        self.text = ""
+        self.started = monotonic()
+        self.first_output_at = None
+        self.tool_calls = 0
+        self._steps = {}  # Tool run id -> step number
+        self._lock = threading.Lock()
+
+    def _mark_output(self):
+        if self.first_output_at is None:
+            self.first_output_at = monotonic()
+
+    @property
+    def time_to_first_output(self) -> float | None:
+        """Seconds from creating the handler to the first visible status or token."""
+        return None if self.first_output_at is None else self.first_output_at - self.started
+
+    # --- LLM Events ---
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.text = ""
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.text = ""
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if not token:
+            return
+        self._mark_output()
+        self.text += token
+        self.on_text(self.text)
+
+    # --- Tool Events ---
+
+    def _end_step(self, run_id) -> int:
+        with self._lock:
+            return self._steps.pop(run_id, self.tool_calls)
+
+    def on_tool_start(self, serialized, input_str: str, **kwargs):
+        self._mark_output()
+        with self._lock:
+            self.tool_calls += 1
+            self._steps[kwargs.get("run_id")] = self.tool_calls
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        label = TOOL_LABELS.get(name, f"Calling {name}")
+        detail = str(input_str or "").strip()
+        if len(detail) > STATUS_INPUT_MAX_CHARS:
+            detail = detail[:STATUS_INPUT_MAX_CHARS] + "..."
+        if name == "sql_db_query" and detail:
+            self.on_status(f"{label}:\n```sql\n{detail}\n```")
+        else:
+            self.on_status(f"{label}...")
+
+    def on_tool_end(self, output, **kwargs):
+        self.on_status(f"Step {self._end_step(kwargs.get('run_id'))} finished, thinking...")
+
+    def on_tool_error(self, error, **kwargs):
+        self.on_status(f"Step {self._end_step(kwargs.get('run_id'))} failed: {error}")
+
+    def emit_answer(self, text: str):
+        """Shows a complete answer at once (e.g. a cached or routed answer)."""
+        self._mark_output()
+        self.text = text
+        self.on_text(text)
@@ -0,0 +1,134 @@
+"""
+Deterministic summary metrics for the AI Finance Agent.
+
+This module answers the fixed financial summary questions directly from the
+database with parameterized SQL. Totals, counts and top categories come from the
+daily rollups (see `rollups.py`), so they cost one row per day (and category)
+in the window; the largest transaction uses the `(username, Date)` index. The
+summary therefore:
+1. Renders in milliseconds and costs no LLM tokens.
+2. Returns the same numbers for the same data and day on every run.
+
+Questions that cannot be answered from the stored columns are left for the agent.
+"""
+
+from datetime import date, timedelta
+
+from rollups import last_activity_day, window_category_totals, window_totals
+
+# --- Constants ---
+SUMMARY_WINDOW_DAYS = 30
+SUMMARY_QUESTIONS = [
+    "What was my total spending in the last 30 days?",
+    "What were my top 3 spending categories in the last 30 days, by total amount spent in each category?",
+    "What was my largest single transaction in the last 30 days?",
+    "How many transactions did I make in the last 30 days?",
+]
+
+# --- Helper Functions ---
+
+def format_amount(value) -> str:
+    """Formats a monetary amount with two decimals and no thousands separators."""
+    return f"{value:.2f}"
+
+def format_minor(amount_minor: int) -> str:
+    """Formats an integer minor-unit amount (see schema.py) in major units."""
+    return format_amount(amount_minor / 100)
+
+def summary_window(conn, username: str, days: int = SUMMARY_WINDOW_DAYS, as_of: date | None = None):
+    """
+    Resolves the date window used by the summary metrics.
+
+    The window ends at `as_of` when given, otherwise today, matching the
+    `date('now', '-30 days')` reading of "last 30 days" that the agent and the
+    intent router use for the same questions. Pass `as_of` for reproducible results.
+
+    Args:
+        conn: An active sqlite3 connection object.
+        username: The username whose transactions are summarized.
+        days: The length of the window in days.
+        as_of: Optional last day of the window. Defaults to today.
+
+    Returns:
+        A (start, end) tuple of ISO date strings, where start is exclusive and end
+        is inclusive, or None if the user has no transactions at all.
+    """
+    if last_activity_day(conn, username) is None:
+        return None
+    as_of = as_of or date.today()
+    start = as_of - timedelta(days=days)
+    return start.isoformat(), as_of.isoformat()
+
+# --- Metrics ---
+
+def _total_spending(conn, username: str, start: str, end: str) -> str:
+    amount_minor, count = window_totals(conn, username, start, end)["Debit"]
+    return (f"You spent {format_minor(abs(amount_minor))} across {count} debit transactions "
+            f"between {start} and {end}.")
+
+def _top_categories(conn, username: str, start: str, end: str, limit: int = 3) -> str:
+    # Category is assigned at ingest (see categorization.py); uncategorized rows roll up as 'Other'.
+    rows = window_category_totals(conn, username, start, end)[:limit]
+    if not rows:
+        return f"No spending found between {start} and {end}."
+    ranked = "; ".join(f"{i}. {category}: {format_minor(abs(total))}" for i, (category, total) in enumerate(rows, 1))
+    return f"Top spending categories between {start} and {end}: {ranked}."
+
+def _largest_transaction(conn, username: str, start: str, end: str) -> str:
+    row = conn.execute(
+        """
+        SELECT Date, Description, AmountMinor, Type FROM bank_transactions
+        WHERE username = ? AND Date > ? AND Date <= ?
+        ORDER BY ABS(AmountMinor) DESC, Date, id
+        LIMIT 1
+        """,
+        (username, start, end),
+    ).fetchone()
+    if row is None:
+        return f"No transactions found between {start} and {end}."
+    day, description, amount_minor, txn_type = row
+    return f"{description} on {day}: {format_minor(abs(amount_minor))} ({txn_type})."
+
+def _transaction_count(conn, username: str, start: str, end: str) -> str:
+    totals = window_totals(conn, username, start, end)
+    debits, credits = totals["Debit"][1], totals["Credit"][1]
+    return (f"You made {debits + credits} transactions ({debits} debits, {credits} credits) "
+            f"between {start} and {end}.")
+
+# Maps each summary question to the function that answers it from SQL.
+# Questions missing here are answered by the agent.
+SUMMARY_METRICS = {
+    SUMMARY_QUESTIONS[0]: _total_spending,
+    SUMMARY_QUESTIONS[1]: _top_categories,
+    SUMMARY_QUESTIONS[2]: _largest_transaction,
+    SUMMARY_QUESTIONS[3]: _transaction_count,
+}
+
+# --- Core Function ---
+
+def answer_summary_questions(conn, username: str, questions: list,
+                             days: int = SUMMARY_WINDOW_DAYS, as_of: date | None = None) -> dict:
+    """
+    Answers the summary questions that can be computed directly from the database.
+
+    Args:
+        conn: An active sqlite3 connection object.
+        username: The username of the currently logged-in user.
+        questions: The questions to answer.
+        days: The length of the summary window in days.
+        as_of: Optional last day of the window. Defaults to today.
+
+    Returns:
+        A dictionary mapping each answerable question to its answer. Questions
+        without a SQL metric are omitted so the caller can fall back to the agent.
+    """
+    answerable = [q for q in questions if q in SUMMARY_METRICS]
+    if not answerable:
+        return {}
+
+    window = summary_window(conn, username, days, as_of)
+    if window is None:
+        return {q: "No transactions found." for q in answerable}
+
+    start, end = window
+    return {q: SUMMARY_METRICS[q](conn, username, start, end) for q in answerable}
@@ -0,0 +1,237 @@
+"""
+Background bank sync service for the AI Finance Agent.
+
+Bank syncing involves several slow Plaid round-trips, so it runs here instead
+of on the Streamlit script thread. The service:
+1. Accepts sync jobs per username/item and runs them on a bounded worker pool.
+2. Limits the number of concurrent Plaid API calls across all jobs.
+3. Polls a newly linked item for transactions with exponential backoff.
+4. Periodically refreshes every item stored in `plaid_items`.
+5. Tracks job status and progress so the UI can poll it without blocking.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import plaid_service
+from database import all_db_paths, read_connection
+
+# --- Configuration Constants ---
+SYNC_MAX_WORKERS = int(os.getenv("SYNC_MAX_WORKERS", "4"))
+SYNC_MAX_PLAID_CALLS = int(os.getenv("SYNC_MAX_PLAID_CALLS", "4"))
+SYNC_REFRESH_INTERVAL = float(os.getenv("SYNC_REFRESH_INTERVAL", "3600"))
+READINESS_INITIAL_DELAY = 1.0
+READINESS_MAX_DELAY = 16.0
+READINESS_TIMEOUT = 60.0
+MAX_JOB_HISTORY = 500
+
+# --- Job Model ---
+
+@dataclass
+class SyncJob:
+    """Status of a single sync job, as shown to the user."""
+    job_id: str
+    username: str
+    kind: str  # "link" for a new bank connection, "refresh" for an existing item
+    item_id: str | None = None
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    progress: float = 0.0
+    message: str = "Waiting for a free sync worker..."
+    counts: dict = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+# --- Sync Service ---
+
+class SyncService:
+    """
+    Runs Plaid link and sync jobs in the background.
+
+    Args:
+        api: Optional PlaidApi-compatible client (e.g. `fake_plaid.FakePlaidApi`).
+        max_workers: Number of jobs that may run at the same time.
+        max_plaid_calls: Number of Plaid API calls that may be in flight at once.
+    """
+
+    def __init__(self, api=None, max_workers: int = SYNC_MAX_WORKERS,
+                 max_plaid_calls: int = SYNC_MAX_PLAID_CALLS,
+                 readiness_timeout: float = READINESS_TIMEOUT,
+                 readiness_initial_delay: float = READINESS_INITIAL_DELAY):
+        self.api = api
+        self.readiness_timeout = readiness_timeout
+        self.readiness_initial_delay = readiness_initial_delay
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plaid-sync")
+        self._plaid_calls = threading.BoundedSemaphore(max_plaid_calls)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active_items = {}
+        self._stop = threading.Event()
+        self._scheduler = None
+
+    # --- Job Bookkeeping ---
+
+    def _new_job(self, username: str, kind: str, item_id: str | None = None) -> SyncJob:
+        """Registers a new job. The caller must hold `self._lock`."""
+        job = SyncJob(job_id=uuid.uuid4().hex, username=username, kind=kind, item_id=item_id)
+        self._jobs[job.job_id] = job
+        finished = [j for j in self._jobs.values() if j.done]
+        for old in sorted(finished, key=lambda j: j.created_at)[:max(0, len(self._jobs) - MAX_JOB_HISTORY)]:
+            del self._jobs[old.job_id]
+        return job
+
+    def _update(self, job: SyncJob, **changes):
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            if job.done:
+                job.finished_at = time.time()
+                if job.item_id and self._active_items.get((job.username, job.item_id)) == job.job_id:
+                    del self._active_items[(job.username, job.item_id)]
+
+    def get_job(self, job_id: str) -> SyncJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, username: str) -> list:
+        with self._lock:
+            return sorted((j for j in self._jobs.values() if j.username == username),
+                          key=lambda j: j.created_at, reverse=True)
+
+    def _plaid(self, func, *args, **kwargs):
+        """Calls a plaid_service function while holding one of the Plaid call slots."""
+        with self._plaid_calls:
+            return func(*args, api=self.api, **kwargs)
+
+    # --- Job Submission ---
+
+    def submit_link(self, username: str) -> str:
+        """Queues a job that links a sandbox bank account and syncs its transactions."""
+        with self._lock:
+            job = self._new_job(username, "link")
+        self._pool.submit(self._run, job, self._link_and_sync)
+        return job.job_id
+
+    def submit_item_sync(self, username: str, access_token: str, item_id: str) -> str:
+        """
+        Queues an incremental sync for an existing item. If that item already has
+        a queued or running job, its id is returned instead of starting another.
+        """
+        with self._lock:
+            active = self._active_items.get((username, item_id))
+            if active is not None:
+                return active
+            job = self._new_job(username, "refresh", item_id)
+            self._active_items[(username, item_id)] = job.job_id
+        self._pool.submit(self._run, job, self._sync_item, access_token)
+        return job.job_id
+
+    def refresh_all(self) -> list:
+        """Queues an incremental sync for every linked item, across all shards, and returns the job ids."""
+        items = []
+        for db_path in all_db_paths():
+            with read_connection(db_path) as conn:
+                items += conn.execute("SELECT username, access_token, item_id FROM plaid_items").fetchall()
+        return [self.submit_item_sync(username, token, item_id) for username, token, item_id in items]
+
+    # --- Job Execution ---
+
+    def _run(self, job: SyncJob, step, *args):
+        self._update(job, status="running", message="Starting sync...")
+        try:
+            step(job, *args)
+        except Exception as e:
+            self._update(job, status="failed", message=f"Sync failed: {e}")
+
+    def _link_and_sync(self, job: SyncJob):
+        self._update(job, progress=0.1, message="Connecting to bank...")
+        public_token = self._plaid(plaid_service.create_sandbox_public_token)
+        if not public_token:
+            self._update(job, status="failed", message="Could not create public token. Check Plaid credentials.")
+            return
+
+        access_token, item_id = self._plaid(plaid_service.exchange_public_token, public_token)
+        if not access_token:
+            self._update(job, status="failed", message="Failed to exchange public token.")
+            return
+
+        plaid_service.save_credentials_to_db(job.username, access_token, item_id)
+        with self._lock:
+            job.item_id = item_id
+            self._active_items[(job.username, item_id)] = job.job_id
+        self._update(job, progress=0.3, message="Connection successful. Waiting for transactions...")
+        self._wait_and_sync(job, access_token)
+
+    def _sync_item(self, job: SyncJob, access_token: str):
+        self._update(job, progress=0.2, message="Fetching new transactions...")
+        counts = self._plaid(plaid_service.sync_transactions, job.username, access_token, job.item_id)
+        if counts is None:
+            self._update(job, status="failed", message="Failed to sync transactions from the bank.")
+            return
+        self._finish(job, counts)
+
+    def _wait_and_sync(self, job: SyncJob, access_token: str):
+        """
+        Syncs a newly linked item, retrying with exponential backoff until Plaid
+        has prepared its transactions or the readiness timeout expires. The stored
+        cursor makes each retry incremental. The job fails if no attempt succeeded.
+        """
+        deadline = time.monotonic() + self.readiness_timeout
+        delay = self.readiness_initial_delay
+        totals = {"added": 0, "modified": 0, "removed": 0}
+        attempts, synced = 0, False
+        while True:
+            attempts += 1
+            counts = self._plaid(plaid_service.sync_transactions, job.username, access_token, job.item_id)
+            if counts is not None:
+                synced = True
+                totals = {k: totals[k] + counts[k] for k in totals}
+                if totals["added"]:
+                    break
+            if time.monotonic() + delay > deadline or self._stop.is_set():
+                break
+            self._update(job, message=f"Bank is preparing transactions, retrying in {delay:.0f}s...")
+            self._stop.wait(delay)
+            delay = min(delay * 2, READINESS_MAX_DELAY)
+        if not synced:
+            noun = "attempt" if attempts == 1 else "attempts"
+            self._update(job, status="failed",
+                         message=f"Failed to sync transactions from the bank ({attempts} {noun}).")
+            return
+        self._finish(job, totals)
+
+    def _finish(self, job: SyncJob, counts: dict):
+        if counts["added"]:
+            message = f"Successfully synced {counts['added']} new transactions!"
+        else:
+            message = "Connection successful, no new transactions found."
+        self._update(job, status="succeeded", progress=1.0, counts=counts, message=message)
+
+    # --- Scheduler ---
+
+    def start_scheduler(self, interval: float = SYNC_REFRESH_INTERVAL):
+        """Starts a daemon thread that refreshes all linked items every `interval` seconds."""
+        if self._scheduler is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh_all()
+                except Exception as e:
+                    print(f"Scheduled bank refresh failed: {e}")
+
+        self._scheduler = threading.Thread(target=loop, name="plaid-sync-scheduler", daemon=True)
+        self._scheduler.start()
+
+    def shutdown(self, wait: bool = True):
+        """Stops the scheduler and the worker pool."""
+        self._stop.set()
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,178 @@
+"""
+Synthetic data generator for the AI Finance Agent.
+
+Produces realistic multi-user datasets for load testing and benchmarks:
+1. `bank_transactions`: a monthly salary and rent per user plus day-to-day
+   spending drawn from a merchant catalog with typical amounts and frequencies,
+   categorized the same way as real imports.
+2. `stock_portfolio`: a handful of holdings per user from a ticker catalog.
+3. `mutual_funds`: a few funds per user from a fund catalog.
+
+Generation is deterministic for a given seed and streams rows in batches, so
+millions of transactions can be written without holding them in memory.
+
+To run, execute `python synthetic_data.py --db synthetic.db --users 1000 --transactions 1000`.
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+from itertools import islice
+from time import perf_counter
+
+from categorization import categorize
+from database import bump_data_version, user_db_path, write_transaction
+
+# --- Configuration Constants ---
+DEFAULT_USERS = 100
+DEFAULT_TRANSACTIONS_PER_USER = 500
+DEFAULT_START_DATE = date(2023, 1, 1)
+DEFAULT_DAYS = 730
+BATCH_SIZE = 5000
+
+# (description, typical amount, relative frequency)
+MERCHANTS = [
+    ("Zomato Order", 450, 10), ("Swiggy Instamart", 900, 8), ("Uber Ride", 300, 8),
+    ("Amazon Purchase", 1800, 6), ("Flipkart Order", 2200, 4), ("BigBasket", 1600, 5),
+    ("Starbucks", 350, 5), ("Movie Tickets", 700, 2), ("Electricity Bill", 2500, 1),
+    ("Mobile Recharge", 599, 1), ("Petrol Pump", 2000, 4), ("Pharmacy", 650, 2),
+    ("Credit Card Payment", 8000, 1), ("Gym Membership", 1500, 1), ("Netflix", 649, 1),
+    ("Mutual Fund SIP", 10000, 1), ("Zerodha Funds Transfer", 15000, 1), ("Restaurant", 1800, 3),
+]
+STOCKS = [
+    ("RELIANCE", "Reliance Industries Ltd", 2800), ("HDFCBANK", "HDFC Bank Ltd", 1600),
+    ("INFY", "Infosys Ltd", 1500), ("TATAMOTORS", "Tata Motors Ltd", 950),
+    ("ICICIBANK", "ICICI Bank Ltd", 1100), ("TCS", "Tata Consultancy Services Ltd", 3900),
+    ("ITC", "ITC Ltd", 450), ("SBIN", "State Bank of India", 800),
+    ("BHARTIARTL", "Bharti Airtel Ltd", 1400), ("LT", "Larsen & Toubro Ltd", 3500),
+]
+FUNDS = [
+    ("Parag Parikh Flexi Cap Fund", "Flexi Cap"), ("UTI Nifty 50 Index Fund", "Index Fund"),
+    ("Axis Small Cap Fund", "Small Cap"), ("ICICI Prudential Bluechip Fund", "Large Cap"),
+    ("Mirae Asset Emerging Bluechip Fund", "Large & Mid Cap"), ("SBI Contra Fund", "Contra"),
+    ("HDFC Balanced Advantage Fund", "Hybrid"),
+]
+
+# --- Generators ---
+
+def username_for(index: int) -> str:
+    return f"user{index:05d}"
+
+def generate_bank_transactions(username: str, count: int, rng: random.Random,
+                               start: date = DEFAULT_START_DATE, days: int = DEFAULT_DAYS):
+    """
+    Yields `bank_transactions` rows (Date, Description, AmountMinor, Type, username).
+
+    Roughly one salary credit and one rent debit are generated per month of the
+    range; the rest are merchant debits spread uniformly over the range.
+    """
+    months = max(1, days // 30)
+    salary = rng.randrange(40000, 200000, 1000)
+    rent = round(salary * rng.uniform(0.15, 0.35), -2)
+    fixed = min(count, 2 * months)
+
+    for month in range(fixed // 2):
+        day = start + timedelta(days=month * 30)
+        yield (day.isoformat(), "Salary Credit", salary * 100, "Credit", username)
+        yield ((day + timedelta(days=4)).isoformat(), "Rent Payment", -int(rent * 100), "Debit", username)
+
+    names = [m[0] for m in MERCHANTS]
+    typical = {m[0]: m[1] for m in MERCHANTS}
+    weights = [m[2] for m in MERCHANTS]
+    for _ in range(count - fixed // 2 * 2):
+        name = rng.choices(names, weights)[0]
+        amount = typical[name] * rng.uniform(0.4, 1.8)
+        day = start + timedelta(days=rng.randrange(days))
+        yield (day.isoformat(), name, -int(round(amount * 100)), "Debit", username)
+
+def generate_stock_portfolio(username: str, rng: random.Random) -> list:
+    """Returns `stock_portfolio` rows for a user."""
+    rows = []
+    for ticker, company, price in rng.sample(STOCKS, rng.randint(2, 6)):
+        purchase = round(price * rng.uniform(0.7, 1.1), 2)
+        current = round(price * rng.uniform(0.8, 1.4), 2)
+        rows.append((ticker, company, float(rng.randint(1, 100)), purchase, current, username))
+    return rows
+
+def generate_mutual_funds(username: str, rng: random.Random) -> list:
+    """Returns `mutual_funds` rows for a user."""
+    rows = []
+    for fund, category in rng.sample(FUNDS, rng.randint(1, 4)):
+        invested = float(rng.randrange(10000, 200000, 5000))
+        rows.append((fund, category, invested, round(invested * rng.uniform(0.85, 1.5), 2), username))
+    return rows
+
+# --- Loader ---
+
+def populate_synthetic(db_path: str | None = None, users: int = DEFAULT_USERS,
+                       transactions_per_user: int = DEFAULT_TRANSACTIONS_PER_USER, seed: int = 0,
+                       first_user: int = 0, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Writes a synthetic dataset into the database, replacing the generated users' rows.
+
+    Args:
+        db_path: Target database; defaults to each generated user's shard.
+        users: Number of users to generate.
+        transactions_per_user: Bank transactions generated per user.
+        seed: Seed for the random generator, so datasets are reproducible.
+        first_user: Index of the first generated user (see `username_for`).
+        batch_size: Rows written per transaction.
+
+    Returns:
+        A dictionary with the row counts, elapsed seconds and rows per second.
+    """
+    rng = random.Random(seed)
+    counts = {"bank_transactions": 0, "stock_portfolio": 0, "mutual_funds": 0}
+    started = perf_counter()
+    for index in range(first_user, first_user + users):
+        username = username_for(index)
+        target = db_path or user_db_path(username)  # Opening a file migrates it (see database.py).
+        with write_transaction(target) as conn:
+            for table in counts:
+                conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+            stocks = generate_stock_portfolio(username, rng)
+            funds = generate_mutual_funds(username, rng)
+            conn.executemany(
+                "INSERT INTO stock_portfolio (Ticker, CompanyName, Quantity, PurchasePrice, CurrentPrice, username) "
+                "VALUES (?, ?, ?, ?, ?, ?)", stocks)
+            conn.executemany(
+                "INSERT INTO mutual_funds (FundName, Category, InvestedAmount, CurrentValue, username) "
+                "VALUES (?, ?, ?, ?, ?)", funds)
+            counts["stock_portfolio"] += len(stocks)
+            counts["mutual_funds"] += len(funds)
+
+        rows = generate_bank_transactions(username, transactions_per_user, rng)
+        while batch := list(islice(rows, batch_size)):
+            merchants, categories = categorize([row[1] for row in batch], [row[3] for row in batch])
+            with write_transaction(target) as conn:
+                conn.executemany(
+                    "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username, Merchant, Category) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(*row, merchant, category) for row, merchant, category in zip(batch, merchants, categories)])
+            counts["bank_transactions"] += len(batch)
+
+        with write_transaction(target) as conn:
+            bump_data_version(conn, username)
+
+    elapsed = perf_counter() - started
+    total = sum(counts.values())
+    return {**counts, "users": users, "elapsed_s": round(elapsed, 3),
+            "rows_per_second": round(total / elapsed, 1) if elapsed else 0.0}
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic multi-user finance dataset.")
+    parser.add_argument("--db", default=None, help="Target database (default: each user's shard).")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--transactions", type=int, default=DEFAULT_TRANSACTIONS_PER_USER,
+                        help="Bank transactions per user.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Generating {args.users} users with {args.transactions} transactions each...")
+    result = populate_synthetic(args.db, args.users, args.transactions, args.seed)
+    print(f"Wrote {result['bank_transactions']} transactions, {result['stock_portfolio']} holdings and "
+          f"{result['mutual_funds']} funds in {result['elapsed_s']}s ({result['rows_per_second']} rows/s).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.agents import create_openai_tools_agent
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import Tool
+
+from agent_budget import BudgetedAgentExecutor, best_effort_answer
+from instrumentation import REGISTRY
+from streaming import AgentStreamHandler
+
+USAGE = {"input_tokens": 90, "output_tokens": 10, "total_tokens": 100}
+
+
+class ScriptedModel(GenericFakeChatModel):
+    """Returns scripted messages (tool calls included, so no streaming) and ignores tool bindings."""
+
+    _stream = BaseChatModel._stream
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def _tool_call(*names):
+    return AIMessage(content="", usage_metadata=USAGE, tool_calls=[
+        {"name": name, "id": f"call-{i}", "args": {"__arg1": ""}} for i, name in enumerate(names)
+    ])
+
+
+def _executor(messages, **kwargs):
+    def slow(name):
+        def run(tool_input: str = ""):
+            time.sleep(0.3)
+            return f"{name} result"
+        return run
+
+    tools = [Tool(name=name, func=slow(name), description=f"Returns the {name}.") for name in ("balance", "spending")]
+    prompt = ChatPromptTemplate.from_messages([
+        ("human", "{input}"), MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+    agent = create_openai_tools_agent(ScriptedModel(messages=iter(messages)), tools, prompt)
+    return BudgetedAgentExecutor(agent=agent, tools=tools, return_intermediate_steps=True, **kwargs)
+
+
+def test_tool_calls_in_one_step_run_concurrently():
+    executor = _executor([_tool_call("balance", "spending"), AIMessage(content="Done.", usage_metadata=USAGE)],
+                         tool_concurrency=4)
+    started = time.perf_counter()
+    result = executor.invoke({"input": "How am I doing?"})
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.55  # Two 0.3 s tools in parallel
+    assert [obs for _, obs in result["intermediate_steps"]] == ["balance result", "spending result"]
+    budget = result["budget"]
+    assert result["output"] == "Done." and budget["exceeded"] is None
+    assert budget["iterations"] == 2 and budget["tokens"] == 200
+    assert budget["steps"][0]["tools"] == ["balance", "spending"] and budget["steps"][0]["ms"] >= 300
+
+
+def test_stream_handler_updates_keep_the_streamlit_context(monkeypatch):
+    """Tool callbacks on worker threads carry the caller's ScriptRunContext."""
+    pytest.importorskip("streamlit")
+    import streamlit.runtime.scriptrunner as scriptrunner
+    from streamlit.runtime.scriptrunner_utils.script_run_context import get_script_run_ctx
+
+    ctx = SimpleNamespace(pages_manager=SimpleNamespace(main_script_hash="main"))
+    monkeypatch.setattr(scriptrunner, "get_script_run_ctx", lambda suppress_warning=False: ctx)
+    statuses = []
+    handler = AgentStreamHandler(on_status=lambda text: statuses.append(
+        (text, threading.current_thread() is threading.main_thread() or get_script_run_ctx(True) is ctx)))
+    executor = _executor([_tool_call("balance", "spending"), AIMessage(content="Done.", usage_metadata=USAGE)],
+                         tool_concurrency=4)
+    executor.invoke({"input": "How am I doing?"}, config={"callbacks": [handler]})
+
+    assert handler.tool_calls == 2
+    assert sorted(text for text, _ in statuses) == [
+        "Calling balance...", "Calling spending...", "Step 1 finished, thinking...", "Step 2 finished, thinking...",
+    ]
+    assert all(attached for _, attached in statuses)
+
+
+@pytest.mark.parametrize("limits, exceeded, steps", [
+    ({"max_iterations": 2}, "iterations", 2),
+    ({"max_tokens": 150}, "tokens", 2),
+])
+def test_budgets_stop_with_a_best_effort_answer(limits, exceeded, steps):
+    REGISTRY.reset()
+    executor = _executor([_tool_call("balance")] * 5, max_execution_time=None, **limits)
+    result = executor.invoke({"input": "Loop forever"})
+
+    assert result["budget"]["exceeded"] == exceeded and result["budget"]["iterations"] == steps
+    assert result["output"].startswith("I reached the")
+    assert result["output"].endswith("balance result")
+    assert REGISTRY.counters()[f"agent_budget_exceeded_total[budget={exceeded}]"] == 1
+
+
+def test_best_effort_answer_without_results():
+    assert "could not find an answer within the time limit" in best_effort_answer("time", [])
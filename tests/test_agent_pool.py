@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from agent_pool import AgentPool
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_reuses_entries_and_evicts_least_recently_used():
+    pool = AgentPool(max_size=2, idle_ttl=60)
+    builds = []
+
+    def factory(key):
+        return lambda: builds.append(key) or key
+
+    pool.acquire("a", factory("a"))
+    pool.acquire("b", factory("b"))
+    pool.acquire("a", factory("a"))
+    pool.acquire("c", factory("c"))  # evicts "b", the least recently used
+    pool.acquire("a", factory("a"))
+    pool.acquire("b", factory("b"))
+
+    assert builds == ["a", "b", "c", "b"]
+    stats = pool.stats()
+    assert stats["size"] == 2 and stats["hits"] == 2 and stats["evictions"] == 2
+
+def test_evicts_idle_entries():
+    clock = FakeClock()
+    pool = AgentPool(max_size=10, idle_ttl=30, clock=clock)
+    pool.acquire("a", lambda: "a")
+
+    clock.now = 31
+    assert pool.stats()["size"] == 0
+
+def test_concurrent_misses_build_once():
+    pool = AgentPool()
+    builds = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        pool.acquire("jsmith", lambda: builds.append(1) or object())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(builds) == 1
+
+def test_session_memory_stays_bounded():
+    """Long chats keep a fixed-size history in memory."""
+    pytest.importorskip("langchain")
+    app_logic = pytest.importorskip("app_logic")
+
+    memory = app_logic.create_session_memory()
+    for i in range(200):
+        memory.save_context({"input": f"question {i}"}, {"output": "x" * 2000})
+
+    messages = memory.chat_memory.messages
+    assert len(messages) <= 2 * app_logic.AGENT_MEMORY_WINDOW
+    assert sum(len(m.content) for m in messages) // 4 <= app_logic.AGENT_MEMORY_TOKEN_LIMIT
+    assert messages[-1].content == "x" * 2000
@@ -0,0 +1,56 @@
+import pytest
+
+import database
+from answer_cache import AnswerCache, normalize_question
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "finance.db")
+
+def _bump(db_path, username="jsmith"):
+    with database.write_transaction(db_path) as conn:
+        database.bump_data_version(conn, username)
+
+def test_questions_are_normalized():
+    assert normalize_question("  How many  Mutual Funds do I own? ") == "how many mutual funds do i own"
+
+def test_hits_after_store_and_misses_after_data_change(db_path):
+    """An answer is served until the user's data version changes."""
+    cache = AnswerCache(db_path=db_path)
+    answer, key = cache.lookup("jsmith", "How many funds?")
+    assert answer is None
+    cache.store(key, "jsmith", "How many funds?", "4")
+
+    assert cache.lookup("jsmith", "how many funds")[0] == "4"
+    assert cache.lookup("rbriggs", "How many funds?")[0] is None
+
+    _bump(db_path)
+    assert cache.lookup("jsmith", "How many funds?")[0] is None
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1 and stats["misses"] == 3
+
+def test_database_tier_survives_a_new_process(db_path):
+    """A fresh cache instance finds answers stored by another one."""
+    first = AnswerCache(db_path=db_path)
+    first.store(first.lookup("jsmith", "Total spend?")[1], "jsmith", "Total spend?", "649.00")
+
+    second = AnswerCache(db_path=db_path)
+    assert second.lookup("jsmith", "Total spend?")[0] == "649.00"
+    assert second.stats()["db_hits"] == 1
+
+def test_ttl_and_bypass(db_path):
+    """Expired answers are not served, and bypassed lookups never touch the cache."""
+    cache = AnswerCache(db_path=db_path, ttl=-1)
+    cache.store(cache.lookup("jsmith", "q")[1], "jsmith", "q", "a")
+    assert cache.lookup("jsmith", "q")[0] is None
+
+    cache = AnswerCache(db_path=db_path)
+    assert cache.lookup("jsmith", "q", bypass=True) == (None, None)
+    assert cache.stats()["bypassed"] == 1
+
+def test_memory_tier_is_bounded(db_path):
+    cache = AnswerCache(db_path=db_path, memory_entries=2)
+    for i in range(5):
+        cache.store(cache.lookup("jsmith", f"q{i}")[1], "jsmith", f"q{i}", str(i))
+    assert cache.stats()["memory_entries"] == 2
@@ -0,0 +1,125 @@
+import threading
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip("langchain")
+
+import api_server
+import app_logic
+import database
+from api_client import ApiBusyError, ApiClient, ApiError
+from api_server import AdmissionError, AgentService, WorkerPool, create_server, start_server
+from database import write_transaction
+from schema import migrate
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """Serves the API on a free port with the offline chat model."""
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    monkeypatch.setattr(app_logic, "AGENT_FAKE_LLM", True)
+    today = date.today()  # The summary covers the last 30 days up to today.
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) VALUES (?, ?, ?, ?, ?)",
+            [((today - timedelta(days=5)).isoformat(), "Zomato Order", -35000, "Debit", "jsmith"),
+             ((today - timedelta(days=2)).isoformat(), "Rent Payment", -2000000, "Debit", "jsmith")],
+        )
+    app_logic.AGENT_POOL.invalidate()
+    service = AgentService(WorkerPool(max_workers=2, max_queue=2, per_user=1), timeout=30)
+    server = start_server("127.0.0.1", 0, service)
+    yield service, ApiClient(f"http://127.0.0.1:{server.server_address[1]}")
+    server.shutdown()
+    server.server_close()
+    service.pool.shutdown()
+    app_logic.AGENT_POOL.invalidate()
+
+
+def test_pool_applies_queue_and_per_user_limits():
+    """Requests beyond a user's share get 429; beyond the queue, 503."""
+    pool = WorkerPool(max_workers=1, max_queue=2, per_user=1)
+    release = threading.Event()
+    first = pool.submit("a", release.wait)
+    try:
+        with pytest.raises(AdmissionError) as excinfo:
+            pool.submit("a", release.wait)
+        assert excinfo.value.status == 429
+        second = pool.submit("b", release.wait)
+        with pytest.raises(AdmissionError) as excinfo:
+            pool.submit("c", release.wait)
+        assert excinfo.value.status == 503
+        assert pool.stats()["waiting"] == 1
+    finally:
+        release.set()
+    first.result(timeout=5)
+    second.result(timeout=5)
+    assert pool.submit("a", lambda: "ok").result(timeout=5) == "ok"
+    pool.shutdown()
+
+
+def test_chat_chart_and_summary_over_http(api):
+    """The endpoints serve the agent, charts and summaries with the fake model."""
+    _, client = api
+    assert client.health()["fake_llm"] is True
+
+    answer = client.chat("jsmith", "Tell me a joke about budgets", session_id="s1")
+    assert answer["output"] == "This is a placeholder answer from the offline model."
+
+    spec = client.chart_spec("jsmith", "spending_breakdown")
+    assert spec["data"][0]["type"] == "pie"
+    assert "20000.00" in client.summary("jsmith")
+
+    with pytest.raises(ApiError) as excinfo:
+        client.chart_spec("jsmith", "no_such_chart")
+    assert excinfo.value.status == 400
+
+
+def test_busy_user_gets_429_with_retry_after(api):
+    service, client = api
+    release = threading.Event()
+    blocked = service.pool.submit("jsmith", release.wait)
+    try:
+        with pytest.raises(ApiBusyError) as excinfo:
+            client.chat("jsmith", "hello")
+        assert excinfo.value.status == 429 and excinfo.value.retry_after >= 1
+    finally:
+        release.set()
+        blocked.result(timeout=5)
+
+
+def test_public_host_requires_an_api_key(monkeypatch):
+    """Clients name their own user, so the API is only exposed beyond loopback with a key."""
+    service = AgentService(WorkerPool(max_workers=1, max_queue=1, per_user=1))
+    monkeypatch.setattr(api_server, "API_KEY", "")
+    with pytest.raises(ValueError, match="API_KEY"):
+        create_server("0.0.0.0", 0, service)
+
+    monkeypatch.setattr(api_server, "API_KEY", "secret")
+    server = create_server("0.0.0.0", 0, service)
+    server.server_close()
+    service.pool.shutdown()
+
+
+def test_metrics_require_the_api_key(monkeypatch):
+    """Per-user latencies and error rates are only readable with the key."""
+    monkeypatch.setattr(api_server, "API_KEY", "secret")
+    service = AgentService(WorkerPool(max_workers=1, max_queue=1, per_user=1))
+    server = start_server("127.0.0.1", 0, service)
+    url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+    try:
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(url, timeout=5)
+        assert excinfo.value.code == 401
+
+        request = urllib.request.Request(url, headers={"Authorization": "Bearer secret"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            assert response.status == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.pool.shutdown()
@@ -0,0 +1,152 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("langchain")
+
+import app_logic
+import database
+from answer_cache import AnswerCache
+from database import bump_data_version, write_transaction
+from schema import migrate
+from streaming import AgentStreamHandler
+from summary_engine import SUMMARY_QUESTIONS
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    monkeypatch.setattr(app_logic, "AGENT_FAKE_LLM", True)
+    monkeypatch.setattr(app_logic, "AGENT_POOL", app_logic.AgentPool())
+    cache = AnswerCache()
+    monkeypatch.setattr(app_logic, "get_answer_cache", lambda: cache)
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.execute("INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) "
+                     "VALUES ('2025-07-02', 'Zomato Order', -35000, 'Debit', 'jsmith')")
+    return path
+
+
+def _system_prompt(executor) -> str:
+    return executor.agent.runnable.get_prompts()[0].messages[0].prompt.template
+
+
+def test_pooled_agent_keeps_its_tools_when_the_data_changes(db):
+    """A write rebuilds the prompt on the pooled tools instead of adding a new pool entry."""
+    first = app_logic.setup_agent("jsmith", "John")
+    assert "1 rows for this user" in _system_prompt(first)
+
+    with write_transaction() as conn:
+        conn.execute("INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) "
+                     "VALUES ('2025-07-03', 'Uber Ride', -12000, 'Debit', 'jsmith')")
+        bump_data_version(conn, "jsmith")
+    second = app_logic.setup_agent("jsmith", "John")
+
+    assert "2 rows for this user" in _system_prompt(second)
+    assert second.tools[0] is first.tools[0]
+    stats = app_logic.AGENT_POOL.stats()
+    assert (stats["size"], stats["misses"], stats["hits"]) == (1, 1, 1)
+
+
+def test_routed_answers_reach_the_stream_handler(db):
+    texts = []
+    handler = AgentStreamHandler(on_text=texts.append)
+    result = app_logic.answer_question(SimpleNamespace(memory=None), "jsmith", "How much did I spend on Zomato?",
+                                       callbacks=[handler])
+
+    assert result["routed"] == "merchant_spend"
+    assert texts == [result["output"]]
+    assert handler.time_to_first_output is not None
+
+
+class RecallingExecutor:
+    """Answers from the conversation memory, like an agent resolving a follow-up."""
+
+    def __init__(self, history=()):
+        self.memory = app_logic.create_session_memory()
+        for question, answer in history:
+            self.memory.save_context({"input": question}, {"output": answer})
+        self.calls = 0
+
+    def invoke(self, inputs, config=None):
+        self.calls += 1
+        messages = self.memory.chat_memory.messages
+        output = f"Following up on {messages[-1].content}" if messages else "Zomato"
+        self.memory.save_context({"input": inputs["input"]}, {"output": output})
+        return {"output": output}
+
+
+def test_follow_ups_do_not_share_cached_answers_across_sessions(db):
+    """The cache key has no conversation, so only a session's first turn is cached."""
+    first = RecallingExecutor([("Who is my top merchant?", "Zomato")])
+    second = RecallingExecutor([("Who is my top merchant?", "Rent Payment")])
+    follow_up = "And the second one?"
+
+    assert app_logic.invoke_with_cache(first, "jsmith", follow_up)["output"] == "Following up on Zomato"
+    result = app_logic.invoke_with_cache(second, "jsmith", follow_up)
+    assert result["output"] == "Following up on Rent Payment"
+    assert not result.get("cached")
+
+    fresh, other = RecallingExecutor(), RecallingExecutor()
+    app_logic.invoke_with_cache(fresh, "jsmith", "Who is my top merchant?")
+    assert app_logic.invoke_with_cache(other, "jsmith", "Who is my top merchant?")["cached"] is True
+    assert other.calls == 0
+
+
+class FakeExecutor:
+    """Answers summary questions with scripted delays, failures and hangs."""
+
+    memory = None
+
+    def __init__(self, release):
+        self.release = release
+
+    def invoke(self, inputs, config=None):
+        question = inputs["input"]
+        if question == SUMMARY_QUESTIONS[1]:
+            self.release.wait(5)  # Hangs past the per-question timeout
+        elif question == SUMMARY_QUESTIONS[2]:
+            raise RuntimeError("model unavailable")
+        elif question == SUMMARY_QUESTIONS[0]:
+            time.sleep(0.1)  # Finishes after the questions listed below it
+        return {"output": f"Answer {SUMMARY_QUESTIONS.index(question)}"}
+
+
+def test_summary_reports_timeouts_and_errors_in_question_order(db, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(app_logic, "_stateless_executor", lambda agent: FakeExecutor(release))
+    try:
+        started = time.perf_counter()
+        summary = app_logic.generate_financial_summary(None, "jsmith", max_concurrency=4, timeout=0.3,
+                                                       use_fast_path=False)
+        elapsed = time.perf_counter() - started
+    finally:
+        release.set()
+
+    assert elapsed < 1
+    answers = [line.strip() for line in summary.splitlines() if line.strip().startswith("- ")]
+    assert answers == [
+        "- Answer 0",
+        "- Error generating this insight: timed out after 0.3 seconds.",
+        "- Error generating this insight: model unavailable",
+        "- Answer 3",
+    ]
+    assert summary.index(SUMMARY_QUESTIONS[0]) < summary.index(SUMMARY_QUESTIONS[3])
+
+
+def test_queued_summary_questions_are_not_charged_for_waiting(db, monkeypatch):
+    """With one worker, each question gets its own timeout once it starts running."""
+    class SlowExecutor:
+        memory = None
+
+        def invoke(self, inputs, config=None):
+            time.sleep(0.15)
+            return {"output": "ok"}
+
+    monkeypatch.setattr(app_logic, "_stateless_executor", lambda agent: SlowExecutor())
+    summary = app_logic.generate_financial_summary(None, "jsmith", max_concurrency=1, timeout=0.3,
+                                                   use_fast_path=False)
+    assert summary.count("  - ok") == len(SUMMARY_QUESTIONS)
@@ -0,0 +1,37 @@
+import random
+
+import database
+from benchmark import latency_stats, percentile
+from database import read_connection
+from synthetic_data import generate_bank_transactions, populate_synthetic
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) == 0.0
+    assert percentile([10, 20, 30, 40], 50) == 25
+    assert percentile([5], 95) == 5
+    assert latency_stats([1, 2, 3])["p50_ms"] == 2
+
+
+def test_generated_transactions_are_deterministic_and_valid():
+    first = list(generate_bank_transactions("user00000", 200, random.Random(7)))
+    second = list(generate_bank_transactions("user00000", 200, random.Random(7)))
+    assert first == second
+    assert len(first) == 200
+    assert all((amount < 0) == (kind == "Debit") for _, _, amount, kind, _ in first)
+
+
+def test_populate_synthetic_writes_every_table(tmp_path, monkeypatch):
+    path = str(tmp_path / "synthetic.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+
+    result = populate_synthetic(path, users=3, transactions_per_user=120, seed=1, batch_size=50)
+    assert result["bank_transactions"] == 360
+    # Re-running replaces the generated users' rows instead of duplicating them.
+    populate_synthetic(path, users=3, transactions_per_user=120, seed=1)
+
+    with read_connection(path) as conn:
+        assert conn.execute("SELECT COUNT(DISTINCT username) FROM bank_transactions").fetchone()[0] == 3
+        assert conn.execute("SELECT COUNT(*) FROM bank_transactions").fetchone()[0] == 360
+        assert conn.execute("SELECT COUNT(*) FROM stock_portfolio").fetchone()[0] == result["stock_portfolio"]
+        assert conn.execute("SELECT MAX(version) FROM data_versions").fetchone()[0] == 2
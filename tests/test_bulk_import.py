@@ -0,0 +1,107 @@
+import pytest
+
+import database
+from bulk_import import ImportFormatError, detect_date_format, import_csv, map_columns, parse_amount_minor
+from database import read_connection, write_transaction
+from schema import migrate
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.execute(
+            "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) "
+            "VALUES ('2025-01-01', 'Salary Credit', 5000000, 'Credit', 'other')"
+        )
+    return path
+
+
+def _write(tmp_path, text, name="statement.csv"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def _rows(username):
+    with read_connection() as conn:
+        return conn.execute(
+            "SELECT Date, Description, AmountMinor, Type FROM bank_transactions WHERE username = ? ORDER BY Date",
+            (username,),
+        ).fetchall()
+
+
+def test_bank_export_is_normalized_in_chunks(db, tmp_path):
+    """Withdrawal/deposit columns, day-first dates and thousands separators are normalized."""
+    path = _write(tmp_path, (
+        "Txn Date,Narration,Withdrawal Amt,Deposit Amt\n"
+        "02/07/2025,Zomato Order,350.00,\n"
+        "01/07/2025,Salary Credit,,\"80,000.00\"\n"
+        "31/13/2025,Broken Date,10,\n"
+        "\n"
+        "03/07/2025,Uber Ride,120.5,\n"
+    ))
+    progress = []
+    result = import_csv(path, "jsmith", chunk_size=2, progress=progress.append)
+
+    assert (result.rows_read, result.rows_written, result.rows_invalid) == (4, 3, 1)
+    assert result.errors == [(4, "unrecognized date '31/13/2025'")]
+    assert len(progress) == 2
+    assert _rows("jsmith") == [
+        ("2025-07-01", "Salary Credit", 8000000, "Credit"),
+        ("2025-07-02", "Zomato Order", -35000, "Debit"),
+        ("2025-07-03", "Uber Ride", -12050, "Debit"),
+    ]
+    assert len(_rows("other")) == 1
+
+
+def test_upsert_reimport_does_not_duplicate(db, tmp_path):
+    """Upsert ids follow the row content, so overlapping exports only add the new rows."""
+    header = "Date,Description,Amount,Type\n"
+    path = _write(tmp_path, header + "2025-07-01,Zomato Order,350,Debit\n"
+                                     "2025-07-02,Uber Ride,120,Debit\n"
+                                     "2025-07-02,Uber Ride,120,Debit\n")
+    import_csv(path, "jsmith")
+    import_csv(path, "jsmith", chunk_size=1)  # Occurrences are counted across chunks.
+    # A later export starts a day later, so every row moves up a line.
+    _write(tmp_path, header + "2025-07-02,Uber Ride,120,Debit\n"
+                              "2025-07-02,Uber Ride,120,Debit\n"
+                              "2025-07-03,Salary Credit,80000,Credit\n")
+    import_csv(path, "jsmith")
+    import_csv(path, "asmith")
+
+    assert _rows("jsmith") == [
+        ("2025-07-01", "Zomato Order", -35000, "Debit"),
+        ("2025-07-02", "Uber Ride", -12000, "Debit"),
+        ("2025-07-02", "Uber Ride", -12000, "Debit"),
+        ("2025-07-03", "Salary Credit", 8000000, "Credit"),
+    ]
+    assert len(_rows("asmith")) == 3
+
+    import_csv(path, "jsmith", mode="append")
+    assert len(_rows("jsmith")) == 7
+
+
+def test_one_date_format_is_used_per_file(db, tmp_path):
+    """A month-first file is not read day-first where its dates happen to allow it."""
+    path = _write(tmp_path, "Date,Description,Amount\n"
+                            "07/01/2025,Rent,-500\n"
+                            "07/13/2025,Uber Ride,-120\n")
+    result = import_csv(path, "jsmith")
+
+    assert result.date_format == "%m/%d/%Y"
+    assert [row[0] for row in _rows("jsmith")] == ["2025-07-01", "2025-07-13"]
+    assert detect_date_format(["02/07/2025", "01/07/2025"]) == "%d/%m/%Y"  # Ambiguous: day-first wins.
+    with pytest.raises(ImportFormatError):
+        detect_date_format(["yesterday"])
+
+
+def test_amount_and_header_parsing():
+    assert parse_amount_minor("₹ 1,234.50 Dr") == -123450
+    assert parse_amount_minor("(99.00)") == -9900
+    assert parse_amount_minor("500Cr") == 50000
+    assert parse_amount_minor("") is None
+    with pytest.raises(ImportFormatError):
+        map_columns(["Date", "Notes"])
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+import database
+from bulk_import import import_csv
+from categorization import (
+    DEFAULT_CATEGORY, categorize, categorize_description, clean_description, plaid_category, recategorize_rows,
+)
+from database import read_connection, write_transaction
+from schema import migrate
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    with write_transaction(path) as conn:
+        migrate(conn)
+    return path
+
+
+def _categories(username):
+    with read_connection() as conn:
+        return conn.execute(
+            "SELECT Description, Merchant, Category FROM bank_transactions WHERE username = ? ORDER BY id",
+            (username,),
+        ).fetchall()
+
+
+def test_rules_normalize_merchants_and_categories():
+    """Rail prefixes and references are stripped before matching."""
+    assert clean_description("UPI/ZOMATO/1234567890/Pay") == "ZOMATO Pay"
+    assert categorize_description("UPI/ZOMATO/1234567890/Pay") == ("Zomato", "Food & Dining")
+    assert categorize_description("Uber 063015 SF**POOL**") == ("Uber", "Transport")
+    assert categorize_description("Salary Credit", "Credit")[1] == "Income"
+    assert categorize_description("Salary Credit", "Debit")[1] == DEFAULT_CATEGORY
+    assert categorize_description("Tectra Inc")[1] == DEFAULT_CATEGORY
+
+
+def test_source_categories_take_precedence():
+    """Plaid's own category wins over the rules when present."""
+    assert plaid_category({"personal_finance_category": {"primary": "TRAVEL"}}) == "Travel"
+    assert plaid_category({"category": ["Food and Drink", "Restaurants"]}) == "Food & Dining"
+    assert plaid_category({"category": None}) is None
+
+    merchants, categories = categorize(["Amazon Purchase", "Amazon Purchase"], known_categories=[None, "Travel"])
+    assert merchants == ["Amazon", "Amazon"]
+    assert categories == ["Shopping", "Travel"]
+
+
+def test_csv_import_categorizes_rows(db, tmp_path):
+    """Rows written by the bulk importer carry a merchant and category."""
+    path = tmp_path / "statement.csv"
+    path.write_text("Date,Narration,Amount\n2025-01-02,POS 4587XXXX1234 DMART MUMBAI,-850.00\n"
+                    "2025-01-03,Salary Credit,50000\n", encoding="utf-8")
+    import_csv(str(path), "jsmith")
+
+    assert _categories("jsmith") == [
+        ("POS 4587XXXX1234 DMART MUMBAI", "DMART MUMBAI", "Groceries"),
+        ("Salary Credit", "Salary Credit", "Income"),
+    ]
+
+
+def test_plaid_ingest_uses_plaid_category(db):
+    """save_transactions_to_db stores Plaid's category and merchant name."""
+    pytest.importorskip("pandas")
+    pytest.importorskip("plaid")
+    import plaid_service
+
+    plaid_service.save_transactions_to_db("jsmith", [
+        {"transaction_id": "t1", "date": "2025-01-02", "name": "UNITED 0161234", "amount": 500.0,
+         "merchant_name": "United Airlines", "personal_finance_category": {"primary": "TRAVEL"}},
+        {"transaction_id": "t2", "date": "2025-01-03", "name": "Starbucks", "amount": 4.5},
+    ])
+    assert _categories("jsmith") == [
+        ("UNITED 0161234", "United Airlines", "Travel"),
+        ("Starbucks", "Starbucks", "Food & Dining"),
+    ]
+
+
+def test_recategorize_in_batches_keeps_source_categories():
+    """Batches cover every row; a stored category is not downgraded to the default."""
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username, Category) "
+        "VALUES ('2025-01-01', ?, -100, 'Debit', ?, ?)",
+        [("Zomato Order", "a", None), ("Tectra Inc", "b", "Travel"), ("Netflix", "b", None)],
+    )
+
+    updated, last_id, users = recategorize_rows(conn, batch_size=2)
+    assert (updated, last_id, users) == (3, 3, {"a", "b"})
+    assert [r[0] for r in conn.execute("SELECT Category FROM bank_transactions ORDER BY id")] == [
+        "Food & Dining", "Travel", "Entertainment",
+    ]
+    assert recategorize_rows(conn)[0] == 0
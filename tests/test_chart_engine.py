@@ -0,0 +1,92 @@
+import sqlite3
+
+import plotly.graph_objects as go
+import pytest
+
+import chart_engine
+import database
+from database import bump_data_version, write_transaction
+from schema import migrate
+
+ROWS = [
+    ("2025-06-15", "Salary Credit", 8000000, "Credit", "jsmith"),
+    ("2025-06-20", "Rent Payment", -2000000, "Debit", "jsmith"),
+    ("2025-07-02", "Zomato Order", -35000, "Debit", "jsmith"),
+    ("2025-07-05", "Rent Payment", -2000000, "Debit", "jsmith"),
+    ("2025-07-09", "Movie Tickets", -80000, "Debit", "jsmith"),
+    ("2025-07-22", "Zomato Order", -29900, "Debit", "jsmith"),
+    ("2025-07-23", "Zomato Order", -99900, "Debit", "rbriggs"),
+]
+
+def _load(conn):
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) VALUES (?, ?, ?, ?, ?)",
+        ROWS,
+    )
+    conn.execute(
+        "INSERT INTO stock_portfolio (Ticker, CompanyName, Quantity, PurchasePrice, CurrentPrice, username) "
+        "VALUES ('INFY', 'Infosys Ltd', 30, 1500, 1620, 'jsmith')"
+    )
+    conn.execute(
+        "INSERT INTO mutual_funds (FundName, Category, InvestedAmount, CurrentValue, username) "
+        "VALUES ('Axis Small Cap Fund', 'Small Cap', 40000, 49000, 'jsmith')"
+    )
+
+@pytest.fixture
+def conn():
+    """Provides an in-memory database with a small set of transactions and holdings."""
+    conn = sqlite3.connect(":memory:")
+    _load(conn)
+    yield conn
+    conn.close()
+
+def test_breakdown_keeps_top_groups_and_folds_the_rest(conn):
+    """Only the top N groups are returned individually; the remainder becomes 'Other'."""
+    df = chart_engine.spending_breakdown(conn, "jsmith", top_n=1)
+    assert df.values.tolist() == [["Rent Payment", 40000.0], ["Other", 1449.0]]
+
+def test_breakdown_respects_date_range(conn):
+    df = chart_engine.spending_breakdown(conn, "jsmith", start="2025-07-01", end="2025-07-09")
+    assert dict(df.values.tolist()) == {"Rent Payment": 20000.0, "Movie Tickets": 800.0, "Zomato Order": 350.0}
+
+def test_monthly_totals_and_portfolio_allocation(conn):
+    months = chart_engine.monthly_totals(conn, "jsmith")
+    assert months.values.tolist() == [["2025-06", 20000.0, 80000.0], ["2025-07", 21449.0, 0.0]]
+
+    holdings = chart_engine.portfolio_allocation(conn, "jsmith")
+    assert holdings.values.tolist() == [["Axis Small Cap Fund", "Mutual Funds", 49000.0],
+                                        ["INFY", "Stocks", 48600.0]]
+
+def test_parse_date_range():
+    assert chart_engine.parse_date_range("from 2025-07-31 to 2025-07-01") == ("2025-07-01", "2025-07-31")
+    assert chart_engine.parse_date_range("") == (None, None)
+
+def test_chart_specs_are_cached_per_data_version(tmp_path, monkeypatch):
+    """A cached spec is reused until the user's data version changes."""
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    with write_transaction(path) as conn:
+        _load(conn)
+
+    first = chart_engine.get_chart_spec("jsmith", "spending_breakdown")
+    assert chart_engine.get_chart_spec("jsmith", "spending_breakdown") is first
+    assert chart_engine.get_chart("nobody", "spending_breakdown") is None
+
+    with write_transaction(path) as conn:
+        bump_data_version(conn, "jsmith")
+    assert chart_engine.get_chart_spec("jsmith", "spending_breakdown") is not first
+
+def test_agent_chart_results_become_references():
+    """Chart answers are stored in the chat history as references, not figures."""
+    pytest.importorskip("langchain")
+    app_logic = pytest.importorskip("app_logic")
+    from langchain_core.agents import AgentAction
+
+    action = AgentAction(tool="create_monthly_spending_chart",
+                         tool_input={"__arg1": "2025-01-01 to 2025-06-30"}, log="")
+    result = {"output": "Here is your chart.", "intermediate_steps": [(action, go.Figure())]}
+    assert app_logic.chart_reference(result) == {
+        "chart_type": "monthly_trend", "start": "2025-01-01", "end": "2025-06-30",
+    }
+    assert app_logic.chart_reference({"output": "4", "intermediate_steps": []}) is None
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import ConnectionManager
+
+def _insert(conn, description="Zomato Order"):
+    conn.execute(
+        "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) "
+        "VALUES ('2025-07-02', ?, -35000, 'Debit', 'jsmith')",
+        (description,),
+    )
+
+@pytest.fixture
+def manager(tmp_path):
+    """Provides a connection manager over a fresh database file."""
+    return ConnectionManager(str(tmp_path / "finance.db"))
+
+def test_connections_use_wal_and_busy_timeout(manager):
+    """Read connections are configured with the shared pragmas."""
+    with manager.read() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] > 0
+
+def test_read_connection_is_reused_per_thread_and_read_only(manager):
+    """Each thread keeps one read connection, which rejects writes."""
+    with manager.read() as first, manager.read() as second:
+        assert first is second
+        with pytest.raises(sqlite3.OperationalError):
+            _insert(first)
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(manager.read().__enter__()))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+def test_write_rolls_back_on_error(manager):
+    """A failing write block leaves no partial rows behind."""
+    with pytest.raises(RuntimeError):
+        with manager.write() as conn:
+            _insert(conn)
+            raise RuntimeError("boom")
+
+    with manager.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM bank_transactions").fetchone()[0] == 0
+    assert manager.stats()["write_rollbacks"] == 1
+
+def test_concurrent_writes_are_serialized(manager):
+    """Writers from many threads queue on the single writer instead of failing."""
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(20):
+                with manager.write() as conn:
+                    _insert(conn, f"txn {n}-{i}")
+                with manager.read() as conn:
+                    conn.execute("SELECT COUNT(*) FROM bank_transactions").fetchone()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with manager.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM bank_transactions").fetchone()[0] == 160
+
+    stats = manager.stats()
+    assert stats["write_transactions"] == 160
+    assert stats["busy_errors"] == 0
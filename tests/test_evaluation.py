@@ -0,0 +1,83 @@
+import pytest
+
+pytest.importorskip("langchain")
+run_evaluation = pytest.importorskip("run_evaluation")
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+import database
+from database import write_transaction
+from fake_llm import CassetteChatModel, CassetteMissError
+from schema import migrate
+
+QUESTION = {"question": "How many mutual funds do I own?", "answer": "2"}
+
+
+class ScriptedModel(GenericFakeChatModel):
+    """Returns scripted messages and ignores tool bindings."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO mutual_funds (FundName, Category, InvestedAmount, CurrentValue, username) VALUES (?, ?, ?, ?, ?)",
+            [("Axis Small Cap Fund", "Small Cap", 40000, 49000, "jsmith"),
+             ("UTI Nifty 50 Index Fund", "Index Fund", 75000, 82000, "jsmith")],
+        )
+    return path
+
+
+def _scripted_model():
+    usage = {"input_tokens": 100, "output_tokens": 10, "total_tokens": 110}
+    return ScriptedModel(messages=iter([
+        AIMessage(content="", usage_metadata=usage, tool_calls=[{
+            "name": "sql_db_query", "id": "call-1",
+            "args": {"query": "SELECT COUNT(*) FROM mutual_funds WHERE username = 'jsmith'"},
+        }]),
+        AIMessage(content="You own 2 mutual funds.", usage_metadata=usage),
+    ]))
+
+
+def test_recorded_run_replays_offline_with_metrics(db, tmp_path):
+    """A recorded agent run replays with the same answer, SQL queries and tokens."""
+    cassette = str(tmp_path / "cassette.json")
+    recorder = CassetteChatModel(cassette_path=cassette, mode="record", inner=_scripted_model())
+    recorded = run_evaluation.evaluate_question(QUESTION, llm=recorder, use_router=False)
+    recorder.save()
+
+    player = CassetteChatModel(cassette_path=cassette, mode="replay")
+    replayed = run_evaluation.evaluate_question(QUESTION, llm=player, use_router=False)
+
+    for result in (recorded, replayed):
+        assert result["correct"] and result["error"] is None
+        assert result["sql_queries"] == 1
+        assert result["llm_calls"] == 2
+        assert result["total_tokens"] == 220
+    assert player.stats()["hits"] == 2
+
+
+def test_replay_miss_is_reported_as_an_error(db, tmp_path):
+    cassette = str(tmp_path / "cassette.json")
+    CassetteChatModel(cassette_path=cassette, mode="record", inner=_scripted_model()).save()
+
+    player = CassetteChatModel(cassette_path=cassette, mode="replay")
+    result = run_evaluation.evaluate_question(QUESTION, llm=player, use_router=False)
+    assert not result["correct"]
+    assert result["error"].startswith(CassetteMissError.__name__)
+
+
+def test_regression_gate():
+    baseline = {"accuracy": 80.0, "latency_ms_p50": 1000.0, "mean_tokens": 500.0}
+    assert run_evaluation.compare_to_baseline(dict(baseline), baseline) == []
+
+    worse = {"accuracy": 60.0, "latency_ms_p50": 2000.0, "mean_tokens": 600.0}
+    assert len(run_evaluation.compare_to_baseline(worse, baseline)) == 3
@@ -0,0 +1,126 @@
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+import database
+import instrumentation
+from database import read_connection, write_transaction
+from fake_llm import CassetteChatModel
+from instrumentation import REGISTRY, MetricsRegistry, instrumented
+from schema import migrate
+
+
+class ScriptedModel(GenericFakeChatModel):
+    """Returns scripted messages and ignores tool bindings."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO mutual_funds (FundName, Category, InvestedAmount, CurrentValue, username) VALUES (?, ?, ?, ?, ?)",
+            [("Axis Small Cap Fund", "Small Cap", 40000, 49000, "jsmith"),
+             ("UTI Nifty 50 Index Fund", "Index Fund", 75000, 82000, "jsmith")],
+        )
+    REGISTRY.reset()
+    return path
+
+
+def _row(kind, name):
+    return next(r for r in REGISTRY.snapshot() if r["kind"] == kind and r["name"] == name)
+
+
+def test_registry_percentiles_and_prometheus_export():
+    registry = MetricsRegistry(recent=100)
+    for ms in range(1, 101):
+        registry.observe("tool", "sql_db_query", float(ms), rows=2)
+    registry.observe("tool", "sql_db_query", 5.0, error=True)
+    registry.increment("llm_tokens_total", 42, direction="input")
+
+    row = registry.snapshot()[0]
+    assert row["count"] == 101 and row["errors"] == 1 and row["rows"] == 200
+    assert row["p50_ms"] == pytest.approx(51.5, abs=1)
+    assert row["p95_ms"] == pytest.approx(96, abs=1)
+
+    text = registry.prometheus_text()
+    assert 'finance_agent_span_duration_ms{kind="tool",name="sql_db_query",quantile="0.95"}' in text
+    assert 'finance_agent_span_errors_total{kind="tool",name="sql_db_query"} 1' in text
+    assert 'finance_agent_llm_tokens_total{direction="input"} 42' in text
+    assert 'finance_agent_span_duration_ms_sum{kind="tool",name="sql_db_query"} 5055.000' in text
+
+    for _ in range(3):
+        registry.observe("llm", "gemini", 1.004)
+    assert 'finance_agent_span_duration_ms_sum{kind="llm",name="gemini"} 3.012' in registry.prometheus_text()
+
+
+def test_metrics_server_listens_on_loopback_by_default():
+    """The unauthenticated endpoint is only exposed beyond this machine via METRICS_HOST."""
+    server = instrumentation.start_metrics_server(0)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_instrumented_records_errors_and_reraises(db):
+    @instrumented("plaid", name="flaky")
+    def flaky():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flaky()
+    assert _row("plaid", "flaky")["errors"] == 1
+
+
+def test_database_reads_and_writes_are_timed(db):
+    with write_transaction() as conn:
+        conn.execute("DELETE FROM mutual_funds WHERE username = 'nobody'")
+    with read_connection() as conn:
+        conn.execute("SELECT 1").fetchone()
+    assert _row("db", "read")["count"] == 1
+    assert _row("db", "write")["count"] == 1
+
+
+def test_agent_turn_records_llm_tool_sql_and_tokens(db, tmp_path, capsys):
+    """One agent turn produces LLM, tool and SQL spans and a JSON turn log line."""
+    from app_logic import invoke_with_cache, setup_agent
+
+    usage = {"input_tokens": 100, "output_tokens": 10, "total_tokens": 110}
+    scripted = ScriptedModel(messages=iter([
+        AIMessage(content="", usage_metadata=usage, tool_calls=[{
+            "name": "sql_db_query", "id": "call-1",
+            "args": {"query": "SELECT FundName FROM mutual_funds WHERE username = 'jsmith'"},
+        }]),
+        AIMessage(content="You own 2 mutual funds.", usage_metadata=usage),
+    ]))
+    # The cassette wrapper answers without streaming, which keeps the scripted tool calls intact.
+    llm = CassetteChatModel(cassette_path=str(tmp_path / "cassette.json"), mode="record", inner=scripted)
+    agent = setup_agent("jsmith", "John", llm=llm)
+    result = invoke_with_cache(agent, "jsmith", "How many mutual funds do I own?", bypass_cache=True)
+
+    assert result["output"] == "You own 2 mutual funds."
+    assert _row("llm", "CassetteChatModel")["count"] == 2
+    assert _row("tool", "sql_db_query")["rows"] == 2
+    assert _row("sql", "engine.select")["count"] >= 1
+    assert _row("turn", "agent_turn")["count"] == 1
+    assert REGISTRY.counters()["llm_tokens_total[direction=input]"] == 200
+
+    turn_logs = [line for line in capsys.readouterr().out.splitlines() if '"event": "turn"' in line]
+    assert turn_logs and '"sql_queries": 1' in turn_logs[-1] and '"input_tokens": 200' in turn_logs[-1]
+
+
+def test_sql_row_count_parsing():
+    assert instrumentation._count_sql_rows("[('a',), ('b',), ('c',)]") == 3
+    assert instrumentation._count_sql_rows("") == 0
+    assert instrumentation._count_sql_rows("Error: no such table") is None
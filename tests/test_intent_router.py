@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+from intent_router import build_lookups, route_question
+from schema import migrate
+
+TRANSACTIONS = [
+    ("2025-07-01", "Salary Credit", 8000000, "Credit", "jsmith"),
+    ("2025-07-02", "Zomato Order", -35000, "Debit", "jsmith"),
+    ("2025-07-05", "Rent Payment", -2000000, "Debit", "jsmith"),
+    ("2025-07-22", "Zomato Gold", -29900, "Debit", "jsmith"),
+    ("2025-07-23", "Zomato Order", -99900, "Debit", "rbriggs"),
+    ("2025-07-24", "Ola Ride", -25000, "Debit", "jsmith"),
+    ("2025-07-25", "Coca Cola", -4000, "Debit", "jsmith"),
+]
+STOCKS = [
+    ("INFY", "Infosys Ltd", 30, 1500, 1620, "jsmith"),
+    ("TATAMOTORS", "Tata Motors Ltd", 50, 950, 990, "jsmith"),
+]
+
+@pytest.fixture
+def conn():
+    """Provides an in-memory database with transactions, stocks and funds."""
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) VALUES (?, ?, ?, ?, ?)",
+        TRANSACTIONS,
+    )
+    conn.executemany(
+        "INSERT INTO stock_portfolio (Ticker, CompanyName, Quantity, PurchasePrice, CurrentPrice, username) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        STOCKS,
+    )
+    conn.executemany(
+        "INSERT INTO mutual_funds (FundName, Category, InvestedAmount, CurrentValue, username) VALUES (?, ?, ?, ?, ?)",
+        [("Axis Small Cap Fund", "Small Cap", 40000, 49000, "jsmith"),
+         ("UTI Nifty 50 Index Fund", "Index Fund", 75000, 82000, "jsmith")],
+    )
+    yield conn
+    conn.close()
+
+@pytest.mark.parametrize("question, intent, expected", [
+    ("How much did I spend on Zomato according to my bank transactions?", "merchant_spend", "649.00"),
+    ("how much did I spend on zomatto?", "merchant_spend", "649.00"),
+    ("What is the total current value of my stock portfolio?", "stock_portfolio_value", "98100.00"),
+    ("Which company corresponds to the ticker INFY?", "ticker_company", "Infosys Ltd"),
+    ("What is my profit for the stock with ticker TATAMOTORS?", "stock_profit", "2000.00"),
+    ("How many mutual funds do I own in total?", "mutual_fund_count", "2 mutual funds"),
+    ("How much did I spend on Ola?", "merchant_spend", "250.00 on Ola across 1 transaction (Ola Ride)"),
+    ("What is my profit on Tata Motrs?", "stock_profit", "Your profit on TATAMOTORS"),
+    ("What is the current value of my shares in Infosys?", "stock_portfolio_value", "INFY are currently worth 48600.00"),
+])
+def test_common_questions_are_routed(conn, question, intent, expected):
+    """Template questions are answered from SQL for the current user only."""
+    routed = route_question(conn, "jsmith", question)
+    assert routed is not None
+    assert routed.intent == intent
+    assert expected in routed.answer
+
+@pytest.mark.parametrize("question", [
+    "How much did I spend on Zomato last month?",
+    "Show me a pie chart of my spending",
+    "How much did I spend on Uber?",
+    "What are my top spending categories?",
+    "What is my profit on Tata Steel?",
+    "What is the current value of my shares in Reliance?",
+])
+def test_unmatched_or_qualified_questions_escalate(conn, question):
+    """Questions the templates cannot answer exactly are left to the agent."""
+    assert route_question(conn, "jsmith", question) is None
+
+def test_lookups_are_scoped_to_user(conn):
+    """Entity lookups only contain the user's own merchants and tickers."""
+    lookups = build_lookups(conn, "rbriggs")
+    assert set(lookups["merchant_tokens"]) == {"zomato"}
+    assert lookups["tickers"] == {}
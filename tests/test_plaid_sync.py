@@ -0,0 +1,72 @@
+import pytest
+
+import database
+from fake_plaid import FakePlaidApi, generate_transactions
+
+@pytest.fixture
+def plaid_service(tmp_path, monkeypatch):
+    """Imports plaid_service against a fresh database file."""
+    pytest.importorskip("pandas")
+    pytest.importorskip("plaid")
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "finance.db"))
+    import plaid_service
+    return plaid_service
+
+def _count_rows(username="jsmith"):
+    with database.read_connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM bank_transactions WHERE username = ?", (username,)
+        ).fetchone()[0]
+
+def test_fake_sync_paginates_the_change_log():
+    """The fake API pages through its change log like /transactions/sync."""
+    api = FakePlaidApi()
+    api.add_item("access-1", "item-1", generate_transactions(1200))
+
+    first = api.transactions_sync({"access_token": "access-1", "count": 500})
+    assert len(first["added"]) == 500 and first["has_more"]
+
+    cursor, pages = first["next_cursor"], 1
+    while True:
+        page = api.transactions_sync({"access_token": "access-1", "cursor": cursor, "count": 500})
+        pages += 1
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    assert pages == 3
+
+    api.remove_transactions("access-1", ["txn-0-0"])
+    update = api.transactions_sync({"access_token": "access-1", "cursor": cursor})
+    assert update["removed"] == [{"transaction_id": "txn-0-0"}]
+
+def test_incremental_sync_is_idempotent(plaid_service):
+    """Repeated syncs only apply new changes and never duplicate rows."""
+    api = FakePlaidApi(generate_transactions(1200))
+    access_token, item_id = plaid_service.exchange_public_token(
+        plaid_service.create_sandbox_public_token(api=api), api=api
+    )
+    plaid_service.save_credentials_to_db("jsmith", access_token, item_id)
+
+    assert plaid_service.sync_transactions("jsmith", access_token, item_id, api=api)["added"] == 1200
+    assert plaid_service.sync_transactions("jsmith", access_token, item_id, api=api)["added"] == 0
+    assert _count_rows() == 1200
+
+    changed = dict(generate_transactions(1)[0], name="Renamed Merchant")
+    api.modify_transactions(access_token, [changed])
+    api.remove_transactions(access_token, ["txn-0-1"])
+    counts = plaid_service.sync_transactions("jsmith", access_token, item_id, api=api)
+
+    assert counts == {"added": 0, "modified": 1, "removed": 1}
+    assert _count_rows() == 1199
+    with database.read_connection() as conn:
+        name = conn.execute(
+            "SELECT Description FROM bank_transactions WHERE transaction_id = 'txn-0-0'"
+        ).fetchone()[0]
+    assert name == "Renamed Merchant"
+
+def test_save_transactions_upserts_on_transaction_id(plaid_service):
+    """Saving the same Plaid transactions twice keeps one row per transaction."""
+    transactions = generate_transactions(10)
+    plaid_service.save_transactions_to_db("jsmith", transactions)
+    plaid_service.save_transactions_to_db("jsmith", transactions)
+    assert _count_rows() == 10
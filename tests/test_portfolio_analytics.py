@@ -0,0 +1,67 @@
+import pytest
+
+import database
+import portfolio_analytics
+from database import bump_data_version, write_transaction
+from portfolio_analytics import get_portfolio_analytics, portfolio_report
+from schema import migrate
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO stock_portfolio (Ticker, CompanyName, Quantity, PurchasePrice, CurrentPrice, username) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [("TATAMOTORS", "Tata Motors Ltd", 30, 950, 990, "jsmith"),
+             ("TATAMOTORS", "Tata Motors Ltd", 20, 950, 990, "jsmith"),  # A second lot of the same ticker
+             ("INFY", "Infosys Ltd", 30, 1500, 1400, "jsmith"),
+             ("INFY", "Infosys Ltd", 99, 1, 1, "rbriggs")],
+        )
+        conn.executemany(
+            "INSERT INTO mutual_funds (FundName, Category, InvestedAmount, CurrentValue, username) VALUES (?, ?, ?, ?, ?)",
+            [("Axis Small Cap Fund", "Small Cap", 40000, 49000, "jsmith"),
+             ("UTI Nifty 50 Index Fund", "Index Fund", 75000, 82000, "jsmith")],
+        )
+    return path
+
+
+def test_metrics_for_every_holding_and_category(db):
+    analytics = get_portfolio_analytics("jsmith")
+    holdings = analytics.holdings.set_index("holding")
+
+    assert len(holdings) == 4
+    assert holdings.loc["TATAMOTORS", ["quantity", "cost", "value", "pnl"]].tolist() == [50, 47500, 49500, 2000]
+    assert holdings.loc["INFY", "pnl_pct"] == pytest.approx(-100 * 3000 / 45000)
+    assert holdings["weight_pct"].sum() == pytest.approx(100)
+    assert analytics.totals["value"] == 49500 + 42000 + 49000 + 82000
+    categories = analytics.categories.set_index("category")
+    assert categories.loc["Stocks", "pnl"] == -1000
+    assert categories.loc["Small Cap", "pnl_pct"] == pytest.approx(22.5)
+
+
+def test_report_lists_the_requested_holding_first(db):
+    report = portfolio_report(get_portfolio_analytics("jsmith"), "What is my profit on TATAMOTORS?")
+    first_lines = report.splitlines()[:2]
+    assert first_lines[0] == "Matching holdings:"
+    assert first_lines[1].startswith("- TATAMOTORS (Tata Motors Ltd): 50 shares, value 49500.00, cost 47500.00, "
+                                     "P&L 2000.00 (4.21%)")
+    assert "Best return: Axis Small Cap Fund (22.50%). Worst return: INFY (-6.67%)." in report
+    assert portfolio_report(get_portfolio_analytics("nobody")) == "The user has no stocks or mutual funds."
+
+
+def test_analytics_are_cached_until_the_data_version_changes(db):
+    stats = portfolio_analytics.portfolio_cache_stats()
+    first = get_portfolio_analytics("jsmith")
+    assert get_portfolio_analytics("jsmith") is first
+
+    with write_transaction() as conn:
+        conn.execute("DELETE FROM mutual_funds WHERE username = 'jsmith'")
+        bump_data_version(conn, "jsmith")
+    refreshed = get_portfolio_analytics("jsmith")
+    assert len(refreshed.holdings) == 2
+    after = portfolio_analytics.portfolio_cache_stats()
+    assert (after["builds"] - stats["builds"], after["hits"] - stats["hits"]) == (2, 1)
@@ -0,0 +1,80 @@
+import pytest
+
+import database
+from categorization import recategorize_rows
+from database import read_connection, write_transaction
+from plaid_service import save_transactions_to_db
+from rollups import check_rollups, rebuild_rollups, window_category_totals, window_totals
+from schema import migrate
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) VALUES (?, ?, ?, ?, ?)",
+            [("2025-07-01", "Salary Credit", 8000000, "Credit", "jsmith"),
+             ("2025-07-02", "Zomato Order", -35000, "Debit", "jsmith"),
+             ("2025-07-02", "Zomato Order", -15000, "Debit", "jsmith"),
+             ("2025-08-03", "Uber Ride", -12000, "Debit", "jsmith"),
+             ("2025-07-02", "Zomato Order", -99900, "Debit", "other")],
+        )
+    return path
+
+
+def test_triggers_keep_rollups_in_step_with_every_write(db):
+    with read_connection() as conn:
+        assert conn.execute(
+            "SELECT AmountMinor, TxnCount FROM daily_rollups WHERE username = 'jsmith' AND Day = '2025-07-02'"
+        ).fetchone() == (-50000, 2)
+        assert conn.execute(
+            "SELECT Amount FROM monthly_description_totals WHERE username = 'jsmith' AND Month = '2025-07' "
+            "AND Description = 'Zomato Order'"
+        ).fetchone() == (-500.0,)
+
+    with write_transaction() as conn:
+        conn.execute("UPDATE bank_transactions SET Date = '2025-08-01' WHERE Description = 'Zomato Order' "
+                     "AND AmountMinor = -15000")
+        conn.execute("DELETE FROM bank_transactions WHERE Description = 'Uber Ride'")
+    # Plaid upserts go through ON CONFLICT DO UPDATE, which fires the update trigger.
+    transaction = {"transaction_id": "t1", "date": "2025-08-05", "name": "Swiggy", "amount": 250.0}
+    save_transactions_to_db("jsmith", [transaction])
+    save_transactions_to_db("jsmith", [{**transaction, "amount": 300.0}])
+
+    with read_connection() as conn:
+        assert check_rollups(conn) == {"daily_rollups": 0, "monthly_rollups": 0}
+        totals = window_totals(conn, "jsmith", "2025-07-31", "2025-08-31")
+    assert totals == {"Debit": (-45000, 2), "Credit": (0, 0)}
+
+
+def test_check_detects_drift_and_rebuild_repairs_it(db):
+    with write_transaction() as conn:
+        conn.execute("UPDATE daily_rollups SET AmountMinor = 0 WHERE username = 'jsmith'")
+        conn.execute("DELETE FROM monthly_rollups WHERE username = 'other'")
+    with read_connection() as conn:
+        assert check_rollups(conn) == {"daily_rollups": 3, "monthly_rollups": 1}
+        assert check_rollups(conn, "other") == {"daily_rollups": 0, "monthly_rollups": 1}
+
+    with write_transaction() as conn:
+        rebuild_rollups(conn, "jsmith")
+    with read_connection() as conn:
+        assert check_rollups(conn) == {"daily_rollups": 0, "monthly_rollups": 1}
+
+
+def test_rollups_follow_recategorization(db):
+    """Rollups are keyed on category and merchant, and move with the rows when they are recategorized."""
+    with read_connection() as conn:
+        assert conn.execute("SELECT DISTINCT Category FROM daily_rollups").fetchall() == [("Other",)]
+    with write_transaction() as conn:
+        recategorize_rows(conn)
+    with read_connection() as conn:
+        assert check_rollups(conn) == {"daily_rollups": 0, "monthly_rollups": 0}
+        assert window_category_totals(conn, "jsmith", "2025-06-30", "2025-08-31") == [
+            ("Food & Dining", -50000), ("Transport", -12000)]
+        assert conn.execute(
+            "SELECT Merchant, Amount FROM monthly_description_totals WHERE username = 'jsmith' "
+            "AND Category = 'Food & Dining'"
+        ).fetchall() == [("Zomato", -500.0)]
@@ -0,0 +1,47 @@
+import sqlite3
+
+from schema import SCHEMA_VERSION, get_schema_version, migrate
+
+def test_migrate_creates_typed_tables_and_indexes():
+    """A fresh database is created at the latest version with the composite indexes."""
+    conn = sqlite3.connect(":memory:")
+    assert migrate(conn) == SCHEMA_VERSION
+
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_bank_transactions_user_date", "idx_bank_transactions_user_type_date"} <= indexes
+
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT SUM(Amount) FROM bank_transactions "
+        "WHERE username = 'jsmith' AND Type = 'Debit' AND Date >= '2025-07-01'"
+    ))
+    assert "USING INDEX" in plan or "USING COVERING INDEX" in plan
+    conn.close()
+
+def test_migrate_upgrades_legacy_tables_in_place():
+    """Rows in pandas-created tables are converted to ISO dates and minor units."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute('CREATE TABLE bank_transactions ("Date" TEXT, "Description" TEXT, "Amount" REAL, "Type" TEXT, "username" TEXT)')
+    conn.executemany("INSERT INTO bank_transactions VALUES (?, ?, ?, ?, ?)", [
+        ("2025-07-02", "Zomato Order", -350, "Debit", "jsmith"),
+        ("2025-07-31 00:00:00", "Uber 072515 SF**POOL**", -6.33, "Debit", "jsmith"),
+    ])
+    conn.commit()
+
+    migrate(conn)
+
+    rows = conn.execute("SELECT Date, AmountMinor, Amount, Type FROM bank_transactions ORDER BY id").fetchall()
+    assert rows == [("2025-07-02", -35000, -350.0, "Debit"), ("2025-07-31", -633, -6.33, "Debit")]
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    conn.close()
+
+def test_migrate_is_idempotent():
+    """Running the migrations again on an up-to-date database changes nothing."""
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    conn.execute("INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) "
+                 "VALUES ('2025-07-01', 'Salary', 100, 'Credit', 'jsmith')")
+    conn.commit()
+
+    assert migrate(conn) == SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM bank_transactions").fetchone()[0] == 1
+    conn.close()
@@ -0,0 +1,56 @@
+import pytest
+
+import database
+import schema_context
+from database import bump_data_version, write_transaction
+from schema import migrate
+
+
+@pytest.fixture()
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) VALUES (?, ?, ?, ?, ?)",
+            [("2025-07-01", "Salary", 5000000, "Credit", "jsmith"),
+             ("2025-07-05", "Zomato", -64900, "Debit", "jsmith"),
+             ("2025-07-09", "Rent", -2000000, "Debit", "jsmith")],
+        )
+    return path
+
+
+def test_digest_describes_columns_domains_and_dates(db):
+    _, digest = schema_context.get_schema_context("jsmith")
+    assert "Table bank_transactions (3 rows for this user; dates from 2025-07-01 to 2025-07-09)" in digest
+    assert "Type TEXT: one of Credit | Debit" in digest
+    assert "username = 'jsmith'" in digest
+    assert "transaction_id" not in digest
+    assert "plaid_items" not in digest and "answer_cache" not in digest
+
+
+def test_digest_is_cached_until_data_changes(db):
+    first = schema_context.get_schema_context("jsmith")
+    builds = schema_context.schema_context_stats()["builds"]
+    assert schema_context.get_schema_context("jsmith") == first
+    assert schema_context.schema_context_stats()["builds"] == builds
+
+    with write_transaction(db) as conn:
+        conn.execute(
+            "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) "
+            "VALUES ('2025-07-20', 'Refund', 1000, 'Credit', 'jsmith')"
+        )
+        bump_data_version(conn, "jsmith")
+    fingerprint, digest = schema_context.get_schema_context("jsmith")
+    assert fingerprint != first[0]
+    assert "4 rows for this user" in digest
+
+
+def test_digest_is_rebuilt_after_schema_change(db):
+    fingerprint, _ = schema_context.get_schema_context("jsmith")
+    with write_transaction(db) as conn:
+        conn.execute("ALTER TABLE mutual_funds ADD COLUMN Notes TEXT")
+    new_fingerprint, digest = schema_context.get_schema_context("jsmith")
+    assert new_fingerprint != fingerprint
+    assert "Notes TEXT" in digest
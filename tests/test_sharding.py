@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+import database
+from answer_cache import AnswerCache
+from categorization import recategorize
+from database import all_db_paths, read_connection, reload_shard_layout, user_db_path, write_transaction
+from rollups import check_rollups
+from schema import migrate
+from sharding import rebalance, shard_status, split_database
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """A single-file database with two users, and an empty shard directory."""
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    monkeypatch.setattr(database, "SHARD_DIR", str(tmp_path / "shards"))
+    reload_shard_layout()
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username, transaction_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(f"2025-07-{day:02d}", "Zomato Order", -100 * day, "Debit", user, f"{user}-{day}")
+             for user in ("jsmith", "rbriggs") for day in range(1, 6)],
+        )
+        conn.execute("INSERT INTO plaid_items (username, access_token, item_id) VALUES ('rbriggs', 'secret', 'i1')")
+    yield path
+    reload_shard_layout()
+
+
+def _rows(path, username):
+    with read_connection(path) as conn:
+        return conn.execute("SELECT Date, AmountMinor, transaction_id FROM bank_transactions "
+                            "WHERE username = ? ORDER BY id", (username,)).fetchall()
+
+
+def test_routing_is_off_without_a_layout(source):
+    assert user_db_path("jsmith") == source
+    assert all_db_paths() == [source]
+
+
+def test_split_routes_each_user_to_their_own_shard(source):
+    expected = {user: _rows(source, user) for user in ("jsmith", "rbriggs")}
+    result = split_database(mode="user")
+    assert result["users"] == 2 and result["shards"] == 2
+
+    jsmith, rbriggs = user_db_path("jsmith"), user_db_path("rbriggs")
+    assert jsmith != rbriggs and os.path.basename(jsmith) == "user-jsmith.db"
+    assert _rows(jsmith, "jsmith") == expected["jsmith"]
+    assert _rows(jsmith, "rbriggs") == []
+    with read_connection(rbriggs) as conn:
+        assert conn.execute("SELECT access_token FROM plaid_items").fetchall() == [("secret",)]
+        assert check_rollups(conn) == {"daily_rollups": 0, "monthly_rollups": 0}
+    assert sorted(all_db_paths()) == sorted([jsmith, rbriggs])
+
+    # Per-user readers and writers follow the routing.
+    cache = AnswerCache()
+    _, key = cache.lookup("jsmith", "How much?")
+    cache.store(key, "jsmith", "How much?", "A lot")
+    with read_connection(jsmith) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM answer_cache").fetchone() == (1,)
+    assert recategorize() == 10  # Both shards are covered.
+
+    with pytest.raises(ValueError):
+        split_database()
+
+
+def test_rebalance_moves_users_and_removes_old_buckets(source):
+    split_database(mode="hash", buckets=4)
+    old_paths = all_db_paths()
+    assert all(os.path.basename(p).startswith("bucket-4-") for p in old_paths)
+
+    result = rebalance(buckets=2)
+    assert result["users"] == 2 and result["rows"] == 13  # Includes the data versions written by the split.
+    assert not any(os.path.exists(p) for p in old_paths)
+    assert all(os.path.basename(p).startswith("bucket-2-") for p in all_db_paths())
+    assert _rows(user_db_path("jsmith"), "jsmith") == _rows(source, "jsmith")
+    assert sum(users for _, users, _ in shard_status()) == 2
+
+    rebalance(mode="user")
+    assert os.path.basename(user_db_path("rbriggs")) == "user-rbriggs.db"
+    assert _rows(user_db_path("rbriggs"), "rbriggs") == _rows(source, "rbriggs")
+
+
+def test_rebalance_after_writes_to_the_shards(source):
+    """Shards assign row ids independently, so merging them must not copy the ids."""
+    split_database(mode="user")
+    for user in ("jsmith", "rbriggs"):
+        with write_transaction(user_db_path(user)) as conn:
+            conn.execute("INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) "
+                         "VALUES ('2025-08-01', 'Rent', -50000, 'Debit', ?)", (user,))
+    expected = {user: _rows(user_db_path(user), user) for user in ("jsmith", "rbriggs")}
+
+    rebalance(mode="hash", buckets=1)
+    assert len(all_db_paths()) == 1
+    for user in ("jsmith", "rbriggs"):
+        assert _rows(user_db_path(user), user) == expected[user]
@@ -0,0 +1,109 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+import database
+from database import get_engine, read_connection, write_transaction
+from instrumentation import REGISTRY
+from schema import migrate
+from sql_guard import (GuardedSQLDatabase, SQLGuardError, guarded, plan_violations, run_guarded_query,
+                       scope_query)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = str(tmp_path / "finance.db")
+    monkeypatch.setattr(database, "DB_PATH", path)
+    with write_transaction(path) as conn:
+        migrate(conn)
+        conn.executemany(
+            "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) VALUES (?, ?, ?, ?, ?)",
+            [(f"2025-01-{day:02d}", "Zomato Order", -10000, "Debit", user)
+             for user in ("jsmith", "rbriggs") for day in range(1, 11)],
+        )
+        conn.execute("INSERT INTO plaid_items (username, access_token, item_id) VALUES ('rbriggs', 'secret', 'i1')")
+    REGISTRY.reset()
+    return path
+
+
+def _run(sql, **kwargs):
+    with read_connection() as conn:
+        return run_guarded_query(conn, sql, "jsmith", **kwargs)
+
+
+def test_queries_only_see_the_users_rows(db):
+    """Every table reference is scoped to the user, including joins and CTEs."""
+    assert _run("SELECT COUNT(*), COUNT(DISTINCT username) FROM bank_transactions")[1] == [(10, 1)]
+    assert _run("SELECT COUNT(*) FROM bank_transactions WHERE username = 'rbriggs'")[1] == [(0,)]
+    assert _run("WITH t AS (SELECT * FROM bank_transactions) "
+                "SELECT COUNT(*) FROM t JOIN bank_transactions b ON b.id = t.id")[1] == [(10,)]
+    assert _run("SELECT SUM(TxnCount) FROM daily_totals;")[1] == [(10,)]
+    assert REGISTRY.counters()["sql_guard_queries_total[outcome=rewritten]"] == 3
+
+
+@pytest.mark.parametrize("sql, reason", [
+    ("DELETE FROM bank_transactions", "not_select"),
+    ("SELECT 1; DROP TABLE bank_transactions", "multiple_statements"),
+    ("SELECT * FROM main.bank_transactions", "qualified_name"),
+    ("SELECT access_token FROM plaid_items", "not_authorized"),
+    ("SELECT name FROM sqlite_master", "not_authorized"),
+    ("SELECT nope FROM bank_transactions", "invalid"),
+])
+def test_unsafe_queries_are_rejected(db, sql, reason):
+    with pytest.raises(SQLGuardError) as excinfo:
+        _run(sql)
+    assert excinfo.value.reason == reason
+    assert REGISTRY.counters()[f"sql_guard_queries_total[outcome={reason}]"] == 1
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT username, COUNT(*) FROM main/**/.bank_transactions WHERE username = 'rbriggs'",
+    "SELECT username, COUNT(*) FROM main--x\n.bank_transactions WHERE username = 'rbriggs'",
+    'SELECT "a\'", COUNT(*) FROM main.bank_transactions WHERE username = \'rbriggs\'',
+])
+def test_comments_and_quotes_do_not_hide_a_schema_prefix(db, sql):
+    with pytest.raises(SQLGuardError) as excinfo:
+        _run(sql)
+    assert excinfo.value.reason == "qualified_name"
+
+
+def test_authorizer_denies_main_reads_outside_the_guard_views(db):
+    """Even a query that slips past the parser cannot read another user's rows."""
+    with read_connection() as conn, guarded(conn, "jsmith"):
+        with pytest.raises(sqlite3.DatabaseError, match="prohibited"):
+            conn.execute("SELECT COUNT(*) FROM main.bank_transactions WHERE username = 'rbriggs'").fetchall()
+        assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT username) "
+                            "FROM guard_bank_transactions").fetchone() == (10, 1)
+    with read_connection() as conn:
+        # Outside a guarded query the views return nothing.
+        assert conn.execute("SELECT COUNT(*) FROM guard_bank_transactions").fetchone() == (0,)
+
+
+def test_row_cap_and_deadline(db):
+    """Results are capped and runaway statements are interrupted."""
+    columns, rows, truncated = _run("SELECT Date FROM bank_transactions ORDER BY Date", max_rows=3)
+    assert columns == ["Date"] and len(rows) == 3 and truncated
+
+    with pytest.raises(SQLGuardError) as excinfo:
+        _run("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT COUNT(*) FROM n", timeout=0.1)
+    assert excinfo.value.reason == "timeout"
+
+
+def test_plan_check_flags_full_scans(db):
+    """An unscoped query scans bank_transactions; the scoped one uses the username index."""
+    with read_connection() as conn:
+        assert plan_violations(conn, "SELECT * FROM bank_transactions")
+        with guarded(conn, "jsmith"):
+            assert plan_violations(conn, scope_query("SELECT * FROM bank_transactions", "jsmith")) == []
+
+
+def test_guarded_database_returns_errors_to_the_agent(db):
+    guarded = GuardedSQLDatabase(get_engine(), "jsmith", max_rows=2, include_tables=["bank_transactions"],
+                                 sample_rows_in_table_info=0)
+
+    assert guarded.run_no_throw("SELECT * FROM plaid_items").startswith("Error: ")
+    output = guarded.run_no_throw("SELECT Date FROM bank_transactions ORDER BY Date")
+    assert output.startswith("[('2025-01-01',), ('2025-01-02',)]")
+    assert "Only the first 2 rows are shown" in output
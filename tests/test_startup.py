@@ -0,0 +1,23 @@
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = ["langchain.agents", "langchain_google_genai", "plaid.api", "pandas", "plotly.express"]
+
+
+def test_entry_points_do_not_import_heavy_dependencies():
+    """The agent stack, Gemini client, Plaid API client and pandas load on first use only."""
+    code = (
+        "import sys, app_logic, plaid_service, sync_worker\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            check=True, cwd=Path(__file__).resolve().parents[1]).stdout
+    assert output.strip().splitlines()[-1] == "[]"
+
+
+def test_plaid_client_is_built_once_on_first_use():
+    import plaid_service
+
+    client = plaid_service.get_client()
+    assert plaid_service.get_client() is client
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from streaming import AgentStreamHandler
+
+
+def _handler():
+    events = []
+    handler = AgentStreamHandler(on_status=lambda t: events.append(("status", t)),
+                                 on_text=lambda t: events.append(("text", t)))
+    return handler, events
+
+
+def test_tokens_accumulate_and_reset_per_llm_call():
+    """Only the text of the latest LLM call is shown as the answer."""
+    handler, events = _handler()
+    handler.on_chat_model_start({}, [[]])
+    handler.on_llm_new_token("Let me check")
+    handler.on_chat_model_start({}, [[]])
+    handler.on_llm_new_token("You spent ")
+    handler.on_llm_new_token("649.00")
+
+    assert events[-1] == ("text", "You spent 649.00")
+    assert handler.time_to_first_output is not None
+
+
+def test_tool_progress_is_reported():
+    handler, events = _handler()
+    handler.on_tool_start({"name": "sql_db_query"}, "SELECT 1")
+    handler.on_tool_end("[(1,)]")
+    handler.on_tool_start({"name": "create_user_spending_pie_chart"}, "")
+
+    assert events[0] == ("status", "Running SQL:\n```sql\nSELECT 1\n```")
+    assert events[1] == ("status", "Step 1 finished, thinking...")
+    assert events[2] == ("status", "Building spending chart...")
+    assert handler.tool_calls == 2
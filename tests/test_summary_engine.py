@@ -0,0 +1,67 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from categorization import recategorize_rows
+from schema import migrate
+from summary_engine import SUMMARY_QUESTIONS, answer_summary_questions, summary_window
+
+ROWS = [
+    ("2025-07-01", "Salary Credit", 8000000, "Credit", "jsmith"),
+    ("2025-07-02", "Zomato Order", -35000, "Debit", "jsmith"),
+    ("2025-07-05", "Rent Payment", -2000000, "Debit", "jsmith"),
+    ("2025-07-22", "Zomato Gold", -29900, "Debit", "jsmith"),
+    ("2025-08-02", "United Airlines", -50000, "Debit", "jsmith"),
+    ("2025-08-01", "Rent Payment", -9999900, "Debit", "rbriggs"),
+]
+
+@pytest.fixture
+def conn():
+    """Provides an in-memory database with a small set of transactions."""
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO bank_transactions (Date, Description, AmountMinor, Type, username) VALUES (?, ?, ?, ?, ?)",
+        ROWS,
+    )
+    yield conn
+    conn.close()
+
+AS_OF = date(2025, 8, 2)
+
+def test_window_ends_today_by_default(conn):
+    """"Last 30 days" means up to today unless a day is given."""
+    today = date.today()
+    assert summary_window(conn, "jsmith") == ((today - timedelta(days=30)).isoformat(), today.isoformat())
+    assert summary_window(conn, "jsmith", as_of=AS_OF) == ("2025-07-03", "2025-08-02")
+    assert summary_window(conn, "nobody") is None
+
+def test_answers_are_scoped_to_user_and_window(conn):
+    """Metrics only include the user's rows inside the window."""
+    answers = answer_summary_questions(conn, "jsmith", SUMMARY_QUESTIONS, as_of=AS_OF)
+
+    assert "You spent 20799.00 across 3 debit" in answers[SUMMARY_QUESTIONS[0]]
+    assert answers[SUMMARY_QUESTIONS[2]].startswith("Rent Payment on 2025-07-05: 20000.00")
+    assert "You made 3 transactions (3 debits, 0 credits)" in answers[SUMMARY_QUESTIONS[3]]
+
+def test_top_categories_use_stored_categories(conn):
+    """Categories come from the Category column; uncategorized rows count as Other."""
+    question = SUMMARY_QUESTIONS[1]
+    assert answer_summary_questions(conn, "jsmith", [question], as_of=AS_OF)[question].endswith("1. Other: 20799.00.")
+
+    recategorize_rows(conn)
+    answer = answer_summary_questions(conn, "jsmith", [question], as_of=AS_OF)[question]
+    assert answer.endswith("1. Rent: 20000.00; 2. Travel: 500.00; 3. Food & Dining: 299.00.")
+
+def test_unknown_questions_are_left_for_the_agent(conn):
+    """Questions without a SQL metric are omitted from the result."""
+    answers = answer_summary_questions(conn, "jsmith", ["What should I invest in?"])
+    assert answers == {}
+
+def test_answers_are_reproducible(conn):
+    """The same data and window always yield the same answers."""
+    as_of = date(2025, 7, 31)
+    first = answer_summary_questions(conn, "jsmith", SUMMARY_QUESTIONS, as_of=as_of)
+    second = answer_summary_questions(conn, "jsmith", SUMMARY_QUESTIONS, as_of=as_of)
+    assert first == second
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+import database
+from fake_plaid import FakePlaidApi, generate_transactions
+
+class CountingPlaidApi(FakePlaidApi):
+    """Fake Plaid API that records the peak number of concurrent sync calls."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.peak = 0
+        self._counter = threading.Lock()
+
+    def transactions_sync(self, request):
+        with self._counter:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.01)
+        try:
+            return super().transactions_sync(request)
+        finally:
+            with self._counter:
+                self.in_flight -= 1
+
+@pytest.fixture
+def sync_worker(tmp_path, monkeypatch):
+    """Imports sync_worker against a fresh database file."""
+    pytest.importorskip("pandas")
+    pytest.importorskip("plaid")
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "finance.db"))
+    import sync_worker
+    return sync_worker
+
+def _wait(service, job_ids, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = [service.get_job(job_id) for job_id in job_ids]
+        if all(job.done for job in jobs):
+            return jobs
+        time.sleep(0.01)
+    raise AssertionError("sync jobs did not finish in time")
+
+def test_link_job_runs_in_background(sync_worker):
+    """A link job reports progress and completes without blocking the caller."""
+    service = sync_worker.SyncService(api=FakePlaidApi(generate_transactions(50)))
+    job_id = service.submit_link("jsmith")
+
+    job, = _wait(service, [job_id])
+    assert job.status == "succeeded"
+    assert job.counts["added"] == 50
+    assert job.item_id is not None
+    service.shutdown()
+
+def test_link_job_retries_until_transactions_are_ready(sync_worker):
+    """An item without transactions yet is polled with backoff instead of a fixed sleep."""
+    class PreparingPlaidApi(FakePlaidApi):
+        """Returns no transactions on the first sync, then makes them ready."""
+
+        def transactions_sync(self, request):
+            response = super().transactions_sync(request)
+            if self.calls["transactions_sync"] == 1:
+                self.add_transactions(request.access_token, generate_transactions(5))
+            return response
+
+    api = PreparingPlaidApi()
+    service = sync_worker.SyncService(api=api, readiness_timeout=5, readiness_initial_delay=0.01)
+
+    job, = _wait(service, [service.submit_link("jsmith")])
+    assert job.counts["added"] == 5
+    assert api.calls["transactions_sync"] == 2
+    service.shutdown()
+
+def test_link_job_fails_when_every_sync_attempt_fails(sync_worker):
+    """A linked item whose syncs all fail is reported as failed, not as empty."""
+    import plaid
+
+    class FailingPlaidApi(FakePlaidApi):
+        def transactions_sync(self, request):
+            self.calls["transactions_sync"] += 1
+            raise plaid.ApiException(status=500, reason="Internal Server Error")
+
+    api = FailingPlaidApi()
+    service = sync_worker.SyncService(api=api, readiness_timeout=0.2, readiness_initial_delay=0.01)
+    job, = _wait(service, [service.submit_link("jsmith")])
+
+    assert job.status == "failed"
+    assert job.message.startswith("Failed to sync transactions from the bank")
+    assert api.calls["transactions_sync"] > 1
+    service.shutdown()
+
+def test_refresh_all_bounds_concurrent_plaid_calls(sync_worker):
+    """Refreshing many items never exceeds the configured number of Plaid calls."""
+    api = CountingPlaidApi()
+    service = sync_worker.SyncService(api=api, max_workers=8, max_plaid_calls=2)
+    for i in range(12):
+        api.add_item(f"access-{i}", f"item-{i}", generate_transactions(3, seed=i))
+        sync_worker.plaid_service.save_credentials_to_db(f"user{i % 3}", f"access-{i}", f"item-{i}")
+
+    jobs = _wait(service, service.refresh_all())
+
+    assert all(job.status == "succeeded" for job in jobs)
+    assert sum(job.counts["added"] for job in jobs) == 36
+    assert api.peak <= 2
+    service.shutdown()